@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from app.db import Database
+from app.utils import now_iso
+
+logger = logging.getLogger("app.activity")
+
+
+class ActivityTracker:
+    """
+    Write-behind "last seen" tracking:
+      - touch() only records user_id -> timestamp in memory
+      - a background task writes the buffer with one executemany every
+        `interval` seconds, or sooner once `max_pending` users are buffered
+      - stop() flushes whatever is left
+    New users are still inserted immediately by Database.load_session().
+    """
+
+    def __init__(self, db: Database, interval: float = 5.0, max_pending: int = 500):
+        self.db = db
+        self.interval = interval
+        self.max_pending = max(1, int(max_pending))
+        self._pending: Dict[int, str] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self, user_id: int) -> None:
+        self._pending[user_id] = now_iso()
+        if len(self._pending) >= self.max_pending:
+            self._wake.set()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            await self.db.touch_users(list(batch.items()))
+        except Exception:
+            logger.exception("Activity flush failed (%s users)", len(batch))
+            # keep the newest timestamps for the next attempt
+            for user_id, seen_at in batch.items():
+                self._pending.setdefault(user_id, seen_at)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
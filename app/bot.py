@@ -1,7 +1,15 @@
+from typing import Optional
+
 from aiogram import Bot
 from aiogram.client.default import DefaultBotProperties
 
+from app.outbound import OutboundDispatcher
+
 
-def create_bot(token: str) -> Bot:
+def create_bot(token: str, outbound: Optional[OutboundDispatcher] = None) -> Bot:
     # parse_mode=None globally (we avoid parse errors entirely)
-    return Bot(token=token, default=DefaultBotProperties(parse_mode=None))
+    bot = Bot(token=token, default=DefaultBotProperties(parse_mode=None))
+    if outbound is not None:
+        # every outbound API call goes through the rate limiter / send queue
+        bot.session.middleware(outbound)
+    return bot
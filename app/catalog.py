@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+Row = Mapping[str, Any]
+
+# rows per page of the catalog / admin list keyboards
+PAGE_SIZE = 10
+
+
+def available(p: Row) -> int:
+    """Stock a customer can still buy: what checkouts hold is not for sale."""
+    return max(0, p["stock"] - p.get("reserved", 0))
+
+
+def _freeze(d: Dict[str, Any]) -> Row:
+    return MappingProxyType(dict(d))
+
+
+def _active(categories: Tuple[Row, ...]) -> Tuple[Row, ...]:
+    return tuple(c for c in categories if c["is_active"] == 1)
+
+
+def _index(products: Mapping[int, Row]) -> Tuple[Mapping[int, Tuple[int, ...]], Mapping[int, Tuple[int, ...]]]:
+    all_ids: Dict[int, List[int]] = {}
+    active_ids: Dict[int, List[int]] = {}
+    for pid in sorted(products, reverse=True):
+        p = products[pid]
+        all_ids.setdefault(p["category_id"], []).append(pid)
+        if p["is_active"] == 1:
+            active_ids.setdefault(p["category_id"], []).append(pid)
+    return (
+        MappingProxyType({k: tuple(v) for k, v in all_ids.items()}),
+        MappingProxyType({k: tuple(v) for k, v in active_ids.items()}),
+    )
+
+
+def _page(seq: Sequence, page: int, size: int) -> Tuple[Sequence, int, int]:
+    """Slice of one page; an out-of-range page is clamped. Returns (items, page, pages)."""
+    pages = max(1, -(-len(seq) // size))
+    page = min(max(page, 0), pages - 1)
+    return seq[page * size:(page + 1) * size], page, pages
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogSnapshot:
+    """
+    Immutable in-memory copy of categories and products.
+    Never mutated in place: with_categories()/with_products() return a new
+    snapshot (copy-on-write) that the owner swaps in with one assignment,
+    so readers always see a consistent version.
+    """
+
+    version: int
+    categories: Tuple[Row, ...]  # id DESC
+    active_categories: Tuple[Row, ...]  # id DESC
+    products: Mapping[int, Row]
+    by_category: Mapping[int, Tuple[int, ...]]  # product ids, id DESC
+    active_by_category: Mapping[int, Tuple[int, ...]]  # active product ids, id DESC
+
+    # -------- reads --------
+    def list_categories(self, only_active: bool = True) -> List[Row]:
+        return list(self.active_categories if only_active else self.categories)
+
+    def list_products(self, category_id: int, only_active: bool = True) -> List[Row]:
+        index = self.active_by_category if only_active else self.by_category
+        return [self.products[pid] for pid in index.get(category_id, ())]
+
+    def get_product(self, product_id: int) -> Optional[Row]:
+        return self.products.get(product_id)
+
+    # pages are slices of the prebuilt indexes: the cost of a page does not
+    # depend on the size of the catalog
+    def categories_page(self, page: int, size: int = PAGE_SIZE, only_active: bool = True) -> Tuple[List[Row], int, int]:
+        rows, page, pages = _page(self.active_categories if only_active else self.categories, page, size)
+        return list(rows), page, pages
+
+    def products_page(
+        self, category_id: int, page: int, size: int = PAGE_SIZE, only_active: bool = True
+    ) -> Tuple[List[Row], int, int]:
+        index = self.active_by_category if only_active else self.by_category
+        ids, page, pages = _page(index.get(category_id, ()), page, size)
+        return [self.products[pid] for pid in ids], page, pages
+
+    # -------- copy-on-write updates --------
+    def with_categories(self, rows: Iterable[Dict[str, Any]]) -> "CatalogSnapshot":
+        by_id = {c["id"]: c for c in self.categories}
+        for r in rows:
+            by_id[r["id"]] = _freeze(r)
+        categories = tuple(by_id[k] for k in sorted(by_id, reverse=True))
+        return CatalogSnapshot(
+            self.version + 1,
+            categories,
+            _active(categories),
+            self.products,
+            self.by_category,
+            self.active_by_category,
+        )
+
+    def with_products(self, rows: Iterable[Dict[str, Any]]) -> "CatalogSnapshot":
+        products = dict(self.products)
+        by_category = dict(self.by_category)
+        active_by_category = dict(self.active_by_category)
+        touched: Dict[int, set] = {}
+
+        def ids_of(cat_id: int) -> set:
+            # copied once per category, not per row: bulk writes patch thousands of rows
+            ids = touched.get(cat_id)
+            if ids is None:
+                ids = touched[cat_id] = set(by_category.get(cat_id, ()))
+            return ids
+
+        for r in rows:
+            old = products.get(r["id"])
+            new = products[r["id"]] = _freeze(r)
+            if old is not None:
+                ids_of(old["category_id"]).discard(r["id"])
+            ids_of(new["category_id"]).add(r["id"])
+        # re-index only the categories the rows belong (or belonged) to
+        for cat_id, ids in touched.items():
+            ordered = tuple(sorted(ids, reverse=True))
+            by_category[cat_id] = ordered
+            active_by_category[cat_id] = tuple(pid for pid in ordered if products[pid]["is_active"] == 1)
+        return CatalogSnapshot(
+            self.version + 1,
+            self.categories,
+            self.active_categories,
+            MappingProxyType(products),
+            MappingProxyType(by_category),
+            MappingProxyType(active_by_category),
+        )
+
+
+def build_snapshot(version: int, categories: Iterable[Dict[str, Any]], products: Iterable[Dict[str, Any]]) -> CatalogSnapshot:
+    cats = tuple(_freeze(c) for c in sorted(categories, key=lambda c: c["id"], reverse=True))
+    prods = MappingProxyType({p["id"]: _freeze(p) for p in products})
+    by_category, active_by_category = _index(prods)
+    return CatalogSnapshot(version, cats, _active(cats), prods, by_category, active_by_category)
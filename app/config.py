@@ -7,8 +7,20 @@ class Config:
     bot_token: str
     admin_id: int
     db_path: str
+    db_readers: int
+    db_profile: str
     support_contact: str
     manual_payment_details: str
+    tg_global_rate: float
+    tg_chat_rate: float
+    mode: str
+    webhook_url: str
+    webhook_path: str
+    webhook_secret: str
+    webhook_host: str
+    webhook_port: int
+    workers: int
+    fsm_ttl_hours: int
 
 
 def load_config(path: str = ".env") -> Config:
@@ -25,6 +37,15 @@ def load_config(path: str = ".env") -> Config:
 
     db_path = (env.get("DB_PATH") or "shop.db").strip()
 
+    db_readers_raw = (env.get("DB_READERS") or "4").strip()
+    if not db_readers_raw.isdigit() or int(db_readers_raw) < 1:
+        raise RuntimeError("DB_READERS must be a positive number in .env")
+    db_readers = int(db_readers_raw)
+
+    db_profile = (env.get("DB_PROFILE") or "balanced").strip().lower()
+    if db_profile not in ("balanced", "durable", "fast"):
+        raise RuntimeError("DB_PROFILE must be one of: balanced, durable, fast")
+
     support_contact = (env.get("SUPPORT_CONTACT") or "@support").strip()
 
     manual_payment_details = (env.get("MANUAL_PAYMENT_DETAILS") or "").strip()
@@ -34,10 +55,62 @@ def load_config(path: str = ".env") -> Config:
     # dotenv_values keeps literal \n, convert to real newlines
     manual_payment_details = manual_payment_details.replace("\\n", "\n")
 
+    try:
+        tg_global_rate = float((env.get("TG_GLOBAL_RATE") or "30").strip())
+        tg_chat_rate = float((env.get("TG_CHAT_RATE") or "1").strip())
+        if tg_global_rate <= 0 or tg_chat_rate <= 0:
+            raise ValueError
+    except ValueError:
+        raise RuntimeError("TG_GLOBAL_RATE / TG_CHAT_RATE must be positive numbers in .env")
+
+    mode = (env.get("MODE") or "polling").strip().lower()
+    if mode not in ("polling", "webhook"):
+        raise RuntimeError("MODE must be one of: polling, webhook")
+
+    webhook_url = (env.get("WEBHOOK_URL") or "").strip().rstrip("/")
+    webhook_path = (env.get("WEBHOOK_PATH") or "/webhook").strip()
+    if not webhook_path.startswith("/"):
+        webhook_path = "/" + webhook_path
+    webhook_secret = (env.get("WEBHOOK_SECRET") or "").strip()
+    webhook_host = (env.get("WEBHOOK_HOST") or "0.0.0.0").strip()
+    webhook_port_raw = (env.get("WEBHOOK_PORT") or "8080").strip()
+    if not webhook_port_raw.isdigit():
+        raise RuntimeError("WEBHOOK_PORT must be a number in .env")
+    webhook_port = int(webhook_port_raw)
+
+    if mode == "webhook":
+        if not webhook_url.startswith("https://"):
+            raise RuntimeError("WEBHOOK_URL must be a public https:// URL when MODE=webhook")
+        # Telegram allows 1-256 chars of A-Z, a-z, 0-9, _ and -
+        if not webhook_secret or len(webhook_secret) > 256 or not all(ch.isalnum() or ch in "_-" for ch in webhook_secret):
+            raise RuntimeError("WEBHOOK_SECRET is required when MODE=webhook (1-256 chars: A-Z a-z 0-9 _ -)")
+
+    workers_raw = (env.get("WORKERS") or "1").strip()
+    if not workers_raw.isdigit() or int(workers_raw) < 1:
+        raise RuntimeError("WORKERS must be a positive number in .env")
+    workers = int(workers_raw)
+
+    fsm_ttl_raw = (env.get("FSM_TTL_HOURS") or "24").strip()
+    if not fsm_ttl_raw.isdigit() or int(fsm_ttl_raw) < 1:
+        raise RuntimeError("FSM_TTL_HOURS must be a positive number in .env")
+    fsm_ttl_hours = int(fsm_ttl_raw)
+
     return Config(
         bot_token=bot_token,
         admin_id=admin_id,
         db_path=db_path,
+        db_readers=db_readers,
+        db_profile=db_profile,
         support_contact=support_contact,
         manual_payment_details=manual_payment_details,
+        tg_global_rate=tg_global_rate,
+        tg_chat_rate=tg_chat_rate,
+        mode=mode,
+        webhook_url=webhook_url,
+        webhook_path=webhook_path,
+        webhook_secret=webhook_secret,
+        webhook_host=webhook_host,
+        webhook_port=webhook_port,
+        workers=workers,
+        fsm_ttl_hours=fsm_ttl_hours,
     )
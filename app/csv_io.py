@@ -0,0 +1,122 @@
+import csv
+from decimal import Decimal, InvalidOperation
+from typing import Any, Collection, Dict, Iterator, Optional, Tuple
+
+# same columns both ways, so an export is a valid import template
+PRODUCT_COLUMNS = ("id", "category_id", "title", "description", "price", "stock", "is_active")
+PRODUCT_REQUIRED = ("category_id", "title", "price", "stock")
+ORDER_COLUMNS = (
+    "order_id", "created_at", "status", "payment_method", "user_id", "name", "phone", "city",
+    "delivery_method", "address", "comment", "total",
+    "product_id", "title", "qty", "price", "line_total",
+)
+
+_TRUE = {"1", "true", "yes", "y", "+"}
+_FALSE = {"0", "false", "no", "n", "-"}
+
+
+def format_cents(cents: int) -> str:
+    return f"{Decimal(cents) / 100:.2f}"
+
+
+def parse_cents(raw: str) -> int:
+    try:
+        val = Decimal((raw or "").strip().replace(",", "."))
+    except InvalidOperation:
+        raise ValueError("bad price")
+    if not val.is_finite() or val < 0:
+        raise ValueError("bad price")
+    return int((val * 100).to_integral_value())
+
+
+def _int(raw: str, what: str) -> int:
+    raw = (raw or "").strip()
+    if not raw.isdigit():
+        raise ValueError(f"bad {what}")
+    return int(raw)
+
+
+def _dialect(f) -> Any:
+    # sniffed from the first 4 KB: spreadsheet apps save with the local list separator
+    head = f.read(4096)
+    f.seek(0)
+    try:
+        return csv.Sniffer().sniff(head, delimiters=",;\t")
+    except csv.Error:
+        return csv.excel
+
+
+def product_from_csv(rec: Dict[str, Any], category_ids: Collection[int]) -> Dict[str, Any]:
+    """One CSV record -> create/update fields; raises ValueError with a readable reason."""
+    raw_id = (rec.get("id") or "").strip()
+    category_id = _int(rec.get("category_id"), "category_id")
+    if category_id not in category_ids:
+        raise ValueError(f"unknown category {category_id}")
+    title = (rec.get("title") or "").strip()
+    if len(title) < 2:
+        raise ValueError("title too short")
+    active = (rec.get("is_active") or "1").strip().lower()
+    if active not in _TRUE and active not in _FALSE:
+        raise ValueError("bad is_active")
+    return {
+        "id": _int(raw_id, "id") if raw_id else None,
+        "category_id": category_id,
+        "title": title,
+        "description": (rec.get("description") or "").strip(),
+        "price_cents": parse_cents(rec.get("price")),
+        "stock": _int(rec.get("stock"), "stock"),
+        "is_active": 1 if active in _TRUE else 0,
+    }
+
+
+def read_products(
+    f, category_ids: Collection[int]
+) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Streams a products CSV from the text file `f`, one record at a time:
+    yields (line number, fields, None) or (line number, None, error).
+    The delimiter may be , ; or tab.
+    Raises ValueError("CSV_BAD_HEADER") if a required column is missing.
+    """
+    reader = csv.DictReader(f, dialect=_dialect(f))
+    fields = [(c or "").strip().lower() for c in reader.fieldnames or ()]
+    if any(c not in fields for c in PRODUCT_REQUIRED):
+        raise ValueError("CSV_BAD_HEADER")
+    reader.fieldnames = fields
+
+    for rec in reader:
+        if not any((v or "").strip() for k, v in rec.items() if k is not None):
+            continue  # blank line
+        try:
+            yield reader.line_num, product_from_csv(rec, category_ids), None
+        except ValueError as e:
+            yield reader.line_num, None, str(e)
+
+
+def read_adjustments(f) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Streams a `product_id,stock_delta[,price]` list (pasted text or a CSV
+    file): yields (line number, fields, None) or (line number, None, error).
+    stock_delta is signed (+5, -2, 0); an empty price keeps the current one.
+    A first line that is not a product id is taken as a header.
+    """
+    reader = csv.reader(f, dialect=_dialect(f))
+    for rec in reader:
+        cells = [c.strip() for c in rec]
+        if not any(cells):
+            continue
+        if reader.line_num == 1 and not cells[0].isdigit():
+            continue
+        try:
+            if len(cells) < 2:
+                raise ValueError("expected product_id,stock_delta[,price]")
+            delta = cells[1] or "0"
+            if not delta.lstrip("+-").isdigit():
+                raise ValueError("bad stock_delta")
+            yield reader.line_num, {
+                "product_id": _int(cells[0], "product_id"),
+                "stock_delta": int(delta),
+                "price_cents": parse_cents(cells[2]) if len(cells) > 2 and cells[2] else None,
+            }, None
+        except ValueError as e:
+            yield reader.line_num, None, str(e)
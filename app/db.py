@@ -1,257 +1,670 @@
+import asyncio
+import logging
 import aiosqlite
-from typing import Any, Dict, List, Optional, Tuple
-from app.utils import now_iso
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from app.catalog import CatalogSnapshot, build_snapshot
+from app.sessions import SessionCache, UserSession
+from app.utils import fts_match, now_iso
+
+logger = logging.getLogger("app.db")
+
+T = TypeVar("T")
+
+
+# how long a checkout token keeps answering repeated confirms with its order
+ORDER_REQUEST_TTL = timedelta(days=2)
+
+# how long entering checkout holds the cart's stock for the user
+RESERVATION_TTL = timedelta(minutes=15)
+
+# order statuses whose total counts as revenue (everything but CANCELED)
+REVENUE_STATUSES = ("NEW", "PAID", "IN_DELIVERY", "DONE")
+
+# PRAGMA sets selectable via DB_PROFILE; journal_mode is persisted in the file,
+# the rest are applied to every pooled connection.
+STORAGE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,  # KiB
+        "mmap_size": 134217728,
+        "temp_store": "MEMORY",
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 10000,
+        "cache_size": -8000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,
+        "mmap_size": 536870912,
+        "temp_store": "MEMORY",
+    },
+}
 
 
 class Database:
-    def __init__(self, path: str):
+    """
+    Long-lived connection pool over one SQLite file (WAL):
+      - one writer connection owned by a single writer task; writes are queued
+        and committed in small batches (one BEGIN IMMEDIATE/COMMIT per batch,
+        one SAVEPOINT per write, so a failing write never affects its neighbours)
+      - N reader connections handed out through a queue; in WAL mode they read
+        the last committed snapshot and never wait on the writer
+    User metadata (lang, ui_message_id) is served from an LRU session cache,
+    with write-through on set_user_lang/set_ui_message_id; catalog reads are
+    served from an in-memory CatalogSnapshot kept in sync by the write paths.
+    When several processes share the file, on_change reports every catalog
+    write so peers can apply it with invalidate().
+    Connections are opened once in init() and closed in close().
+    """
+
+    def __init__(
+        self,
+        path: str,
+        readers: int = 4,
+        profile: str = "balanced",
+        write_batch: int = 64,
+        session_cache_size: int = 10000,
+    ):
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f"Unknown storage profile: {profile}")
         self.path = path
+        self.readers = max(1, int(readers))
+        self.profile = profile
+        self.write_batch = max(1, int(write_batch))
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._write_queue: asyncio.Queue = asyncio.Queue()
+        self._reader_conns: List[aiosqlite.Connection] = []
+        self._reader_pool: "asyncio.Queue[aiosqlite.Connection]" = asyncio.Queue()
+        self.sessions = SessionCache(session_cache_size)
+        self.catalog: CatalogSnapshot = build_snapshot(0, [], [])
+        # called as on_change(kind, ids) after a committed write that peers must
+        # mirror; kind is "categories" or "products". Session writes are not
+        # reported: a user's session is only ever cached by the worker that
+        # owns the user (see app.sharding.shard_of)
+        self.on_change: Optional[Callable[[str, Tuple[int, ...]], None]] = None
+        # called as on_reserve(expires_at) (unix time) after a committed stock
+        # hold, so the sweeper can wake up when it expires
+        self.on_reserve: Optional[Callable[[float], None]] = None
+
+    # -------- pool --------
+    async def _connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        # writer runs in autocommit mode: the writer task issues BEGIN/COMMIT itself
+        conn = await aiosqlite.connect(self.path, isolation_level="" if read_only else None)
+        tuning = STORAGE_PROFILES[self.profile]
+        if not read_only:
+            await conn.execute(f"PRAGMA journal_mode={tuning['journal_mode']};")
+        await conn.execute(f"PRAGMA synchronous={tuning['synchronous']};")
+        await conn.execute(f"PRAGMA busy_timeout={int(tuning['busy_timeout'])};")
+        await conn.execute(f"PRAGMA cache_size={int(tuning['cache_size'])};")
+        await conn.execute(f"PRAGMA mmap_size={int(tuning['mmap_size'])};")
+        await conn.execute(f"PRAGMA temp_store={tuning['temp_store']};")
+        await conn.execute("PRAGMA foreign_keys=ON;")
+        if read_only:
+            await conn.execute("PRAGMA query_only=ON;")
+        return conn
+
+    @asynccontextmanager
+    async def _read(self) -> AsyncIterator[aiosqlite.Connection]:
+        conn = await self._reader_pool.get()
+        try:
+            yield conn
+        finally:
+            self._reader_pool.put_nowait(conn)
+
+    async def _write(self, op: Callable[[aiosqlite.Connection], Awaitable[T]]) -> T:
+        """Queues op(conn) for the writer task and waits until its batch is committed."""
+        if self._writer_task is None:
+            raise RuntimeError("Database is not initialized")
+        fut = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait((op, fut))
+        return await fut
+
+    async def _writer_loop(self) -> None:
+        conn = self._writer
+        stopping = False
+        while not stopping:
+            batch = [await self._write_queue.get()]
+            while len(batch) < self.write_batch and not self._write_queue.empty():
+                batch.append(self._write_queue.get_nowait())
+            if None in batch:
+                stopping = True
+                batch = [job for job in batch if job is not None]
+            if not batch:
+                continue
+
+            done: List[Tuple[asyncio.Future, Any, Optional[BaseException]]] = []
+            try:
+                await conn.execute("BEGIN IMMEDIATE;")
+                for op, fut in batch:
+                    await conn.execute("SAVEPOINT w;")
+                    try:
+                        result = await op(conn)
+                    except Exception as e:
+                        await conn.execute("ROLLBACK TO w;")
+                        await conn.execute("RELEASE w;")
+                        done.append((fut, None, e))
+                    else:
+                        await conn.execute("RELEASE w;")
+                        done.append((fut, result, None))
+                await conn.execute("COMMIT;")
+            except Exception as e:
+                logger.exception("Write batch failed")
+                if conn.in_transaction:
+                    await conn.execute("ROLLBACK;")
+                done = [(fut, None, e) for _op, fut in batch]
+
+            for fut, result, err in done:
+                if fut.done():
+                    continue
+                if err is not None:
+                    fut.set_exception(err)
+                else:
+                    fut.set_result(result)
+
+    async def close(self) -> None:
+        if self._writer_task is not None:
+            self._write_queue.put_nowait(None)
+            await self._writer_task
+            self._writer_task = None
+        while self._reader_conns:
+            await self._reader_conns.pop().close()
+        self._reader_pool = asyncio.Queue()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
 
     async def init(self) -> None:
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("PRAGMA foreign_keys=ON;")
-            await db.executescript(
-                """
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    lang TEXT NOT NULL DEFAULT 'ua',
-                    ui_message_id INTEGER,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL
-                );
-
-                CREATE TABLE IF NOT EXISTS categories (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    is_active INTEGER NOT NULL DEFAULT 1,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL
-                );
-
-                CREATE TABLE IF NOT EXISTS products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    category_id INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    description TEXT NOT NULL DEFAULT '',
-                    price_cents INTEGER NOT NULL DEFAULT 0,
-                    stock INTEGER NOT NULL DEFAULT 0,
-                    is_active INTEGER NOT NULL DEFAULT 1,
-                    photo_file_id TEXT,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL,
-                    FOREIGN KEY(category_id) REFERENCES categories(id)
-                );
-
-                CREATE TABLE IF NOT EXISTS cart_items (
-                    user_id INTEGER NOT NULL,
-                    product_id INTEGER NOT NULL,
-                    qty INTEGER NOT NULL DEFAULT 1,
-                    PRIMARY KEY (user_id, product_id),
-                    FOREIGN KEY(user_id) REFERENCES users(user_id) ON DELETE CASCADE,
-                    FOREIGN KEY(product_id) REFERENCES products(id) ON DELETE CASCADE
-                );
-
-                CREATE TABLE IF NOT EXISTS orders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    status TEXT NOT NULL DEFAULT 'NEW',
-                    payment_method TEXT,
-                    name TEXT NOT NULL,
-                    phone TEXT NOT NULL,
-                    city TEXT NOT NULL,
-                    delivery_method TEXT NOT NULL,
-                    address TEXT NOT NULL,
-                    comment TEXT,
-                    total_cents INTEGER NOT NULL DEFAULT 0,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL,
-                    FOREIGN KEY(user_id) REFERENCES users(user_id)
-                );
-
-                CREATE TABLE IF NOT EXISTS order_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    order_id INTEGER NOT NULL,
-                    product_id INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    price_cents INTEGER NOT NULL,
-                    qty INTEGER NOT NULL,
-                    line_total_cents INTEGER NOT NULL,
-                    FOREIGN KEY(order_id) REFERENCES orders(id) ON DELETE CASCADE
-                );
-
-                CREATE INDEX IF NOT EXISTS idx_products_category ON products(category_id);
-                CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id);
+        self._writer = await self._connect()
+        await self._create_schema(self._writer)
+        self._writer_task = asyncio.create_task(self._writer_loop())
+        for _ in range(self.readers):
+            conn = await self._connect(read_only=True)
+            self._reader_conns.append(conn)
+            self._reader_pool.put_nowait(conn)
+        await self.reload_catalog()
+
+    async def _create_schema(self, db: aiosqlite.Connection) -> None:
+        cur = await db.execute("SELECT 1 FROM sqlite_master WHERE name='products_fts';")
+        fts_existed = await cur.fetchone() is not None
+        await db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                lang TEXT NOT NULL DEFAULT 'ua',
+                ui_message_id INTEGER,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS categories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                is_active INTEGER NOT NULL DEFAULT 1,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS products (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                description TEXT NOT NULL DEFAULT '',
+                price_cents INTEGER NOT NULL DEFAULT 0,
+                stock INTEGER NOT NULL DEFAULT 0,
+                is_active INTEGER NOT NULL DEFAULT 1,
+                photo_file_id TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                reserved INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY(category_id) REFERENCES categories(id)
+            );
+
+            CREATE TABLE IF NOT EXISTS cart_items (
+                user_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                qty INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (user_id, product_id),
+                FOREIGN KEY(user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+                FOREIGN KEY(product_id) REFERENCES products(id) ON DELETE CASCADE
+            );
+
+            -- checkout holds (see reserve_cart); products.reserved is the sum
+            -- of the live rows per product, kept in the same writes
+            CREATE TABLE IF NOT EXISTS stock_reservations (
+                user_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                qty INTEGER NOT NULL,
+                expires_at TEXT NOT NULL,
+                PRIMARY KEY (user_id, product_id),
+                FOREIGN KEY(product_id) REFERENCES products(id) ON DELETE CASCADE
+            );
+
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'NEW',
+                payment_method TEXT,
+                name TEXT NOT NULL,
+                phone TEXT NOT NULL,
+                city TEXT NOT NULL,
+                delivery_method TEXT NOT NULL,
+                address TEXT NOT NULL,
+                comment TEXT,
+                total_cents INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                FOREIGN KEY(user_id) REFERENCES users(user_id)
+            );
+
+            CREATE TABLE IF NOT EXISTS order_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                price_cents INTEGER NOT NULL,
+                qty INTEGER NOT NULL,
+                line_total_cents INTEGER NOT NULL,
+                FOREIGN KEY(order_id) REFERENCES orders(id) ON DELETE CASCADE
+            );
+
+            CREATE TABLE IF NOT EXISTS fsm_state (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL DEFAULT '{}',
+                updated_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS order_requests (
+                token TEXT PRIMARY KEY,
+                order_id INTEGER NOT NULL,
+                created_at TEXT NOT NULL
+            );
+
+            -- bucket: 'all' or the UTC day an order was created ('YYYY-MM-DD');
+            -- revenue_orders counts the orders behind revenue_cents (not CANCELED)
+            CREATE TABLE IF NOT EXISTS stats_counters (
+                bucket TEXT PRIMARY KEY,
+                orders_count INTEGER NOT NULL DEFAULT 0,
+                revenue_cents INTEGER NOT NULL DEFAULT 0,
+                revenue_orders INTEGER NOT NULL DEFAULT 0
+            );
+
+            -- units/revenue per product and creation day, revenue orders only
+            CREATE TABLE IF NOT EXISTS stats_product_daily (
+                day TEXT NOT NULL,
+                product_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                units INTEGER NOT NULL DEFAULT 0,
+                revenue_cents INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, product_id)
+            );
+
+            -- search index over products (external content: the text lives
+            -- in products only); stock/price updates do not touch it;
+            -- prefix indexes make the short prefixes of search-as-you-type cheap
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                title, description,
+                content='products', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            );
+            CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF title, description ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+                INSERT INTO products_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+            END;
+
+            -- composite indexes serve the WHERE and the ORDER BY of one query,
+            -- so keyset pages (WHERE ... AND id<? ORDER BY id DESC) are range reads
+            DROP INDEX IF EXISTS idx_products_category;
+            DROP INDEX IF EXISTS idx_orders_user;
+            CREATE INDEX IF NOT EXISTS idx_products_category_active ON products(category_id, is_active, id DESC);
+            CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id, id DESC);
+            CREATE INDEX IF NOT EXISTS idx_orders_status_id ON orders(status, id DESC);
+            CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id, id);
+            CREATE INDEX IF NOT EXISTS idx_fsm_state_updated ON fsm_state(updated_at);
+            CREATE INDEX IF NOT EXISTS idx_order_requests_created ON order_requests(created_at);
+            CREATE INDEX IF NOT EXISTS idx_stock_reservations_expires ON stock_reservations(expires_at);
+            """
+        )
+
+        # databases created before products_fts existed
+        if not fts_existed:
+            await db.execute("INSERT INTO products_fts(products_fts) VALUES('rebuild');")
+
+        # databases created before stock reservations existed
+        cur = await db.execute("PRAGMA table_info(products);")
+        if "reserved" not in {r[1] for r in await cur.fetchall()}:
+            await db.execute("ALTER TABLE products ADD COLUMN reserved INTEGER NOT NULL DEFAULT 0;")
+
+        # databases created before the stats tables existed
+        cur = await db.execute("SELECT 1 FROM stats_counters WHERE bucket='all';")
+        if await cur.fetchone() is None:
+            await self._rebuild_stats(db)
+
+        # seed demo data if empty
+        cur = await db.execute("SELECT COUNT(*) FROM categories;")
+        (cnt,) = await cur.fetchone()
+        if cnt == 0:
+            now = now_iso()
+            cur2 = await db.execute(
+                "INSERT INTO categories(name,is_active,created_at,updated_at) VALUES(?,?,?,?)",
+                ("Demo category", 1, now, now),
+            )
+            cat_id = cur2.lastrowid
+            await db.execute(
                 """
+                INSERT INTO products(category_id,title,description,price_cents,stock,is_active,photo_file_id,created_at,updated_at)
+                VALUES(?,?,?,?,?,?,?,?,?)
+                """,
+                (
+                    cat_id,
+                    "Demo product",
+                    "A nice demo product for your portfolio.",
+                    19900,
+                    10,
+                    1,
+                    None,
+                    now,
+                    now,
+                ),
             )
-            await db.commit()
 
-            # seed demo data if empty
-            cur = await db.execute("SELECT COUNT(*) FROM categories;")
-            (cnt,) = await cur.fetchone()
-            if cnt == 0:
-                now = now_iso()
-                await db.execute(
-                    "INSERT INTO categories(name,is_active,created_at,updated_at) VALUES(?,?,?,?)",
-                    ("Demo category", 1, now, now),
-                )
-                await db.commit()
-                cur2 = await db.execute("SELECT id FROM categories LIMIT 1;")
-                (cat_id,) = await cur2.fetchone()
-                await db.execute(
-                    """
-                    INSERT INTO products(category_id,title,description,price_cents,stock,is_active,photo_file_id,created_at,updated_at)
-                    VALUES(?,?,?,?,?,?,?,?,?)
-                    """,
-                    (
-                        cat_id,
-                        "Demo product",
-                        "A nice demo product for your portfolio.",
-                        19900,
-                        10,
-                        1,
-                        None,
-                        now,
-                        now,
-                    ),
-                )
-                await db.commit()
+    # -------- cross-process invalidation --------
+    def _changed(self, kind: str, ids: Tuple[int, ...]) -> None:
+        if self.on_change is not None and ids:
+            self.on_change(kind, ids)
+
+    async def invalidate(self, kind: str, ids: Tuple[int, ...]) -> None:
+        """Applies a change reported by another process (see on_change)."""
+        marks = ",".join("?" * len(ids))
+        async with self._read() as db:
+            if kind == "categories":
+                rows = await self._fetch_categories(db, f"id IN ({marks})", tuple(ids))
+            elif kind == "products":
+                rows = await self._fetch_products(db, f"id IN ({marks})", tuple(ids))
+            else:
+                raise ValueError(f"Unknown invalidation kind: {kind}")
+        if kind == "categories":
+            self.catalog = self.catalog.with_categories(rows)
+        else:
+            self.catalog = self.catalog.with_products(rows)
 
     # -------- users --------
-    async def ensure_user(self, user_id: int) -> None:
+    async def load_session(self, user_id: int) -> UserSession:
+        """
+        Cached user metadata; on a miss the user row is created if needed and
+        read back in the same write (one round trip), then kept in the LRU.
+        """
+        session = self.sessions.get(user_id)
+        if session is not None:
+            return session
+
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("PRAGMA foreign_keys=ON;")
-            await db.execute(
+
+        async def op(db: aiosqlite.Connection) -> Tuple[str, Optional[int]]:
+            cur = await db.execute(
                 """
                 INSERT INTO users(user_id, lang, created_at, updated_at)
                 VALUES(?, 'ua', ?, ?)
                 ON CONFLICT(user_id) DO UPDATE SET updated_at=excluded.updated_at
+                RETURNING lang, ui_message_id
                 """,
                 (user_id, now, now),
             )
-            await db.commit()
+            row = await cur.fetchone()
+            await cur.close()
+            return row[0], row[1]
+
+        lang, ui_message_id = await self._write(op)
+        session = self.sessions.get(user_id)
+        if session is None:
+            session = UserSession(user_id=user_id, lang=lang, ui_message_id=ui_message_id or None)
+            self.sessions.put(session)
+        return session
+
+    async def ensure_user(self, user_id: int) -> None:
+        await self.load_session(user_id)
+
+    async def touch_users(self, seen: List[Tuple[int, str]]) -> None:
+        """Bulk "last seen" update: [(user_id, updated_at), ...]."""
+        if not seen:
+            return
+
+        async def op(db: aiosqlite.Connection) -> None:
+            await db.executemany(
+                "UPDATE users SET updated_at=? WHERE user_id=? AND updated_at<?",
+                [(ts, user_id, ts) for user_id, ts in seen],
+            )
+
+        await self._write(op)
 
     async def get_user_lang(self, user_id: int) -> str:
-        async with aiosqlite.connect(self.path) as db:
-            cur = await db.execute("SELECT lang FROM users WHERE user_id=?", (user_id,))
-            row = await cur.fetchone()
-            return row[0] if row else "ua"
+        return (await self.load_session(user_id)).lang
 
     async def set_user_lang(self, user_id: int, lang: str) -> None:
         lang = lang if lang in ("ua", "en") else "ua"
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
+
+        async def op(db: aiosqlite.Connection) -> None:
             await db.execute(
                 "UPDATE users SET lang=?, updated_at=? WHERE user_id=?",
                 (lang, now, user_id),
             )
-            await db.commit()
+
+        await self._write(op)
+        session = self.sessions.get(user_id)
+        if session is not None:
+            session.lang = lang
 
     async def get_ui_message_id(self, user_id: int) -> Optional[int]:
-        async with aiosqlite.connect(self.path) as db:
-            cur = await db.execute("SELECT ui_message_id FROM users WHERE user_id=?", (user_id,))
-            row = await cur.fetchone()
-            return row[0] if row and row[0] else None
+        return (await self.load_session(user_id)).ui_message_id
 
     async def set_ui_message_id(self, user_id: int, message_id: Optional[int]) -> None:
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
+
+        async def op(db: aiosqlite.Connection) -> None:
             await db.execute(
                 "UPDATE users SET ui_message_id=?, updated_at=? WHERE user_id=?",
                 (message_id, now, user_id),
             )
-            await db.commit()
+
+        await self._write(op)
+        session = self.sessions.get(user_id)
+        if session is not None:
+            session.ui_message_id = message_id or None
+            session.ui_fingerprint = None
+
+    # -------- fsm --------
+    # Backing table of SQLiteStorage (app/fsm_storage.py); rows are written
+    # behind the storage's in-memory hot tier.
+    async def fsm_load(self, key: str) -> Optional[Tuple[Optional[str], str, str]]:
+        """Returns (state, data_json, updated_at) or None."""
+        async with self._read() as db:
+            cur = await db.execute("SELECT state, data, updated_at FROM fsm_state WHERE key=?", (key,))
+            row = await cur.fetchone()
+        return (row[0], row[1], row[2]) if row else None
+
+    async def fsm_save(self, rows: List[Tuple[str, Optional[str], str, str]], deleted: List[str]) -> None:
+        """Upserts [(key, state, data_json, updated_at), ...] and deletes emptied keys, in one write."""
+        if not rows and not deleted:
+            return
+
+        async def op(db: aiosqlite.Connection) -> None:
+            if rows:
+                await db.executemany(
+                    """
+                    INSERT INTO fsm_state(key, state, data, updated_at) VALUES(?,?,?,?)
+                    ON CONFLICT(key) DO UPDATE SET state=excluded.state, data=excluded.data, updated_at=excluded.updated_at
+                    """,
+                    rows,
+                )
+            if deleted:
+                await db.executemany("DELETE FROM fsm_state WHERE key=?", [(k,) for k in deleted])
+
+        await self._write(op)
+
+    async def fsm_purge(self, older_than: str) -> int:
+        """Deletes FSM rows not written since older_than (ISO time)."""
+
+        async def op(db: aiosqlite.Connection) -> int:
+            cur = await db.execute("DELETE FROM fsm_state WHERE updated_at<?", (older_than,))
+            return cur.rowcount
+
+        return await self._write(op)
 
     # -------- catalog --------
+    # Reads are served from self.catalog (an immutable CatalogSnapshot); every
+    # write below re-reads the rows it touched inside its own transaction and
+    # swaps in a patched copy once the write is committed.
+    @staticmethod
+    def _product_row(r) -> Dict[str, Any]:
+        return {
+            "id": int(r[0]),
+            "category_id": int(r[1]),
+            "title": r[2],
+            "description": r[3],
+            "price_cents": int(r[4]),
+            "stock": int(r[5]),
+            "is_active": int(r[6]),
+            "photo_file_id": r[7],
+            "reserved": int(r[8]),
+        }
+
+    @classmethod
+    async def _fetch_products(cls, db: aiosqlite.Connection, where: str, params: Tuple = ()) -> List[Dict[str, Any]]:
+        cur = await db.execute(
+            f"""
+            SELECT id, category_id, title, description, price_cents, stock, is_active, photo_file_id, reserved
+            FROM products WHERE {where}
+            """,
+            params,
+        )
+        return [cls._product_row(r) for r in await cur.fetchall()]
+
+    @staticmethod
+    async def _fetch_categories(db: aiosqlite.Connection, where: str, params: Tuple = ()) -> List[Dict[str, Any]]:
+        cur = await db.execute(f"SELECT id,name,is_active FROM categories WHERE {where}", params)
+        return [{"id": int(r[0]), "name": r[1], "is_active": int(r[2])} for r in await cur.fetchall()]
+
+    async def reload_catalog(self) -> CatalogSnapshot:
+        async with self._read() as db:
+            cats = await self._fetch_categories(db, "1")
+            prods = await self._fetch_products(db, "1")
+        self.catalog = build_snapshot(self.catalog.version + 1, cats, prods)
+        return self.catalog
+
     async def list_categories(self, only_active: bool = True) -> List[Dict[str, Any]]:
-        q = "SELECT id,name,is_active FROM categories"
-        if only_active:
-            q += " WHERE is_active=1"
-        q += " ORDER BY id DESC"
-        async with aiosqlite.connect(self.path) as db:
-            cur = await db.execute(q)
-            rows = await cur.fetchall()
-        return [{"id": r[0], "name": r[1], "is_active": int(r[2])} for r in rows]
+        return self.catalog.list_categories(only_active)
+
+    async def list_categories_page(self, page: int, only_active: bool = True) -> Tuple[List[Dict[str, Any]], int, int]:
+        """Returns (categories, page, pages); see CatalogSnapshot.categories_page()."""
+        return self.catalog.categories_page(page, only_active=only_active)
 
     async def create_category(self, name: str) -> int:
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
+
+        async def op(db: aiosqlite.Connection) -> Tuple[int, List[Dict[str, Any]]]:
             cur = await db.execute(
                 "INSERT INTO categories(name,is_active,created_at,updated_at) VALUES(?,?,?,?)",
                 (name, 1, now, now),
             )
-            await db.commit()
-            return cur.lastrowid
+            return cur.lastrowid, await self._fetch_categories(db, "id=?", (cur.lastrowid,))
+
+        category_id, rows = await self._write(op)
+        self.catalog = self.catalog.with_categories(rows)
+        self._changed("categories", (category_id,))
+        return category_id
 
     async def rename_category(self, category_id: int, name: str) -> None:
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
+
+        async def op(db: aiosqlite.Connection) -> List[Dict[str, Any]]:
             await db.execute(
                 "UPDATE categories SET name=?, updated_at=? WHERE id=?",
                 (name, now, category_id),
             )
-            await db.commit()
+            return await self._fetch_categories(db, "id=?", (category_id,))
+
+        self.catalog = self.catalog.with_categories(await self._write(op))
+        self._changed("categories", (category_id,))
 
     async def set_category_active(self, category_id: int, active: bool) -> None:
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
+
+        async def op(db: aiosqlite.Connection) -> List[Dict[str, Any]]:
             await db.execute(
                 "UPDATE categories SET is_active=?, updated_at=? WHERE id=?",
                 (1 if active else 0, now, category_id),
             )
-            await db.commit()
+            return await self._fetch_categories(db, "id=?", (category_id,))
+
+        self.catalog = self.catalog.with_categories(await self._write(op))
+        self._changed("categories", (category_id,))
 
     async def list_products(self, category_id: int, only_active: bool = True) -> List[Dict[str, Any]]:
-        q = """
-        SELECT id, title, description, price_cents, stock, is_active, photo_file_id
-        FROM products WHERE category_id=?
-        """
-        params = [category_id]
-        if only_active:
-            q += " AND is_active=1"
-        q += " ORDER BY id DESC"
-        async with aiosqlite.connect(self.path) as db:
-            cur = await db.execute(q, params)
-            rows = await cur.fetchall()
-        return [
-            {
-                "id": r[0],
-                "title": r[1],
-                "description": r[2],
-                "price_cents": int(r[3]),
-                "stock": int(r[4]),
-                "is_active": int(r[5]),
-                "photo_file_id": r[6],
-            }
-            for r in rows
-        ]
+        return self.catalog.list_products(category_id, only_active)
+
+    async def list_products_page(
+        self, category_id: int, page: int, only_active: bool = True
+    ) -> Tuple[List[Dict[str, Any]], int, int]:
+        """Returns (products, page, pages); see CatalogSnapshot.products_page()."""
+        return self.catalog.products_page(category_id, page, only_active=only_active)
 
     async def get_product(self, product_id: int) -> Optional[Dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
+        return self.catalog.get_product(product_id)
+
+    async def search_products(self, text: str, limit: int = 10, offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Active products (in active categories) matching `text` (see
+        fts_match), best bm25 first with title hits weighted above
+        description hits. Every match is ranked (one top-N sort over the
+        whole MATCH set) and hidden rows are filtered out before paging, so
+        pages are full and old products rank like new ones.
+        Returns (products, has_more); rows come from the catalog snapshot,
+        like every other catalog read.
+        """
+        match = fts_match(text)
+        if not match:
+            return [], False
+        async with self._read() as db:
             cur = await db.execute(
                 """
-                SELECT id, category_id, title, description, price_cents, stock, is_active, photo_file_id
-                FROM products WHERE id=?
+                SELECT p.id
+                FROM products_fts f
+                JOIN products p ON p.id = f.rowid
+                JOIN categories c ON c.id = p.category_id
+                WHERE products_fts MATCH ? AND p.is_active=1 AND c.is_active=1
+                ORDER BY bm25(products_fts, 10.0, 1.0)
+                LIMIT ? OFFSET ?
                 """,
-                (product_id,),
+                (match, limit + 1, offset),
             )
-            r = await cur.fetchone()
-        if not r:
-            return None
-        return {
-            "id": r[0],
-            "category_id": r[1],
-            "title": r[2],
-            "description": r[3],
-            "price_cents": int(r[4]),
-            "stock": int(r[5]),
-            "is_active": int(r[6]),
-            "photo_file_id": r[7],
-        }
+            ids = [int(r[0]) for r in await cur.fetchall()]
+        rows = [p for p in (self.catalog.get_product(pid) for pid in ids[:limit]) if p is not None]
+        return rows, len(ids) > limit
 
     async def create_product(self, data: Dict[str, Any]) -> int:
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
+
+        async def op(db: aiosqlite.Connection) -> Tuple[int, List[Dict[str, Any]]]:
             cur = await db.execute(
                 """
                 INSERT INTO products(category_id,title,description,price_cents,stock,is_active,photo_file_id,created_at,updated_at)
@@ -269,8 +682,12 @@ class Database:
                     now,
                 ),
             )
-            await db.commit()
-            return cur.lastrowid
+            return cur.lastrowid, await self._fetch_products(db, "id=?", (cur.lastrowid,))
+
+        product_id, rows = await self._write(op)
+        self.catalog = self.catalog.with_products(rows)
+        self._changed("products", (product_id,))
+        return product_id
 
     async def update_product_fields(self, product_id: int, fields: Dict[str, Any]) -> None:
         if not fields:
@@ -286,24 +703,28 @@ class Database:
         params.append(product_id)
 
         q = f"UPDATE products SET {', '.join(sets)} WHERE id=?"
-        async with aiosqlite.connect(self.path) as db:
+
+        async def op(db: aiosqlite.Connection) -> List[Dict[str, Any]]:
             await db.execute(q, params)
-            await db.commit()
+            return await self._fetch_products(db, "id=?", (product_id,))
+
+        self.catalog = self.catalog.with_products(await self._write(op))
+        self._changed("products", (product_id,))
 
     # -------- cart --------
-    async def get_cart(self, user_id: int) -> List[Dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
-            cur = await db.execute(
-                """
-                SELECT ci.product_id, ci.qty, p.title, p.price_cents, p.stock, p.is_active
-                FROM cart_items ci
-                JOIN products p ON p.id = ci.product_id
-                WHERE ci.user_id=?
-                ORDER BY ci.product_id DESC
-                """,
-                (user_id,),
-            )
-            rows = await cur.fetchall()
+    @staticmethod
+    async def _fetch_cart(db: aiosqlite.Connection, user_id: int) -> List[Dict[str, Any]]:
+        cur = await db.execute(
+            """
+            SELECT ci.product_id, ci.qty, p.title, p.price_cents, p.stock, p.is_active
+            FROM cart_items ci
+            JOIN products p ON p.id = ci.product_id
+            WHERE ci.user_id=?
+            ORDER BY ci.product_id DESC
+            """,
+            (user_id,),
+        )
+        rows = await cur.fetchall()
         out = []
         for r in rows:
             out.append(
@@ -318,9 +739,76 @@ class Database:
             )
         return out
 
+    async def get_cart(self, user_id: int) -> List[Dict[str, Any]]:
+        async with self._read() as db:
+            return await self._fetch_cart(db, user_id)
+
+    async def cart_adjust(self, user_id: int, product_id: int, delta: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Atomic +/- on one cart line:
+          - increment is a single stock-bounded UPSERT (active product,
+            qty <= stock not held by others' checkouts, see reserve_cart);
+            expired holds of anybody are released first, the sweeper that
+            timed them may run on another worker or not yet have woken
+          - decrement removes the line once qty reaches zero
+        The refreshed cart is read in the same write.
+        Raises ValueError("PRODUCT_INACTIVE" / "STOCK_NOT_ENOUGH") if an increment can't apply.
+        Returns: (new_qty, cart)
+        """
+
+        now = now_iso()
+
+        async def op(db: aiosqlite.Connection) -> Tuple[int, List[Dict[str, Any]], List[Dict[str, Any]]]:
+            freed: List[Dict[str, Any]] = []
+            if delta > 0:
+                ids = await self._release_reservations(db, "expires_at<=?", (now,))
+                if ids:
+                    freed = await self._fetch_products(db, f"id IN ({','.join('?' * len(ids))})", tuple(ids))
+                # the user's own hold counts as available to them
+                cur = await db.execute(
+                    """
+                    SELECT p.stock - p.reserved + COALESCE(
+                        (SELECT r.qty FROM stock_reservations r WHERE r.user_id=? AND r.product_id=p.id), 0)
+                    FROM products p WHERE p.id=?
+                    """,
+                    (user_id, product_id),
+                )
+                row = await cur.fetchone()
+                available = int(row[0]) if row else 0
+                cur = await db.execute(
+                    """
+                    INSERT INTO cart_items(user_id, product_id, qty)
+                    SELECT ?, p.id, ? FROM products p
+                    WHERE p.id=? AND p.is_active=1 AND ? >= ?
+                    ON CONFLICT(user_id, product_id) DO UPDATE SET qty = cart_items.qty + excluded.qty
+                    WHERE cart_items.qty + excluded.qty <= ?
+                    """,
+                    (user_id, delta, product_id, available, delta, available),
+                )
+                if cur.rowcount == 0:
+                    cur = await db.execute("SELECT is_active FROM products WHERE id=?", (product_id,))
+                    row = await cur.fetchone()
+                    raise ValueError("STOCK_NOT_ENOUGH" if row and int(row[0]) == 1 else "PRODUCT_INACTIVE")
+            elif delta < 0:
+                await db.execute(
+                    "UPDATE cart_items SET qty = qty + ? WHERE user_id=? AND product_id=?",
+                    (delta, user_id, product_id),
+                )
+                await db.execute(
+                    "DELETE FROM cart_items WHERE user_id=? AND product_id=? AND qty <= 0",
+                    (user_id, product_id),
+                )
+
+            cart = await self._fetch_cart(db, user_id)
+            qty = next((it["qty"] for it in cart if it["product_id"] == product_id), 0)
+            return qty, cart, freed
+
+        qty, cart, freed = await self._write(op)
+        self._patch_products(freed)
+        return qty, cart
+
     async def cart_set_qty(self, user_id: int, product_id: int, qty: int) -> None:
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("PRAGMA foreign_keys=ON;")
+        async def op(db: aiosqlite.Connection) -> None:
             if qty <= 0:
                 await db.execute(
                     "DELETE FROM cart_items WHERE user_id=? AND product_id=?",
@@ -335,15 +823,17 @@ class Database:
                     """,
                     (user_id, product_id, qty),
                 )
-            await db.commit()
+
+        await self._write(op)
 
     async def cart_clear(self, user_id: int) -> None:
-        async with aiosqlite.connect(self.path) as db:
+        async def op(db: aiosqlite.Connection) -> None:
             await db.execute("DELETE FROM cart_items WHERE user_id=?", (user_id,))
-            await db.commit()
+
+        await self._write(op)
 
     async def cart_get_qty(self, user_id: int, product_id: int) -> int:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(
                 "SELECT qty FROM cart_items WHERE user_id=? AND product_id=?",
                 (user_id, product_id),
@@ -351,6 +841,121 @@ class Database:
             row = await cur.fetchone()
             return int(row[0]) if row else 0
 
+    # -------- stock reservations --------
+    @staticmethod
+    async def _release_reservations(db: aiosqlite.Connection, where: str, params: Tuple) -> List[int]:
+        """Deletes the holds matching `where` and gives their qty back; returns the product ids."""
+        cur = await db.execute(
+            f"SELECT product_id, SUM(qty) FROM stock_reservations WHERE {where} GROUP BY product_id",
+            params,
+        )
+        held = [(int(q), int(pid)) for pid, q in await cur.fetchall()]
+        if held:
+            await db.executemany("UPDATE products SET reserved = MAX(0, reserved - ?) WHERE id=?", held)
+            await db.execute(f"DELETE FROM stock_reservations WHERE {where}", params)
+        return [pid for _q, pid in held]
+
+    def _patch_products(self, rows: List[Dict[str, Any]]) -> None:
+        if rows:
+            self.catalog = self.catalog.with_products(rows)
+            self._changed("products", tuple(p["id"] for p in rows))
+
+    async def reserve_cart(self, user_id: int, ttl: timedelta = RESERVATION_TTL) -> datetime:
+        """
+        Holds the user's cart quantities for `ttl` (checkout start), in one write:
+          - expired holds of anybody are released first
+          - the user's previous hold is released (the cart may have changed)
+          - one UPDATE raises products.reserved for every cart line whose
+            stock - reserved still covers it; the affected-row count must
+            equal the number of cart lines
+          - the hold rows are copied from cart_items with INSERT ... SELECT
+        Raises ValueError("CART_EMPTY" / "PRODUCT_INACTIVE" / "STOCK_NOT_ENOUGH");
+        a failed hold rolls back whole, the user's previous hold stays.
+        Returns the expiry (UTC) and reports it through on_reserve.
+        """
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        expires = now + ttl
+
+        async def op(db: aiosqlite.Connection) -> List[Dict[str, Any]]:
+            touched = await self._release_reservations(db, "expires_at<=?", (now.isoformat(),))
+            touched += await self._release_reservations(db, "user_id=?", (user_id,))
+
+            cur = await db.execute(
+                """
+                SELECT COUNT(*), COALESCE(SUM(p.is_active != 1), 0)
+                FROM cart_items ci
+                JOIN products p ON p.id = ci.product_id
+                WHERE ci.user_id=?
+                """,
+                (user_id,),
+            )
+            lines, inactive = await cur.fetchone()
+            if not lines:
+                raise ValueError("CART_EMPTY")
+            if inactive:
+                raise ValueError("PRODUCT_INACTIVE")
+
+            cur = await db.execute(
+                """
+                UPDATE products
+                SET reserved = reserved + (SELECT ci.qty FROM cart_items ci WHERE ci.user_id=? AND ci.product_id=products.id)
+                WHERE id IN (SELECT product_id FROM cart_items WHERE user_id=?)
+                  AND stock - reserved >= (SELECT ci.qty FROM cart_items ci WHERE ci.user_id=? AND ci.product_id=products.id)
+                """,
+                (user_id, user_id, user_id),
+            )
+            if cur.rowcount != lines:
+                raise ValueError("STOCK_NOT_ENOUGH")
+            await db.execute(
+                """
+                INSERT INTO stock_reservations(user_id, product_id, qty, expires_at)
+                SELECT user_id, product_id, qty, ? FROM cart_items WHERE user_id=?
+                """,
+                (expires.isoformat(), user_id),
+            )
+
+            where, params = "id IN (SELECT product_id FROM cart_items WHERE user_id=?)", (user_id,)
+            if touched:
+                where += f" OR id IN ({','.join('?' * len(touched))})"
+                params += tuple(touched)
+            return await self._fetch_products(db, where, params)
+
+        self._patch_products(await self._write(op))
+        if self.on_reserve is not None:
+            self.on_reserve(expires.timestamp())
+        return expires
+
+    async def release_reservation(self, user_id: int) -> None:
+        """Gives the user's hold back (checkout cancelled)."""
+
+        async def op(db: aiosqlite.Connection) -> List[Dict[str, Any]]:
+            ids = await self._release_reservations(db, "user_id=?", (user_id,))
+            if not ids:
+                return []
+            return await self._fetch_products(db, f"id IN ({','.join('?' * len(ids))})", tuple(ids))
+
+        self._patch_products(await self._write(op))
+
+    async def sweep_reservations(self) -> int:
+        """Releases every expired hold in one write. Returns the number of products freed."""
+        now = now_iso()
+
+        async def op(db: aiosqlite.Connection) -> List[Dict[str, Any]]:
+            ids = await self._release_reservations(db, "expires_at<=?", (now,))
+            if not ids:
+                return []
+            return await self._fetch_products(db, f"id IN ({','.join('?' * len(ids))})", tuple(ids))
+
+        rows = await self._write(op)
+        self._patch_products(rows)
+        return len(rows)
+
+    async def reservation_expiries(self) -> List[float]:
+        """Distinct expiry times (unix) of the stored holds, to seed the sweeper after a restart."""
+        async with self._read() as db:
+            cur = await db.execute("SELECT DISTINCT expires_at FROM stock_reservations")
+            return [datetime.fromisoformat(r[0]).timestamp() for r in await cur.fetchall()]
+
     # -------- orders --------
     async def create_order_from_cart(
         self,
@@ -361,102 +966,206 @@ class Database:
         delivery_method: str,
         address: str,
         comment: Optional[str],
-    ) -> Tuple[int, int]:
+        token: Optional[str] = None,
+    ) -> Tuple[int, int, bool]:
         """
-        Transaction:
-          - read cart
-          - validate stock
-          - insert order
-          - insert order_items
-          - decrement stock
+        Runs as one write of the writer task, i.e. inside BEGIN IMMEDIATE, so
+        no other checkout can interleave:
+          - idempotency: if `token` (the checkout token) already created an
+            order, return that order and write nothing
+          - summarize cart (lines, total, inactive products)
+          - if the user's live hold (reserve_cart) matches the cart line for
+            line, convert it: stock and reserved drop by the held qty, with
+            no availability check, the stock was set aside at checkout start
+          - otherwise release the hold, and expired holds of anybody (see
+            cart_adjust), and decrement stock with one guarded UPDATE
+            (stock - reserved >= qty); the affected-row count must equal
+            the number of cart lines
+          - insert order with its final total
+          - copy order_items from cart_items with INSERT ... SELECT
+          - add the order to stats_counters and stats_product_daily
           - clear cart
-        Returns: (order_id, total_cents)
+        Any failure rolls back the whole write; on success the new stock
+        levels are patched into the catalog snapshot.
+        Tokens are kept for ORDER_REQUEST_TTL and purged by later checkouts.
+        Returns: (order_id, total_cents, created)
         """
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("PRAGMA foreign_keys=ON;")
-            await db.execute("BEGIN;")
+        expired = (datetime.now(timezone.utc) - ORDER_REQUEST_TTL).isoformat(timespec="seconds")
+
+        async def op(db: aiosqlite.Connection) -> Tuple[int, int, bool, List[Dict[str, Any]]]:
+            if token:
+                cur = await db.execute(
+                    """
+                    SELECT o.id, o.total_cents
+                    FROM order_requests r
+                    JOIN orders o ON o.id = r.order_id
+                    WHERE r.token=?
+                    """,
+                    (token,),
+                )
+                row = await cur.fetchone()
+                if row:
+                    return int(row[0]), int(row[1]), False, []
 
             cur = await db.execute(
                 """
-                SELECT ci.product_id, ci.qty, p.title, p.price_cents, p.stock, p.is_active
+                SELECT COUNT(*), COALESCE(SUM(ci.qty * p.price_cents), 0), COALESCE(SUM(p.is_active != 1), 0)
                 FROM cart_items ci
                 JOIN products p ON p.id = ci.product_id
                 WHERE ci.user_id=?
                 """,
                 (user_id,),
             )
-            cart = await cur.fetchall()
-            if not cart:
-                await db.execute("ROLLBACK;")
+            lines, total, inactive = await cur.fetchone()
+            if not lines:
                 raise ValueError("CART_EMPTY")
+            if inactive:
+                raise ValueError("PRODUCT_INACTIVE")
 
-            # validate stock & active
-            for (pid, qty, _title, _price, stock, is_active) in cart:
-                if int(is_active) != 1:
-                    await db.execute("ROLLBACK;")
-                    raise ValueError("PRODUCT_INACTIVE")
-                if int(qty) > int(stock):
-                    await db.execute("ROLLBACK;")
-                    raise ValueError("STOCK_NOT_ENOUGH")
-
-            # create order
-            cur2 = await db.execute(
+            cur = await db.execute(
                 """
-                INSERT INTO orders(user_id,status,payment_method,name,phone,city,delivery_method,address,comment,total_cents,created_at,updated_at)
-                VALUES(?,?,?,?,?,?,?,?,?,?,?,?)
+                SELECT COUNT(*), COALESCE(SUM(ci.qty = r.qty AND r.expires_at > ?), 0)
+                FROM stock_reservations r
+                LEFT JOIN cart_items ci ON ci.user_id = r.user_id AND ci.product_id = r.product_id
+                WHERE r.user_id=?
                 """,
-                (user_id, "NEW", None, name, phone, city, delivery_method, address, comment, 0, now, now),
+                (now, user_id),
             )
-            order_id = cur2.lastrowid
-
-            total = 0
-            for (pid, qty, title, price_cents, stock, _is_active) in cart:
-                qty = int(qty)
-                price = int(price_cents)
-                line = qty * price
-                total += line
-                await db.execute(
+            holds, matching = await cur.fetchone()
+            released: List[int] = []
+            if holds == lines and matching == lines:
+                # the hold becomes the order; stock >= qty only guards an
+                # admin write-off below the held amount
+                cur = await db.execute(
                     """
-                    INSERT INTO order_items(order_id,product_id,title,price_cents,qty,line_total_cents)
-                    VALUES(?,?,?,?,?,?)
+                    UPDATE products
+                    SET stock = stock - (SELECT r.qty FROM stock_reservations r WHERE r.user_id=? AND r.product_id=products.id),
+                        reserved = reserved - (SELECT r.qty FROM stock_reservations r WHERE r.user_id=? AND r.product_id=products.id),
+                        updated_at=?
+                    WHERE id IN (SELECT product_id FROM stock_reservations WHERE user_id=?)
+                      AND stock >= (SELECT r.qty FROM stock_reservations r WHERE r.user_id=? AND r.product_id=products.id)
                     """,
-                    (order_id, int(pid), str(title), price, qty, line),
+                    (user_id, user_id, now, user_id, user_id),
                 )
-                # decrement stock
-                await db.execute(
-                    "UPDATE products SET stock = stock - ?, updated_at=? WHERE id=?",
-                    (qty, now, int(pid)),
+                await db.execute("DELETE FROM stock_reservations WHERE user_id=?", (user_id,))
+            else:
+                # no hold, an expired one, or the cart changed after it was taken;
+                # holds that expired must not keep blocking the guarded UPDATE
+                released = await self._release_reservations(db, "expires_at<=?", (now,))
+                if holds:
+                    released += await self._release_reservations(db, "user_id=?", (user_id,))
+                cur = await db.execute(
+                    """
+                    UPDATE products
+                    SET stock = stock - (SELECT ci.qty FROM cart_items ci WHERE ci.user_id=? AND ci.product_id=products.id),
+                        updated_at=?
+                    WHERE id IN (SELECT product_id FROM cart_items WHERE user_id=?)
+                      AND stock - reserved >= (SELECT ci.qty FROM cart_items ci WHERE ci.user_id=? AND ci.product_id=products.id)
+                    """,
+                    (user_id, now, user_id, user_id),
                 )
+            if cur.rowcount != lines:
+                raise ValueError("STOCK_NOT_ENOUGH")
+
+            cur = await db.execute(
+                """
+                INSERT INTO orders(user_id,status,payment_method,name,phone,city,delivery_method,address,comment,total_cents,created_at,updated_at)
+                VALUES(?,?,?,?,?,?,?,?,?,?,?,?)
+                """,
+                (user_id, "NEW", None, name, phone, city, delivery_method, address, comment, int(total), now, now),
+            )
+            order_id = cur.lastrowid
 
             await db.execute(
-                "UPDATE orders SET total_cents=?, updated_at=? WHERE id=?",
-                (total, now, order_id),
+                """
+                INSERT INTO order_items(order_id,product_id,title,price_cents,qty,line_total_cents)
+                SELECT ?, p.id, p.title, p.price_cents, ci.qty, ci.qty * p.price_cents
+                FROM cart_items ci
+                JOIN products p ON p.id = ci.product_id
+                WHERE ci.user_id=?
+                ORDER BY ci.product_id DESC
+                """,
+                (order_id, user_id),
             )
+            await self._bump_stats(db, order_id, now, 1, 1)
+            where, params = "id IN (SELECT product_id FROM cart_items WHERE user_id=?)", (user_id,)
+            if released:
+                # a released hold may cover products no longer in the cart (or other users' carts)
+                where += f" OR id IN ({','.join('?' * len(released))})"
+                params += tuple(released)
+            stock_rows = await self._fetch_products(db, where, params)
             await db.execute("DELETE FROM cart_items WHERE user_id=?", (user_id,))
-            await db.commit()
-            return int(order_id), int(total)
+            if token:
+                await db.execute("DELETE FROM order_requests WHERE created_at<?", (expired,))
+                await db.execute(
+                    "INSERT INTO order_requests(token,order_id,created_at) VALUES(?,?,?)",
+                    (token, order_id, now),
+                )
+            return int(order_id), int(total), True, stock_rows
+
+        order_id, total, created, stock_rows = await self._write(op)
+        if created:
+            self.catalog = self.catalog.with_products(stock_rows)
+            self._changed("products", tuple(p["id"] for p in stock_rows))
+        return order_id, total, created
 
-    async def list_user_orders(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
+    async def _orders_page(
+        self,
+        columns: str,
+        where: str,
+        params: Tuple,
+        limit: int,
+        before: Optional[int],
+        after: Optional[int],
+    ) -> Tuple[List[Tuple], bool, bool]:
+        """
+        Keyset page over orders, newest first: `before` pages towards older
+        orders (id < before), `after` towards newer ones (id > after). Each
+        page is one index range read of limit+1 rows, however deep it is.
+        Paging newer up to the newest orders returns the first page, so it
+        is always full. Returns (rows, has_older, has_newer).
+        """
+        if after is not None:
+            cond, order, args = f"{where} AND id>?", "ASC", params + (after,)
+        elif before is not None:
+            cond, order, args = f"{where} AND id<?", "DESC", params + (before,)
+        else:
+            cond, order, args = where, "DESC", params
+        async with self._read() as db:
             cur = await db.execute(
-                """
-                SELECT id, status, payment_method, total_cents, created_at
-                FROM orders
-                WHERE user_id=?
-                ORDER BY id DESC
-                LIMIT ?
-                """,
-                (user_id, limit),
+                f"SELECT {columns} FROM orders WHERE {cond} ORDER BY id {order} LIMIT ?",
+                args + (limit + 1,),
             )
-            rows = await cur.fetchall()
-        return [
+            rows = list(await cur.fetchall())
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if after is not None:
+            if not more:
+                return await self._orders_page(columns, where, params, limit, None, None)
+            rows.reverse()
+            return rows, True, True
+        return rows, more, before is not None
+
+    async def list_user_orders(
+        self,
+        user_id: int,
+        limit: int = 10,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], bool, bool]:
+        """Returns (orders, has_older, has_newer), see _orders_page()."""
+        rows, has_older, has_newer = await self._orders_page(
+            "id, status, payment_method, total_cents, created_at", "user_id=?", (user_id,), limit, before, after
+        )
+        orders = [
             {"id": int(r[0]), "status": r[1], "payment_method": r[2], "total_cents": int(r[3]), "created_at": r[4]}
             for r in rows
         ]
+        return orders, has_older, has_newer
 
     async def get_order(self, order_id: int) -> Optional[Dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(
                 """
                 SELECT id,user_id,status,payment_method,name,phone,city,delivery_method,address,comment,total_cents,created_at,updated_at
@@ -484,7 +1193,7 @@ class Database:
         }
 
     async def get_order_items(self, order_id: int) -> List[Dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
+        async with self._read() as db:
             cur = await db.execute(
                 """
                 SELECT title, price_cents, qty, line_total_cents
@@ -499,34 +1208,329 @@ class Database:
 
     async def set_order_payment_method(self, order_id: int, method: str) -> None:
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
+
+        async def op(db: aiosqlite.Connection) -> None:
             await db.execute("UPDATE orders SET payment_method=?, updated_at=? WHERE id=?", (method, now, order_id))
-            await db.commit()
 
-    async def admin_list_orders(self, limit: int = 20) -> List[Dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
+        await self._write(op)
+
+    async def admin_list_orders(
+        self,
+        limit: int = 20,
+        status: Optional[str] = None,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], bool, bool]:
+        """Returns (orders, has_older, has_newer), optionally only orders in `status`; see _orders_page()."""
+        where, params = ("status=?", (status,)) if status else ("1", ())
+        rows, has_older, has_newer = await self._orders_page(
+            "id,user_id,status,total_cents,created_at", where, params, limit, before, after
+        )
+        orders = [{"id": int(r[0]), "user_id": int(r[1]), "status": r[2], "total_cents": int(r[3]), "created_at": r[4]} for r in rows]
+        return orders, has_older, has_newer
+
+    async def admin_set_order_status(self, order_id: int, status: str) -> None:
+        now = now_iso()
+
+        async def op(db: aiosqlite.Connection) -> None:
+            cur = await db.execute("SELECT status, created_at FROM orders WHERE id=?", (order_id,))
+            row = await cur.fetchone()
+            if row is None or row[0] == status:
+                return
+            await db.execute("UPDATE orders SET status=?, updated_at=? WHERE id=?", (status, now, order_id))
+            # revenue follows the order in and out of CANCELED
+            was, will = row[0] in REVENUE_STATUSES, status in REVENUE_STATUSES
+            if was != will:
+                await self._bump_stats(db, order_id, row[1], 0, 1 if will else -1)
+
+        await self._write(op)
+
+    # -------- stats --------
+    # stats_counters and stats_product_daily are rollups maintained inside the
+    # order write transactions, so the stats screens never read orders or
+    # order_items; rebuild_stats() recomputes both from scratch and reports
+    # the drift, if any.
+    @staticmethod
+    async def _bump_stats(db: aiosqlite.Connection, order_id: int, created_at: str, orders: int, sign: int) -> None:
+        """Adds (sign=1) or removes (sign=-1) the order's revenue; orders is the orders_count delta."""
+        day = created_at[:10]
+        cur = await db.execute("SELECT total_cents FROM orders WHERE id=?", (order_id,))
+        (total,) = await cur.fetchone()
+        await db.executemany(
+            """
+            INSERT INTO stats_counters(bucket,orders_count,revenue_cents,revenue_orders) VALUES(?,?,?,?)
+            ON CONFLICT(bucket) DO UPDATE SET
+                orders_count = orders_count + excluded.orders_count,
+                revenue_cents = revenue_cents + excluded.revenue_cents,
+                revenue_orders = revenue_orders + excluded.revenue_orders
+            """,
+            [(bucket, orders, sign * int(total), sign) for bucket in ("all", day)],
+        )
+        await db.execute(
+            """
+            INSERT INTO stats_product_daily(day,product_id,title,units,revenue_cents)
+            SELECT ?, product_id, title, ? * qty, ? * line_total_cents
+            FROM order_items WHERE order_id=?
+            ON CONFLICT(day, product_id) DO UPDATE SET
+                title = excluded.title,
+                units = units + excluded.units,
+                revenue_cents = revenue_cents + excluded.revenue_cents
+            """,
+            (day, sign, sign, order_id),
+        )
+
+    @staticmethod
+    async def _rebuild_stats(db: aiosqlite.Connection) -> None:
+        marks = ",".join("?" * len(REVENUE_STATUSES))
+        counters = (
+            f"COUNT(*), COALESCE(SUM(CASE WHEN status IN ({marks}) THEN total_cents END), 0), "
+            f"COALESCE(SUM(status IN ({marks})), 0)"
+        )
+        await db.execute("DELETE FROM stats_counters")
+        await db.execute(
+            f"INSERT INTO stats_counters(bucket,orders_count,revenue_cents,revenue_orders) SELECT 'all', {counters} FROM orders",
+            REVENUE_STATUSES * 2,
+        )
+        await db.execute(
+            f"""
+            INSERT INTO stats_counters(bucket,orders_count,revenue_cents,revenue_orders)
+            SELECT substr(created_at, 1, 10), {counters} FROM orders GROUP BY 1
+            """,
+            REVENUE_STATUSES * 2,
+        )
+        await db.execute("DELETE FROM stats_product_daily")
+        await db.execute(
+            f"""
+            INSERT INTO stats_product_daily(day,product_id,title,units,revenue_cents)
+            SELECT substr(o.created_at, 1, 10), oi.product_id, MAX(oi.title), SUM(oi.qty), SUM(oi.line_total_cents)
+            FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            WHERE o.status IN ({marks})
+            GROUP BY 1, 2
+            """,
+            REVENUE_STATUSES,
+        )
+
+    @staticmethod
+    async def _stats_row(db: aiosqlite.Connection, bucket: str) -> Tuple[int, int]:
+        cur = await db.execute("SELECT orders_count, revenue_cents FROM stats_counters WHERE bucket=?", (bucket,))
+        row = await cur.fetchone()
+        return (int(row[0]), int(row[1])) if row else (0, 0)
+
+    @staticmethod
+    def _since(days: int) -> str:
+        return (datetime.now(timezone.utc) - timedelta(days=days - 1)).date().isoformat()
+
+    async def admin_stats(self) -> Dict[str, int]:
+        today = now_iso()[:10]
+        async with self._read() as db:
+            cnt, rev = await self._stats_row(db, "all")
+            cnt_today, rev_today = await self._stats_row(db, today)
+        return {
+            "orders_count": cnt,
+            "revenue_cents": rev,
+            "orders_today": cnt_today,
+            "revenue_today_cents": rev_today,
+        }
+
+    async def rebuild_stats(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Recomputes both rollups from orders in one write. Returns (before, after) of the 'all' bucket."""
+
+        async def op(db: aiosqlite.Connection) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+            before = await self._stats_row(db, "all")
+            await self._rebuild_stats(db)
+            return before, await self._stats_row(db, "all")
+
+        before, after = await self._write(op)
+        return (
+            {"orders_count": before[0], "revenue_cents": before[1]},
+            {"orders_count": after[0], "revenue_cents": after[1]},
+        )
+
+    async def stats_daily(self, days: int) -> List[Dict[str, Any]]:
+        """One row per UTC day of the last `days` days (newest first), days without orders included."""
+        since = self._since(days)
+        async with self._read() as db:
             cur = await db.execute(
                 """
-                SELECT id,user_id,status,total_cents,created_at
-                FROM orders
-                ORDER BY id DESC
+                SELECT bucket, orders_count, revenue_cents, revenue_orders
+                FROM stats_counters
+                WHERE bucket >= ? AND bucket <> 'all'
+                """,
+                (since,),
+            )
+            rows = {r[0]: r for r in await cur.fetchall()}
+        today = datetime.now(timezone.utc).date()
+        out = []
+        for i in range(days):
+            day = (today - timedelta(days=i)).isoformat()
+            _, cnt, rev, rev_orders = rows.get(day, (day, 0, 0, 0))
+            out.append(
+                {
+                    "day": day,
+                    "orders_count": int(cnt),
+                    "revenue_cents": int(rev),
+                    "avg_basket_cents": int(rev) // int(rev_orders) if rev_orders else 0,
+                }
+            )
+        return out
+
+    async def stats_top_products(self, days: int, limit: int = 10) -> List[Dict[str, Any]]:
+        since = self._since(days)
+        async with self._read() as db:
+            cur = await db.execute(
+                """
+                SELECT product_id, MAX(title), SUM(units), SUM(revenue_cents) AS revenue
+                FROM stats_product_daily
+                WHERE day >= ?
+                GROUP BY product_id
+                HAVING SUM(units) > 0
+                ORDER BY revenue DESC, product_id
                 LIMIT ?
                 """,
-                (limit,),
+                (since, limit),
             )
             rows = await cur.fetchall()
-        return [{"id": int(r[0]), "user_id": int(r[1]), "status": r[2], "total_cents": int(r[3]), "created_at": r[4]} for r in rows]
+        return [{"product_id": int(r[0]), "title": r[1], "units": int(r[2]), "revenue_cents": int(r[3])} for r in rows]
 
-    async def admin_set_order_status(self, order_id: int, status: str) -> None:
+    # -------- bulk import / export --------
+    async def import_products(self, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Upserts one batch of parsed CSV rows (see app.csv_io) with a single
+        executemany: rows with the id of an existing product update it
+        (photo and created_at are kept), the rest are inserted. Stock is
+        absolute here. Returns (created, updated).
+        """
+        if not rows:
+            return 0, 0
         now = now_iso()
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("UPDATE orders SET status=?, updated_at=? WHERE id=?", (status, now, order_id))
-            await db.commit()
+        given = tuple({r["id"] for r in rows if r["id"] is not None})
+        params = [
+            (r["id"], r["category_id"], r["title"], r["description"], r["price_cents"], r["stock"], r["is_active"], now, now)
+            for r in rows
+        ]
 
-    async def admin_stats(self) -> Dict[str, int]:
-        async with aiosqlite.connect(self.path) as db:
-            cur1 = await db.execute("SELECT COUNT(*) FROM orders;")
-            (cnt,) = await cur1.fetchone()
-            cur2 = await db.execute("SELECT COALESCE(SUM(total_cents),0) FROM orders WHERE status IN ('NEW','PAID','IN_DELIVERY','DONE');")
-            (rev,) = await cur2.fetchone()
-        return {"orders_count": int(cnt), "revenue_cents": int(rev)}
+        async def op(db: aiosqlite.Connection) -> Tuple[int, List[Dict[str, Any]]]:
+            existing = 0
+            if given:
+                cur = await db.execute(f"SELECT COUNT(*) FROM products WHERE id IN ({','.join('?' * len(given))})", given)
+                existing = (await cur.fetchone())[0]
+            cur = await db.execute("SELECT COALESCE(MAX(id), 0) FROM products")
+            max_before = (await cur.fetchone())[0]
+            await db.executemany(
+                """
+                INSERT INTO products(id,category_id,title,description,price_cents,stock,is_active,created_at,updated_at)
+                VALUES(?,?,?,?,?,?,?,?,?)
+                ON CONFLICT(id) DO UPDATE SET
+                    category_id=excluded.category_id, title=excluded.title, description=excluded.description,
+                    price_cents=excluded.price_cents, stock=excluded.stock, is_active=excluded.is_active,
+                    updated_at=excluded.updated_at
+                """,
+                params,
+            )
+            # one writer: every row inserted without an id got an id above max_before
+            touched = await self._fetch_products(
+                db, f"id > ? OR id IN ({','.join('?' * len(given))})" if given else "id > ?", (max_before, *given)
+            )
+            return existing, touched
+
+        existing, touched = await self._write(op)
+        self.catalog = self.catalog.with_products(touched)
+        self._changed("products", tuple(p["id"] for p in touched))
+        return len(touched) - existing, existing
+
+    async def adjust_products(self, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """
+        Applies a whole restock list (see app.csv_io.read_adjustments) in one
+        write with one executemany: stock moves by stock_delta relative to
+        the stock at commit time, so orders placed while the list was being
+        prepared are kept (never below 0); a price, if given, replaces the
+        current one. Unknown ids are skipped.
+        Returns (diffs, missing ids); a diff has id, title, stock_before,
+        stock_after, price_before, price_after, one per product in input order.
+        """
+        ids = tuple(dict.fromkeys(r["product_id"] for r in rows))
+        if not ids:
+            return [], []
+        now = now_iso()
+        marks = ",".join("?" * len(ids))
+        params = [(r["stock_delta"], r["price_cents"], now, r["product_id"]) for r in rows]
+
+        async def op(db: aiosqlite.Connection) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+            before = await self._fetch_products(db, f"id IN ({marks})", ids)
+            await db.executemany(
+                "UPDATE products SET stock = MAX(0, stock + ?), price_cents = COALESCE(?, price_cents), updated_at=? WHERE id=?",
+                params,
+            )
+            return before, await self._fetch_products(db, f"id IN ({marks})", ids)
+
+        before, after = await self._write(op)
+        self.catalog = self.catalog.with_products(after)
+        self._changed("products", tuple(p["id"] for p in after))
+
+        old = {p["id"]: p for p in before}
+        new = {p["id"]: p for p in after}
+        diffs = [
+            {
+                "id": pid,
+                "title": new[pid]["title"],
+                "stock_before": old[pid]["stock"],
+                "stock_after": new[pid]["stock"],
+                "price_before": old[pid]["price_cents"],
+                "price_after": new[pid]["price_cents"],
+            }
+            for pid in ids
+            if pid in new
+        ]
+        return diffs, [pid for pid in ids if pid not in new]
+
+    async def _export(self, sql: str, params: Tuple, emit: Callable[[List[Tuple]], Any], chunk: int) -> int:
+        # one reader connection for the whole export: a consistent snapshot,
+        # at most `chunk` rows in memory; the writer is never blocked (WAL)
+        count = 0
+        async with self._read() as db:
+            async with db.execute(sql, params) as cur:
+                while True:
+                    rows = await cur.fetchmany(chunk)
+                    if not rows:
+                        return count
+                    emit(rows)
+                    count += len(rows)
+
+    async def export_products(self, emit: Callable[[List[Tuple]], Any], chunk: int = 1000) -> int:
+        """
+        Calls emit(rows) per chunk of (id, category_id, title, description,
+        price_cents, stock, is_active), by id. Returns the row count.
+        """
+        return await self._export(
+            "SELECT id, category_id, title, description, price_cents, stock, is_active FROM products ORDER BY id",
+            (),
+            emit,
+            chunk,
+        )
+
+    async def export_orders(
+        self, emit: Callable[[List[Tuple]], Any], status: Optional[str] = None, chunk: int = 1000
+    ) -> int:
+        """
+        Calls emit(rows) per chunk of order lines, newest order first: order
+        columns (id, created_at, status, payment_method, user_id, name, phone,
+        city, delivery_method, address, comment, total_cents) followed by
+        item columns (product_id, title, qty, price_cents, line_total_cents).
+        Returns the line count.
+        """
+        where, params = ("WHERE o.status=?", (status,)) if status else ("", ())
+        return await self._export(
+            f"""
+            SELECT o.id, o.created_at, o.status, o.payment_method, o.user_id, o.name, o.phone, o.city,
+                   o.delivery_method, o.address, o.comment, o.total_cents,
+                   oi.product_id, oi.title, oi.qty, oi.price_cents, oi.line_total_cents
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.id
+            {where}
+            ORDER BY o.id DESC, oi.id
+            """,
+            params,
+            emit,
+            chunk,
+        )
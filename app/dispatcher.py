@@ -0,0 +1,53 @@
+from typing import Optional
+
+from aiogram import Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
+
+from app.activity import ActivityTracker
+from app.config import Config
+from app.db import Database
+from app.errors import setup_global_error_handler
+from app.fsm_storage import UserEventIsolation
+from app.middlewares import DependencyMiddleware, UpdateDedupMiddleware
+
+from app.handlers.common import router as common_router
+from app.handlers.catalog import router as catalog_router
+from app.handlers.cart import router as cart_router
+from app.handlers.checkout import router as checkout_router
+from app.handlers.orders import router as orders_router
+from app.handlers.support import router as support_router
+from app.handlers.admin import router as admin_router
+from app.handlers.inline import router as inline_router
+
+
+def build_dispatcher(
+    db: Database,
+    cfg: Config,
+    activity: Optional[ActivityTracker] = None,
+    storage: Optional[BaseStorage] = None,
+) -> Dispatcher:
+    # routers are module-level singletons: one dispatcher per process
+    # (storage=None falls back to aiogram's MemoryStorage)
+    dp = Dispatcher(storage=storage, events_isolation=UserEventIsolation())
+    setup_global_error_handler(dp)
+
+    # drop redelivered updates before they reach FSM locks or handlers: the
+    # first registered outer middleware runs outermost, and Dispatcher()
+    # already registered its FSM middleware (which takes the user lock),
+    # so the dedup goes in ahead of it
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(UpdateDedupMiddleware())
+    dp.update.outer_middleware(dp.fsm)
+
+    # ✅ inject db/cfg into handler kwargs
+    dp.update.middleware(DependencyMiddleware(db=db, cfg=cfg, activity=activity))
+
+    dp.include_router(common_router)
+    dp.include_router(catalog_router)
+    dp.include_router(cart_router)
+    dp.include_router(checkout_router)
+    dp.include_router(orders_router)
+    dp.include_router(support_router)
+    dp.include_router(admin_router)
+    dp.include_router(inline_router)
+    return dp
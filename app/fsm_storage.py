@@ -0,0 +1,253 @@
+import asyncio
+import copy
+import json
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, StateType, StorageKey
+
+from app.db import Database
+from app.metrics import metrics
+
+logger = logging.getLogger("app.fsm_storage")
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds")
+
+
+def _ts(iso: str) -> float:
+    return datetime.fromisoformat(iso).timestamp()
+
+
+class _Entry:
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[Dict[str, Any]] = None, updated_at: float = 0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage on the shop database (fsm_state table):
+      - hot tier: LRU of the last `capacity` keys; the first access of a key
+        loads its row lazily (empty keys are cached too)
+      - write-behind: set_state()/set_data() only mark the key dirty; a
+        background task writes all dirty keys in one write every `interval`
+        seconds, or sooner once `max_dirty` keys are pending; close() flushes
+      - TTL: a key not written for `ttl` seconds reads as empty; the sweeper
+        deletes such rows every `sweep_interval` seconds
+    Dirty keys evicted from the LRU stay in the pending set until flushed,
+    and a batch being written stays readable until its write commits, so
+    eviction never loses a write nor serves the older row.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        ttl: float = 24 * 3600,
+        capacity: int = 10000,
+        interval: float = 1.0,
+        max_dirty: int = 500,
+        sweep_interval: float = 600.0,
+    ):
+        self.db = db
+        self.ttl = ttl
+        self.capacity = max(1, int(capacity))
+        self.interval = interval
+        self.max_dirty = max(1, int(max_dirty))
+        self.sweep_interval = sweep_interval
+        self._hot: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._dirty: Dict[str, _Entry] = {}
+        self._flushing: Dict[str, _Entry] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(
+            str(part) if part is not None else ""
+            for part in (key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny)
+        )
+
+    # -------- hot tier --------
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return not entry.empty and now - entry.updated_at > self.ttl
+
+    def _remember(self, k: str, entry: _Entry) -> None:
+        self._hot[k] = entry
+        self._hot.move_to_end(k)
+        while len(self._hot) > self.capacity:
+            self._hot.popitem(last=False)
+
+    async def _entry(self, key: StorageKey) -> _Entry:
+        k = self._key(key)
+        entry = self._hot.get(k)
+        if entry is not None:
+            self._hot.move_to_end(k)
+        else:
+            entry = self._pending(k)
+            if entry is None:
+                row = await self.db.fsm_load(k)
+                # a concurrent call may have created the entry meanwhile
+                entry = self._hot.get(k) or self._pending(k)
+                if entry is None:
+                    entry = _Entry()
+                    if row is not None:
+                        state, data, updated_at = row
+                        entry = _Entry(state, json.loads(data), _ts(updated_at))
+            self._remember(k, entry)
+
+        if self._expired(entry, time.time()):
+            entry.state, entry.data = None, {}
+            self._mark(k, entry)
+        return entry
+
+    def _pending(self, k: str) -> Optional[_Entry]:
+        """The not yet committed value of a key, newest first."""
+        entry = self._dirty.get(k)
+        return entry if entry is not None else self._flushing.get(k)
+
+    def _mark(self, k: str, entry: _Entry) -> None:
+        entry.updated_at = time.time()
+        self._dirty[k] = entry
+        if len(self._dirty) >= self.max_dirty:
+            self._wake.set()
+
+    # -------- BaseStorage --------
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        state = state.state if isinstance(state, State) else state
+        if entry.state == state:
+            return  # state.clear() on every menu tap must not cost a write
+        entry.state = state
+        self._mark(self._key(key), entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = await self._entry(key)
+        if entry.data == data:
+            return
+        entry.data = copy.deepcopy(data)
+        self._mark(self._key(key), entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self._entry(key)).data)
+
+    async def close(self) -> None:
+        await self.stop()
+
+    # -------- write-behind --------
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        self._flushing = batch
+        rows = []
+        deleted = []
+        for k, entry in batch.items():
+            if entry.empty:
+                deleted.append(k)
+            else:
+                rows.append((k, entry.state, json.dumps(entry.data, ensure_ascii=False), _iso(entry.updated_at)))
+        try:
+            await self.db.fsm_save(rows, deleted)
+        except Exception:
+            logger.exception("FSM flush failed (%s keys)", len(batch))
+            self._requeue(batch)
+        except BaseException:
+            # cancelled by stop(): the write may not have run, the final flush repeats it
+            self._requeue(batch)
+            raise
+        finally:
+            self._flushing = {}
+
+    def _requeue(self, batch: Dict[str, _Entry]) -> None:
+        # newer writes made meanwhile win
+        for k, entry in batch.items():
+            self._dirty.setdefault(k, entry)
+
+    async def sweep(self) -> None:
+        now = time.time()
+        for k in [k for k, e in self._hot.items() if self._expired(e, now) and self._pending(k) is None]:
+            del self._hot[k]
+        try:
+            purged = await self.db.fsm_purge(_iso(now - self.ttl))
+        except Exception:
+            logger.exception("FSM sweep failed")
+            return
+        if purged:
+            logger.info("FSM sweep removed %s idle sessions", purged)
+
+    async def _run(self) -> None:
+        next_sweep = time.monotonic() + self.sweep_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + self.sweep_interval
+                await self.sweep()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+class UserEventIsolation(BaseEventIsolation):
+    """
+    Serializes updates of one user: aiogram's FSMContextMiddleware holds
+    lock(key) around reading the FSM state and running the handler, so a
+    double-tapped "Confirm" or two fast cart taps run one after another,
+    while different users still run in parallel.
+    Locks live in a WeakValueDictionary: a lock exists only while some
+    update holds or waits for it, so the table never outgrows the number
+    of users being served right now.
+    """
+
+    def __init__(self) -> None:
+        self._locks: "weakref.WeakValueDictionary[Tuple[int, int], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        # per user, whatever chat the update comes from
+        k = (key.bot_id, key.user_id)
+        lock = self._locks.get(k)
+        if lock is None:
+            lock = self._locks[k] = asyncio.Lock()
+        if lock.locked():
+            metrics.inc("fsm.lock_contended")
+        started = time.monotonic()
+        async with lock:
+            metrics.observe("fsm.lock_wait", time.monotonic() - started)
+            yield
+
+    async def close(self) -> None:
+        self._locks.clear()
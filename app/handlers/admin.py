@@ -1,12 +1,27 @@
-from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message
+import asyncio
+import csv
+import io
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from aiogram import Bot, Router, F
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, FSInputFile, Message
 from aiogram.fsm.context import FSMContext
 
+from app.csv_io import ORDER_COLUMNS, PRODUCT_COLUMNS, format_cents, read_adjustments, read_products
 from app.db import Database
+from app.sessions import UserSession
 from app.config import Config
 from app.i18n import t, ORDER_STATUSES
 from app.keyboards import (
     kb_admin_panel,
+    kb_admin_stats,
     kb_admin_categories,
     kb_admin_category,
     kb_admin_products_root,
@@ -16,7 +31,20 @@ from app.keyboards import (
     kb_admin_order,
 )
 from app.ui import send_or_edit, safe_delete_message
-from app.states import AdminCategoryStates, AdminProductStates
+from app.metrics import metrics
+from app.outbound import send_notification
+from app.states import AdminCategoryStates, AdminImportStates, AdminProductStates
+
+logger = logging.getLogger("app.admin")
+
+STATS_TOP_DAYS = 30
+STATS_TOP_N = 10
+
+IMPORT_BATCH = 500  # rows per write transaction
+IMPORT_PROGRESS_EVERY = 2.0  # seconds between progress edits
+IMPORT_MAX_BYTES = 20 * 1024 * 1024  # Bot API getFile limit
+ADJUST_MAX_ROWS = 10000  # one write transaction holds the writer for the whole list
+ADJUST_SUMMARY_LINES = 20  # longer diffs come as a CSV file
 
 router = Router()
 
@@ -31,9 +59,9 @@ async def show_admin_panel(bot, db: Database, cfg: Config, chat_id: int, user_id
 
 # ---------- PANEL ----------
 @router.callback_query(F.data == "menu:admin")
-async def cb_admin_from_menu(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_admin_from_menu(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
     if not is_admin(cfg, callback.from_user.id):
         await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, t(lang, "admin_only"), None)
         return
@@ -41,28 +69,37 @@ async def cb_admin_from_menu(callback: CallbackQuery, db: Database, cfg: Config)
 
 
 @router.callback_query(F.data == "admin:back")
-async def cb_admin_back(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_admin_back(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
     await show_admin_panel(callback.bot, db, cfg, callback.message.chat.id, callback.from_user.id, lang)
 
 
 # ---------- CATEGORIES ----------
-@router.callback_query(F.data == "admin:cats")
-async def cb_admin_cats(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext):
+async def show_admin_categories(bot, db: Database, chat_id: int, user_id: int, lang: str, text: str, page: int = 0):
+    cats, page, pages = await db.list_categories_page(page, only_active=False)
+    if pages > 1:
+        text += f" {page + 1}/{pages}"
+    await send_or_edit(bot, db, chat_id, user_id, text, kb_admin_categories(lang, cats, page, pages))
+
+
+# admin:cats[:<page>]
+@router.callback_query((F.data == "admin:cats") | F.data.startswith("admin:cats:"))
+async def cb_admin_cats(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext, session: UserSession):
     await callback.answer()
     await state.clear()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
     if not is_admin(cfg, callback.from_user.id):
         return
-    cats = await db.list_categories(only_active=False)
-    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, "🗂️ Categories:", kb_admin_categories(lang, cats))
+    parts = callback.data.split(":")
+    page = int(parts[2]) if len(parts) > 2 else 0
+    await show_admin_categories(callback.bot, db, callback.message.chat.id, callback.from_user.id, lang, "🗂️ Categories:", page)
 
 
 @router.callback_query(F.data == "admin:cat:create")
-async def cb_admin_cat_create(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext):
+async def cb_admin_cat_create(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
     if not is_admin(cfg, callback.from_user.id):
         return
     await state.set_state(AdminCategoryStates.create_name)
@@ -70,7 +107,7 @@ async def cb_admin_cat_create(callback: CallbackQuery, db: Database, cfg: Config
 
 
 @router.message(AdminCategoryStates.create_name)
-async def st_admin_cat_create(message: Message, db: Database, cfg: Config, state: FSMContext):
+async def st_admin_cat_create(message: Message, db: Database, cfg: Config, state: FSMContext, session: UserSession):
     await safe_delete_message(message)
     if not is_admin(cfg, message.from_user.id):
         return
@@ -80,9 +117,8 @@ async def st_admin_cat_create(message: Message, db: Database, cfg: Config, state
         return
     await db.create_category(name)
     await state.clear()
-    lang = await db.get_user_lang(message.from_user.id)
-    cats = await db.list_categories(only_active=False)
-    await send_or_edit(message.bot, db, message.chat.id, message.from_user.id, t(lang, "done"), kb_admin_categories(lang, cats))
+    lang = session.lang
+    await show_admin_categories(message.bot, db, message.chat.id, message.from_user.id, lang, t(lang, "done"))
 
 
 @router.callback_query(F.data.startswith("admin:cat:rename:"))
@@ -97,7 +133,7 @@ async def cb_admin_cat_rename(callback: CallbackQuery, db: Database, cfg: Config
 
 
 @router.message(AdminCategoryStates.rename)
-async def st_admin_cat_rename(message: Message, db: Database, cfg: Config, state: FSMContext):
+async def st_admin_cat_rename(message: Message, db: Database, cfg: Config, state: FSMContext, session: UserSession):
     await safe_delete_message(message)
     if not is_admin(cfg, message.from_user.id):
         return
@@ -109,37 +145,34 @@ async def st_admin_cat_rename(message: Message, db: Database, cfg: Config, state
         return
     await db.rename_category(cat_id, name)
     await state.clear()
-    lang = await db.get_user_lang(message.from_user.id)
-    cats = await db.list_categories(only_active=False)
-    await send_or_edit(message.bot, db, message.chat.id, message.from_user.id, t(lang, "done"), kb_admin_categories(lang, cats))
+    lang = session.lang
+    await show_admin_categories(message.bot, db, message.chat.id, message.from_user.id, lang, t(lang, "done"))
 
 
 @router.callback_query(F.data.startswith("admin:cat:archive:"))
-async def cb_admin_cat_archive(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_admin_cat_archive(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
     if not is_admin(cfg, callback.from_user.id):
         return
     cat_id = int(callback.data.split(":")[3])
     await db.set_category_active(cat_id, False)
-    lang = await db.get_user_lang(callback.from_user.id)
-    cats = await db.list_categories(only_active=False)
-    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, t(lang, "done"), kb_admin_categories(lang, cats))
+    lang = session.lang
+    await show_admin_categories(callback.bot, db, callback.message.chat.id, callback.from_user.id, lang, t(lang, "done"))
 
 
 @router.callback_query(F.data.startswith("admin:cat:unarchive:"))
-async def cb_admin_cat_unarchive(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_admin_cat_unarchive(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
     if not is_admin(cfg, callback.from_user.id):
         return
     cat_id = int(callback.data.split(":")[3])
     await db.set_category_active(cat_id, True)
-    lang = await db.get_user_lang(callback.from_user.id)
-    cats = await db.list_categories(only_active=False)
-    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, t(lang, "done"), kb_admin_categories(lang, cats))
+    lang = session.lang
+    await show_admin_categories(callback.bot, db, callback.message.chat.id, callback.from_user.id, lang, t(lang, "done"))
 
 
 @router.callback_query(F.data.startswith("admin:cat:") & ~F.data.startswith("admin:cat:rename:") & ~F.data.startswith("admin:cat:archive:") & ~F.data.startswith("admin:cat:unarchive:"))
-async def cb_admin_cat_open(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_admin_cat_open(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
     if not is_admin(cfg, callback.from_user.id):
         return
@@ -148,32 +181,40 @@ async def cb_admin_cat_open(callback: CallbackQuery, db: Database, cfg: Config):
     cat = next((x for x in cats if x["id"] == cat_id), None)
     if not cat:
         return
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
     text = f"Category #{cat_id}\nName: {cat['name']}\nActive: {cat['is_active']}"
     await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, text, kb_admin_category(lang, cat_id, cat["is_active"]))
 
 
 # ---------- PRODUCTS ----------
-@router.callback_query(F.data == "admin:prods")
-async def cb_admin_prods(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext):
+# admin:prods | admin:prods:p:<page>
+@router.callback_query((F.data == "admin:prods") | F.data.startswith("admin:prods:p:"))
+async def cb_admin_prods(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext, session: UserSession):
     await callback.answer()
     await state.clear()
     if not is_admin(cfg, callback.from_user.id):
         return
-    cats = await db.list_categories(only_active=False)
-    lang = await db.get_user_lang(callback.from_user.id)
-    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, "📦 Products: choose category", kb_admin_products_root(lang, cats))
+    parts = callback.data.split(":")
+    page = int(parts[3]) if len(parts) > 3 else 0
+    cats, page, pages = await db.list_categories_page(page, only_active=False)
+    lang = session.lang
+    text = "📦 Products: choose category" + (f" {page + 1}/{pages}" if pages > 1 else "")
+    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, text, kb_admin_products_root(lang, cats, page, pages))
 
 
+# admin:prods:cat:<id>[:<page>]
 @router.callback_query(F.data.startswith("admin:prods:cat:"))
-async def cb_admin_prods_cat(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_admin_prods_cat(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
     if not is_admin(cfg, callback.from_user.id):
         return
-    cat_id = int(callback.data.split(":")[3])
-    products = await db.list_products(cat_id, only_active=False)
-    lang = await db.get_user_lang(callback.from_user.id)
-    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, f"Products in category #{cat_id}:", kb_admin_products_list(lang, cat_id, products))
+    parts = callback.data.split(":")
+    cat_id = int(parts[3])
+    page = int(parts[4]) if len(parts) > 4 else 0
+    products, page, pages = await db.list_products_page(cat_id, page, only_active=False)
+    lang = session.lang
+    text = f"Products in category #{cat_id}:" + (f" {page + 1}/{pages}" if pages > 1 else "")
+    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, text, kb_admin_products_list(lang, cat_id, products, page, pages))
 
 
 @router.callback_query(F.data == "admin:prod:create")
@@ -283,7 +324,7 @@ async def st_prod_active(message: Message, db: Database, cfg: Config, state: FSM
 
 
 @router.message(AdminProductStates.create_photo)
-async def st_prod_photo(message: Message, db: Database, cfg: Config, state: FSMContext):
+async def st_prod_photo(message: Message, db: Database, cfg: Config, state: FSMContext, session: UserSession):
     await safe_delete_message(message)
     if not is_admin(cfg, message.from_user.id):
         return
@@ -302,18 +343,18 @@ async def st_prod_photo(message: Message, db: Database, cfg: Config, state: FSMC
     prod_id = await db.create_product(data)
     await state.clear()
 
-    lang = await db.get_user_lang(message.from_user.id)
+    lang = session.lang
     await send_or_edit(message.bot, db, message.chat.id, message.from_user.id, f"Created product #{prod_id}", kb_admin_product(lang, prod_id))
 
 
 @router.callback_query(F.data.startswith("admin:prod:"))
-async def cb_admin_prod(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext):
+async def cb_admin_prod(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext, session: UserSession):
     await callback.answer()
     if not is_admin(cfg, callback.from_user.id):
         return
 
     parts = callback.data.split(":")
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
 
     # admin:prod:<id>
     if len(parts) == 3 and parts[2].isdigit():
@@ -327,6 +368,7 @@ async def cb_admin_prod(callback: CallbackQuery, db: Database, cfg: Config, stat
             f"Title: {p['title']}\n"
             f"Price: {p['price_cents']/100:.2f}\n"
             f"Stock: {p['stock']}\n"
+            f"Reserved in checkouts: {p.get('reserved', 0)}\n"
             f"Active: {p['is_active']}\n"
             f"Category: {p['category_id']}\n"
             f"Has photo: {'yes' if p.get('photo_file_id') else 'no'}"
@@ -372,7 +414,7 @@ async def cb_admin_prod(callback: CallbackQuery, db: Database, cfg: Config, stat
 
 
 @router.message(AdminProductStates.wait_photo)
-async def st_admin_photo(message: Message, db: Database, cfg: Config, state: FSMContext):
+async def st_admin_photo(message: Message, db: Database, cfg: Config, state: FSMContext, session: UserSession):
     await safe_delete_message(message)
     if not is_admin(cfg, message.from_user.id):
         return
@@ -387,12 +429,12 @@ async def st_admin_photo(message: Message, db: Database, cfg: Config, state: FSM
     await db.update_product_fields(pid, {"photo_file_id": file_id})
     await state.clear()
 
-    lang = await db.get_user_lang(message.from_user.id)
+    lang = session.lang
     await send_or_edit(message.bot, db, message.chat.id, message.from_user.id, t(lang, "done"), kb_admin_product(lang, pid))
 
 
 @router.message(AdminProductStates.edit_value)
-async def st_admin_edit_value(message: Message, db: Database, cfg: Config, state: FSMContext):
+async def st_admin_edit_value(message: Message, db: Database, cfg: Config, state: FSMContext, session: UserSession):
     await safe_delete_message(message)
     if not is_admin(cfg, message.from_user.id):
         return
@@ -452,29 +494,347 @@ async def st_admin_edit_value(message: Message, db: Database, cfg: Config, state
     await db.update_product_fields(pid, fields)
     await state.clear()
 
-    lang = await db.get_user_lang(message.from_user.id)
+    lang = session.lang
     await send_or_edit(message.bot, db, message.chat.id, message.from_user.id, t(lang, "done"), kb_admin_product(lang, pid))
 
 
+# ---------- IMPORT / EXPORT ----------
+def _tmp_csv() -> str:
+    fd, path = tempfile.mkstemp(prefix="shop-", suffix=".csv")
+    os.close(fd)
+    return path
+
+
+@router.callback_query(F.data == "admin:import")
+async def cb_admin_import(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext):
+    await callback.answer()
+    if not is_admin(cfg, callback.from_user.id):
+        return
+    await state.clear()
+    await state.set_state(AdminImportStates.wait_file)
+    text = (
+        "📥 Send a CSV file with columns:\n"
+        f"{','.join(PRODUCT_COLUMNS)}\n\n"
+        "Rows with an existing id update that product, rows without id create one. "
+        "Export first to get a template."
+    )
+    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, text, None)
+
+
+# admin user_id -> running import; one at a time per admin
+_imports: Dict[int, asyncio.Task] = {}
+
+
+@router.message(AdminImportStates.wait_file)
+async def st_admin_import(message: Message, db: Database, cfg: Config, state: FSMContext, session: UserSession):
+    await safe_delete_message(message)
+    if not is_admin(cfg, message.from_user.id):
+        return
+    doc = message.document
+    if doc is None:
+        await send_or_edit(message.bot, db, message.chat.id, message.from_user.id, "Send a CSV file please:", None)
+        return
+    if (doc.file_size or 0) > IMPORT_MAX_BYTES:
+        await send_or_edit(message.bot, db, message.chat.id, message.from_user.id, "File is larger than 20 MB. Split it and send again:", None)
+        return
+    await state.clear()
+
+    bot, chat_id, user_id, lang = message.bot, message.chat.id, message.from_user.id, session.lang
+    running = _imports.get(user_id)
+    if running is not None and not running.done():
+        await send_or_edit(bot, db, chat_id, user_id, "📥 An import is still running, wait for its report.", kb_admin_panel(lang))
+        return
+    # a 20 MB file takes a while: the import runs on its own, the update (and
+    # with it the user's lock and, in webhook mode, Telegram's request) ends now
+    task = _imports[user_id] = asyncio.create_task(_import_job(bot, db, chat_id, doc.file_id))
+
+    def forget(done: asyncio.Task) -> None:
+        if _imports.get(user_id) is done:
+            del _imports[user_id]
+
+    task.add_done_callback(forget)
+    await send_or_edit(bot, db, chat_id, user_id, "📥 Import started, progress and report follow in a separate message.", kb_admin_panel(lang))
+
+
+async def _import_job(bot: Bot, db: Database, chat_id: int, file_id: str) -> None:
+    """Background half of st_admin_import: owns the progress message and the error report."""
+    progress = None
+
+    async def show(text: str) -> None:
+        nonlocal progress
+        try:
+            if progress is None:
+                progress = await bot.send_message(chat_id, text)
+            else:
+                await bot.edit_message_text(text=text, chat_id=chat_id, message_id=progress.message_id)
+        except (TelegramBadRequest, TelegramForbiddenError):
+            pass  # not modified, or deleted by the admin: the import goes on
+
+    src, report = _tmp_csv(), _tmp_csv()
+    try:
+        await show("📥 Importing…")
+        await bot.download(file_id, destination=src)
+        text, errors = await _import_products(db, src, report, show)
+        await show(text)
+        if errors:
+            await bot.send_document(chat_id, FSInputFile(report, filename="import_errors.csv"))
+    except UnicodeDecodeError:  # before ValueError, its base class
+        await show("❌ The file is not UTF-8 text.")
+    except Exception as e:
+        if isinstance(e, ValueError) and str(e) == "CSV_BAD_HEADER":
+            await show(f"❌ The first line must name the columns:\n{','.join(PRODUCT_COLUMNS)}")
+        else:
+            # nobody awaits this task: report here, or the failure goes unseen
+            logger.exception("Import failed")
+            await show("❌ Import failed.")
+    finally:
+        os.remove(src)
+        os.remove(report)
+
+
+async def _import_products(db: Database, src: str, report: str, progress: Callable[[str], Awaitable[None]]):
+    """
+    Streams `src` through read_products() into IMPORT_BATCH-row upserts;
+    bad rows go to the `report` CSV (line,error), not to memory.
+    progress() gets a status line at most every IMPORT_PROGRESS_EVERY seconds.
+    Returns (summary text, error count).
+    """
+    category_ids = {c["id"] for c in await db.list_categories(only_active=False)}
+    rows = created = updated = errors = 0
+    batch = []
+    first_errors = []
+    next_progress = time.monotonic() + IMPORT_PROGRESS_EVERY
+
+    with open(src, newline="", encoding="utf-8-sig") as f, open(report, "w", newline="", encoding="utf-8") as out:
+        report_csv = csv.writer(out)
+        report_csv.writerow(("line", "error"))
+
+        def error(line, reason: str) -> None:
+            nonlocal errors
+            errors += 1
+            report_csv.writerow((line, reason))
+            if len(first_errors) < 5:
+                first_errors.append(f"line {line}: {reason}")
+
+        async def flush() -> None:
+            nonlocal created, updated
+            try:
+                c, u = await db.import_products([fields for _line, fields in batch])
+            except Exception as e:
+                # e.g. a category deleted meanwhile; the other batches still go in
+                logger.exception("Import batch failed")
+                for line, _fields in batch:
+                    error(line, f"batch rejected: {e}")
+            else:
+                created += c
+                updated += u
+            batch.clear()
+
+        for line, fields, reason in read_products(f, category_ids):
+            rows += 1
+            if reason is not None:
+                error(line, reason)
+                continue
+            batch.append((line, fields))
+            if len(batch) >= IMPORT_BATCH:
+                await flush()
+                if time.monotonic() >= next_progress:
+                    next_progress = time.monotonic() + IMPORT_PROGRESS_EVERY
+                    await progress(f"📥 Importing… {rows} rows: {created} created, {updated} updated, {errors} errors")
+        await flush()
+
+    lines = ["📥 Import done", "", f"Rows: {rows}", f"Created: {created}", f"Updated: {updated}", f"Errors: {errors}"]
+    if first_errors:
+        lines += ["", *first_errors]
+    return "\n".join(lines), errors
+
+
+# admin:export:products | admin:export:orders:<STATUS|ALL>
+@router.callback_query(F.data.startswith("admin:export:"))
+async def cb_admin_export(callback: CallbackQuery, db: Database, cfg: Config):
+    await callback.answer()
+    if not is_admin(cfg, callback.from_user.id):
+        return
+    parts = callback.data.split(":")
+    stamp = datetime.now().strftime("%Y%m%d-%H%M")
+    path = _tmp_csv()
+    try:
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            w = csv.writer(f)
+            if parts[2] == "products":
+                name = f"products-{stamp}.csv"
+                w.writerow(PRODUCT_COLUMNS)
+                count = await db.export_products(
+                    lambda rows: w.writerows((*r[:4], format_cents(r[4]), *r[5:]) for r in rows)
+                )
+            elif parts[2] == "orders" and len(parts) == 4 and (parts[3] == "ALL" or parts[3] in ORDER_STATUSES):
+                status = None if parts[3] == "ALL" else parts[3]
+                name = f"orders-{(status or 'all').lower()}-{stamp}.csv"
+                w.writerow(ORDER_COLUMNS)
+                count = await db.export_orders(
+                    lambda rows: w.writerows(
+                        (*r[:11], format_cents(r[11]), *r[12:15], format_cents(r[15]), format_cents(r[16]))
+                        for r in rows
+                    ),
+                    status=status,
+                )
+            else:
+                return
+        # FSInputFile uploads the file in chunks, it is never read whole
+        await callback.bot.send_document(callback.message.chat.id, FSInputFile(path, filename=name), caption=f"📤 {count} rows")
+    finally:
+        os.remove(path)
+
+
+@router.callback_query(F.data == "admin:adjust")
+async def cb_admin_adjust(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext):
+    await callback.answer()
+    if not is_admin(cfg, callback.from_user.id):
+        return
+    await state.clear()
+    await state.set_state(AdminImportStates.wait_adjustments)
+    text = (
+        "🔁 Paste or send a CSV file, one product per line:\n"
+        "product_id,stock_delta,price\n\n"
+        "stock_delta is relative (+10 restock, -2 write-off, 0 keep); leave price empty to keep it.\n"
+        "Example:\n12,+10,\n15,-2,249.90\n\n"
+        f"All lines are applied together or not at all (max {ADJUST_MAX_ROWS})."
+    )
+    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, text, None)
+
+
+@router.message(AdminImportStates.wait_adjustments)
+async def st_admin_adjust(message: Message, db: Database, cfg: Config, state: FSMContext, session: UserSession):
+    await safe_delete_message(message)
+    if not is_admin(cfg, message.from_user.id):
+        return
+    bot, chat_id, user_id, lang = message.bot, message.chat.id, message.from_user.id, session.lang
+
+    src = None
+    try:
+        if message.document is not None:
+            if (message.document.file_size or 0) > IMPORT_MAX_BYTES:
+                await send_or_edit(bot, db, chat_id, user_id, "File is larger than 20 MB. Split it and send again:", None)
+                return
+            src = _tmp_csv()
+            await bot.download(message.document, destination=src)
+            f = open(src, newline="", encoding="utf-8-sig")
+        elif message.text:
+            f = io.StringIO(message.text, newline="")
+        else:
+            await send_or_edit(bot, db, chat_id, user_id, "Paste the list or send a CSV file:", None)
+            return
+
+        rows, errors = [], []
+        with f:
+            for line, fields, reason in read_adjustments(f):
+                if reason is not None:
+                    errors.append(f"line {line}: {reason}")
+                elif len(rows) < ADJUST_MAX_ROWS:
+                    rows.append(fields)
+                else:
+                    errors.append(f"more than {ADJUST_MAX_ROWS} lines")
+                    break
+    except UnicodeDecodeError:
+        errors, rows = ["the file is not UTF-8 text"], []
+    finally:
+        if src is not None:
+            os.remove(src)
+
+    # all or nothing: a typo must not leave half a restock applied
+    if errors or not rows:
+        text = "❌ Nothing applied:\n" + "\n".join(errors[:10] or ["no lines found"]) + "\n\nFix and send again:"
+        await send_or_edit(bot, db, chat_id, user_id, text, None)
+        return
+    await state.clear()
+
+    diffs, missing = await db.adjust_products(rows)
+    added = sum(max(0, d["stock_after"] - d["stock_before"]) for d in diffs)
+    removed = sum(max(0, d["stock_before"] - d["stock_after"]) for d in diffs)
+    repriced = sum(1 for d in diffs if d["price_after"] != d["price_before"])
+    lines = [
+        "🔁 Bulk update applied",
+        "",
+        f"Products: {len(diffs)}",
+        f"Stock: +{added} / -{removed}",
+        f"Price changes: {repriced}",
+    ]
+    if missing:
+        lines.append(f"Unknown ids skipped: {', '.join(map(str, missing[:20]))}" + (" …" if len(missing) > 20 else ""))
+    lines.append("")
+    for d in diffs[:ADJUST_SUMMARY_LINES]:
+        change = f"#{d['id']} {d['title']}: {d['stock_before']} → {d['stock_after']}"
+        if d["price_after"] != d["price_before"]:
+            change += f", {format_cents(d['price_before'])} → {format_cents(d['price_after'])}"
+        lines.append(change)
+    if len(diffs) > ADJUST_SUMMARY_LINES:
+        lines.append("… full list in the file below")
+    await send_or_edit(bot, db, chat_id, user_id, "\n".join(lines), kb_admin_panel(lang))
+
+    if len(diffs) > ADJUST_SUMMARY_LINES:
+        path = _tmp_csv()
+        try:
+            with open(path, "w", newline="", encoding="utf-8-sig") as out:
+                w = csv.writer(out)
+                w.writerow(("id", "title", "stock_before", "stock_after", "price_before", "price_after"))
+                w.writerows(
+                    (d["id"], d["title"], d["stock_before"], d["stock_after"], format_cents(d["price_before"]), format_cents(d["price_after"]))
+                    for d in diffs
+                )
+            await bot.send_document(chat_id, FSInputFile(path, filename="bulk_update.csv"))
+        finally:
+            os.remove(path)
+
+
 # ---------- ADMIN ORDERS ----------
+async def show_admin_orders(callback: CallbackQuery, db: Database, lang: str, status: str, before: Optional[int] = None, after: Optional[int] = None):
+    orders, has_older, has_newer = await db.admin_list_orders(
+        limit=20, status=None if status == "ALL" else status, before=before, after=after
+    )
+    title = "🧾 Orders:" if status == "ALL" else f"🧾 Orders ({status}):"
+    if not orders:
+        title += "\n\nNo orders."
+    await send_or_edit(
+        callback.bot, db, callback.message.chat.id, callback.from_user.id, title,
+        kb_admin_orders(lang, orders, status, has_older, has_newer),
+    )
+
+
 @router.callback_query(F.data == "admin:orders")
-async def cb_admin_orders(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_admin_orders(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
+    await callback.answer()
+    if not is_admin(cfg, callback.from_user.id):
+        return
+    await show_admin_orders(callback, db, session.lang, "ALL")
+
+
+# admin:orders:<STATUS|ALL>[:<o|n>:<cursor id>]
+@router.callback_query(F.data.startswith("admin:orders:"))
+async def cb_admin_orders_page(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
     if not is_admin(cfg, callback.from_user.id):
         return
-    orders = await db.admin_list_orders(limit=20)
-    lang = await db.get_user_lang(callback.from_user.id)
-    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, "🧾 Last orders:", kb_admin_orders(lang, orders))
+    parts = callback.data.split(":")
+    status = parts[2]
+    if status != "ALL" and status not in ORDER_STATUSES:
+        return
+    before = after = None
+    if len(parts) == 5:
+        if parts[3] == "o":
+            before = int(parts[4])
+        else:
+            after = int(parts[4])
+    await show_admin_orders(callback, db, session.lang, status, before, after)
 
 
 @router.callback_query(F.data.startswith("admin:order:"))
-async def cb_admin_order_open(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_admin_order_open(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
     if not is_admin(cfg, callback.from_user.id):
         return
 
     parts = callback.data.split(":")
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
 
     # admin:order:status:<id>:<STATUS>
     if len(parts) == 5 and parts[2] == "status":
@@ -486,12 +846,9 @@ async def cb_admin_order_open(callback: CallbackQuery, db: Database, cfg: Config
         await db.admin_set_order_status(order_id, status)
         order = await db.get_order(order_id)
 
-        # notify user
+        # notify user; detached, the admin screen below does not wait for it
         if order:
-            try:
-                await callback.bot.send_message(chat_id=order["user_id"], text=f"📦 Order #{order_id}\nStatus: {status}")
-            except Exception:
-                pass
+            send_notification(callback.bot, order["user_id"], f"📦 Order #{order_id}\nStatus: {status}")
 
         # refresh admin screen
         order = await db.get_order(order_id)
@@ -530,11 +887,61 @@ async def cb_admin_order_open(callback: CallbackQuery, db: Database, cfg: Config
 
 
 @router.callback_query(F.data == "admin:stats")
-async def cb_admin_stats(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_admin_stats(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
     if not is_admin(cfg, callback.from_user.id):
         return
     s = await db.admin_stats()
-    lang = await db.get_user_lang(callback.from_user.id)
-    text = f"📊 Stats\n\nOrders: {s['orders_count']}\nRevenue: {s['revenue_cents']/100:.2f}"
-    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, text, kb_admin_panel(lang))
+    lang = session.lang
+    text = (
+        f"📊 Stats\n\nOrders: {s['orders_count']}\nRevenue: {s['revenue_cents']/100:.2f}"
+        f"\n\nToday: {s['orders_today']} orders, {s['revenue_today_cents']/100:.2f}"
+    )
+    runtime = metrics.snapshot()
+    if runtime:
+        text += "\n\n⚙️ Runtime\n" + "\n".join(f"{k}: {v}" for k, v in sorted(runtime.items()))
+    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, text, kb_admin_stats(lang))
+
+
+# admin:stats:<days> | admin:stats:top  (rollups only, see Database stats section)
+@router.callback_query(F.data.startswith("admin:stats:"))
+async def cb_admin_stats_view(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
+    await callback.answer()
+    if not is_admin(cfg, callback.from_user.id):
+        return
+    view = callback.data.split(":")[2]
+    lang = session.lang
+
+    if view == "top":
+        top = await db.stats_top_products(days=STATS_TOP_DAYS, limit=STATS_TOP_N)
+        lines = [f"🏆 Top {STATS_TOP_N} products, {STATS_TOP_DAYS} days", ""]
+        for i, p in enumerate(top, 1):
+            lines.append(f"{i}. {p['title']} — {p['units']} pcs, {p['revenue_cents']/100:.2f}")
+        if not top:
+            lines.append("No sales yet.")
+    elif view.isdigit() and int(view) in (7, 30):
+        days = await db.stats_daily(int(view))
+        orders = sum(d["orders_count"] for d in days)
+        revenue = sum(d["revenue_cents"] for d in days)
+        lines = [f"📊 Last {view} days", "", f"Orders: {orders}", f"Revenue: {revenue/100:.2f}", ""]
+        for d in days:
+            lines.append(f"{d['day']}: {d['orders_count']} • {d['revenue_cents']/100:.2f} • avg {d['avg_basket_cents']/100:.2f}")
+    else:
+        return
+
+    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, "\n".join(lines), kb_admin_stats(lang, back="admin:stats"))
+
+
+@router.message(Command("stats_rebuild"))
+async def cmd_stats_rebuild(message: Message, db: Database, cfg: Config, session: UserSession):
+    if not is_admin(cfg, message.from_user.id):
+        return
+    before, after = await db.rebuild_stats()
+    if before != after:
+        logger.warning("Stats counters drifted: %s -> %s", before, after)
+    text = (
+        "📊 Stats rebuilt\n\n"
+        f"Orders: {before['orders_count']} → {after['orders_count']}\n"
+        f"Revenue: {before['revenue_cents']/100:.2f} → {after['revenue_cents']/100:.2f}"
+    )
+    await send_or_edit(message.bot, db, message.chat.id, message.from_user.id, text, kb_admin_panel(session.lang))
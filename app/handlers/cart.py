@@ -3,8 +3,9 @@ from aiogram.types import CallbackQuery
 
 from app.keyboards import kb_cart, kb_menu
 from app.i18n import t
-from app.ui import send_or_edit
+from app.ui import send_or_edit, renders
 from app.db import Database
+from app.sessions import UserSession
 from app.config import Config
 
 router = Router()
@@ -14,11 +15,11 @@ def cart_total(cart_items):
     return sum(it["qty"] * it["price_cents"] for it in cart_items)
 
 
-async def show_cart(callback: CallbackQuery, db: Database, cfg: Config):
-    await db.ensure_user(callback.from_user.id)
+async def show_cart(callback: CallbackQuery, db: Database, cfg: Config, cart=None):
     lang = await db.get_user_lang(callback.from_user.id)
 
-    cart = await db.get_cart(callback.from_user.id)
+    if cart is None:
+        cart = await db.get_cart(callback.from_user.id)
     if not cart:
         await send_or_edit(
             callback.bot,
@@ -42,43 +43,45 @@ async def show_cart(callback: CallbackQuery, db: Database, cfg: Config):
     await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, "\n".join(lines), kb_cart(lang, cart))
 
 
+async def show_stock_not_enough(callback: CallbackQuery, db: Database, lang: str, cart):
+    if cart:
+        total = cart_total(cart)
+        lines = [t(lang, "stock_not_enough"), "", t(lang, "cart_title"), ""]
+        for it in cart:
+            lines.append(f"• {it['title']} — {it['qty']} шт.")
+        lines.append("")
+        lines.append(f"💳 Total: {total/100.0:.2f}")
+        await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, "\n".join(lines), kb_cart(lang, cart))
+    else:
+        await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, t(lang, "stock_not_enough"), None)
+
+
 @router.callback_query(F.data.startswith("cart:add:"))
-async def cb_cart_add(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_cart_add(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
 
     pid = int(callback.data.split(":")[2])
-    p = await db.get_product(pid)
-    if not p or p["is_active"] != 1:
-        await show_cart(callback, db, cfg)
-        return
-
-    current = await db.cart_get_qty(callback.from_user.id, pid)
-    if current + 1 > p["stock"]:
+    chat_id = callback.message.chat.id
+    try:
+        _qty, cart = await db.cart_adjust(callback.from_user.id, pid, 1)
+    except ValueError as e:
+        if str(e) != "STOCK_NOT_ENOUGH":
+            renders.schedule(chat_id, lambda: show_cart(callback, db, cfg))
+            return
         cart = await db.get_cart(callback.from_user.id)
-        if cart:
-            total = cart_total(cart)
-            lines = [t(lang, "stock_not_enough"), "", t(lang, "cart_title"), ""]
-            for it in cart:
-                lines.append(f"• {it['title']} — {it['qty']} шт.")
-            lines.append("")
-            lines.append(f"💳 Total: {total/100.0:.2f}")
-            await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, "\n".join(lines), kb_cart(lang, cart))
-        else:
-            await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, t(lang, "stock_not_enough"), None)
+        renders.schedule(chat_id, lambda: show_stock_not_enough(callback, db, lang, cart))
         return
 
-    await db.cart_set_qty(callback.from_user.id, pid, current + 1)
-    await show_cart(callback, db, cfg)
+    renders.schedule(chat_id, lambda: show_cart(callback, db, cfg, cart=cart))
 
 
 @router.callback_query(F.data.startswith("cart:rem:"))
 async def cb_cart_rem(callback: CallbackQuery, db: Database, cfg: Config):
     await callback.answer()
     pid = int(callback.data.split(":")[2])
-    current = await db.cart_get_qty(callback.from_user.id, pid)
-    await db.cart_set_qty(callback.from_user.id, pid, current - 1)
-    await show_cart(callback, db, cfg)
+    _qty, cart = await db.cart_adjust(callback.from_user.id, pid, -1)
+    renders.schedule(callback.message.chat.id, lambda: show_cart(callback, db, cfg, cart=cart))
 
 
 @router.callback_query(F.data == "cart:clear")
@@ -1,19 +1,23 @@
 from aiogram import Router, F
-from aiogram.types import CallbackQuery
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, Message
 
-from app.keyboards import kb_catalog_categories, kb_category_products, kb_product
+from app.catalog import PAGE_SIZE, available
+from app.keyboards import kb_catalog_categories, kb_category_products, kb_product, kb_search_results
 from app.i18n import t
-from app.ui import send_or_edit, send_or_edit_photo
+from app.ui import send_or_edit, send_or_edit_photo, safe_delete_message
 from app.db import Database
+from app.search_cache import SearchCache
+from app.sessions import UserSession
+from app.states import SearchStates
 
 router = Router()
 
 
-async def show_catalog(callback: CallbackQuery, db: Database):
-    await db.ensure_user(callback.from_user.id)
+async def show_catalog(callback: CallbackQuery, db: Database, page: int = 0):
     lang = await db.get_user_lang(callback.from_user.id)
 
-    cats = await db.list_categories(only_active=True)
+    cats, page, pages = await db.list_categories_page(page, only_active=True)
     if not cats:
         await send_or_edit(
             bot=callback.bot,
@@ -30,18 +34,28 @@ async def show_catalog(callback: CallbackQuery, db: Database):
         db=db,
         chat_id=callback.message.chat.id,
         user_id=callback.from_user.id,
-        text=t(lang, "catalog_title"),
-        keyboard=kb_catalog_categories(lang, cats),
+        text=t(lang, "catalog_title") + (f"\n\n{page + 1}/{pages}" if pages > 1 else ""),
+        keyboard=kb_catalog_categories(lang, cats, page, pages),
     )
 
 
+# catp:<page>
+@router.callback_query(F.data.startswith("catp:"))
+async def cb_catalog_page(callback: CallbackQuery, db: Database):
+    await callback.answer()
+    await show_catalog(callback, db, int(callback.data.split(":")[1]))
+
+
 @router.callback_query(F.data.startswith("cat:"))
-async def cb_open_category(callback: CallbackQuery, db: Database):
+async def cb_open_category(callback: CallbackQuery, db: Database, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
 
-    cat_id = int(callback.data.split(":")[1])
-    products = await db.list_products(category_id=cat_id, only_active=True)
+    # cat:<id>[:<page>]
+    parts = callback.data.split(":")
+    cat_id = int(parts[1])
+    page = int(parts[2]) if len(parts) > 2 else 0
+    products, page, pages = await db.list_products_page(cat_id, page, only_active=True)
 
     if not products:
         await send_or_edit(
@@ -59,8 +73,8 @@ async def cb_open_category(callback: CallbackQuery, db: Database):
         db,
         callback.message.chat.id,
         callback.from_user.id,
-        f"{t(lang, 'catalog_title')}\n\n📁 Category #{cat_id}",
-        kb_category_products(lang, cat_id, products),
+        f"{t(lang, 'catalog_title')}\n\n📁 Category #{cat_id}" + (f"\n{page + 1}/{pages}" if pages > 1 else ""),
+        kb_category_products(lang, cat_id, products, page, pages),
     )
 
 
@@ -70,28 +84,79 @@ async def cb_cat_back(callback: CallbackQuery, db: Database):
     await show_catalog(callback, db)
 
 
-@router.callback_query(F.data.startswith("prod:"))
-async def cb_open_product(callback: CallbackQuery, db: Database):
+# ---------- SEARCH ----------
+# query -> ranked ids of the first pages, shared by all users of the process:
+# page taps and refined queries skip the bm25 ranking (see SearchCache)
+search_cache = SearchCache("search", capacity=2000, ttl=30.0, window=10 * PAGE_SIZE)
+
+
+async def show_search_results(bot, db: Database, chat_id: int, user_id: int, lang: str, query: str, page: int = 0):
+    ids, has_more = await search_cache.page(db, query, page * PAGE_SIZE, PAGE_SIZE)
+    # the snapshot, not the cached hit, decides price/stock/visibility
+    products = [p for p in [await db.get_product(pid) for pid in ids] if p and p["is_active"] == 1]
+    if not products and page == 0:
+        await send_or_edit(bot, db, chat_id, user_id, t(lang, "search_empty"), kb_search_results(lang, [], 0, False))
+        return
+    text = f"{t(lang, 'search_results')}\n\n«{query}»" + (f" {page + 1}" if page or has_more else "")
+    await send_or_edit(bot, db, chat_id, user_id, text, kb_search_results(lang, products, page, has_more))
+
+
+@router.callback_query(F.data == "menu:search")
+async def cb_search(callback: CallbackQuery, db: Database, state: FSMContext, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    await state.set_state(SearchStates.query)
+    lang = session.lang
+    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, t(lang, "search_prompt"), kb_search_results(lang, [], 0, False))
 
-    product_id = int(callback.data.split(":")[1])
-    p = await db.get_product(product_id)
-    if not p or p["is_active"] != 1:
-        await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, t(lang, "empty_products"), None)
+
+# the state stays set while the user is on the search screens: every next
+# text message is a new query. Menu/nav buttons clear it (common.leave_search);
+# commands are never queries, so they reach their own handlers.
+@router.message(SearchStates.query, F.text, ~F.text.startswith("/"))
+async def st_search_query(message: Message, db: Database, state: FSMContext, session: UserSession):
+    await safe_delete_message(message)
+    query = (message.text or "").strip()[:64]
+    await state.update_data(search_query=query)
+    await show_search_results(message.bot, db, message.chat.id, message.from_user.id, session.lang, query)
+
+
+# srch:<page>
+@router.callback_query(F.data.startswith("srch:"))
+async def cb_search_page(callback: CallbackQuery, db: Database, state: FSMContext, session: UserSession):
+    await callback.answer()
+    query = (await state.get_data()).get("search_query")
+    if not query:
         return
+    page = max(0, int(callback.data.split(":")[1]))
+    await show_search_results(callback.bot, db, callback.message.chat.id, callback.from_user.id, session.lang, query, page)
+
 
+def product_text(p) -> str:
     price = p["price_cents"] / 100.0
-    stock = p["stock"]
-    text = (
-        f"{t(lang,'product')}\n\n"
+    return (
         f"🧾 {p['title']}\n"
         f"{p['description']}\n\n"
         f"💰 {price:.2f}\n"
-        f"📦 Stock: {stock}"
+        f"📦 Stock: {available(p)}"
     )
 
+
+async def show_product(bot, db: Database, chat_id: int, user_id: int, lang: str, product_id: int):
+    p = await db.get_product(product_id)
+    if not p or p["is_active"] != 1:
+        await send_or_edit(bot, db, chat_id, user_id, t(lang, "empty_products"), None)
+        return
+
+    text = f"{t(lang,'product')}\n\n" + product_text(p)
+
     if p.get("photo_file_id"):
-        await send_or_edit_photo(callback.bot, db, callback.message.chat.id, callback.from_user.id, p["photo_file_id"], text, kb_product(lang, product_id))
+        await send_or_edit_photo(bot, db, chat_id, user_id, p["photo_file_id"], text, kb_product(lang, product_id))
     else:
-        await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, text, kb_product(lang, product_id))
+        await send_or_edit(bot, db, chat_id, user_id, text, kb_product(lang, product_id))
+
+
+@router.callback_query(F.data.startswith("prod:"))
+async def cb_open_product(callback: CallbackQuery, db: Database, session: UserSession):
+    await callback.answer()
+    product_id = int(callback.data.split(":")[1])
+    await show_product(callback.bot, db, callback.message.chat.id, callback.from_user.id, session.lang, product_id)
@@ -1,3 +1,6 @@
+import logging
+import uuid
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
@@ -6,10 +9,16 @@ from app.states import CheckoutStates
 from app.keyboards import kb_checkout_delivery, kb_comment, kb_confirm, kb_payment, kb_menu
 from app.i18n import t, delivery_label
 from app.ui import send_or_edit, safe_delete_message
+from app.outbound import send_notification
+from app.metrics import metrics
 from app.utils import valid_min_len, valid_phone, normalize_phone
-from app.db import Database
+from app.db import Database, RESERVATION_TTL
+from app.handlers.cart import show_stock_not_enough
+from app.sessions import UserSession
 from app.config import Config
 
+logger = logging.getLogger("app.checkout")
+
 router = Router()
 
 
@@ -23,7 +32,6 @@ def cart_summary(cart):
 
 
 async def checkout_start(callback: CallbackQuery, db: Database):
-    await db.ensure_user(callback.from_user.id)
     lang = await db.get_user_lang(callback.from_user.id)
 
     cart = await db.get_cart(callback.from_user.id)
@@ -36,7 +44,9 @@ async def checkout_start(callback: CallbackQuery, db: Database):
         db,
         callback.message.chat.id,
         callback.from_user.id,
-        f"{t(lang,'checkout_intro')}\n\n{t(lang,'ask_name')}",
+        f"{t(lang,'checkout_intro')}\n"
+        f"{t(lang,'items_reserved').format(minutes=int(RESERVATION_TTL.total_seconds() // 60))}\n\n"
+        f"{t(lang,'ask_name')}",
         None,
     )
 
@@ -67,17 +77,29 @@ async def show_confirm_screen(bot, db: Database, chat_id: int, user_id: int, sta
 
 
 @router.callback_query(F.data == "cart:checkout")
-async def cb_checkout_start(callback: CallbackQuery, db: Database, state: FSMContext):
+async def cb_checkout_start(callback: CallbackQuery, db: Database, state: FSMContext, session: UserSession):
     await callback.answer()
     await state.clear()
+    try:
+        # hold the cart's stock for the wizard, so the confirm does not fail on it
+        await db.reserve_cart(callback.from_user.id)
+    except ValueError as e:
+        if str(e) == "CART_EMPTY":
+            await checkout_start(callback, db)
+            return
+        metrics.inc("checkout.reserve_failed")
+        cart = await db.get_cart(callback.from_user.id)
+        await show_stock_not_enough(callback, db, session.lang, cart)
+        return
     await state.set_state(CheckoutStates.name)
+    # one token per checkout: repeated confirms resolve to the same order
+    await state.update_data(checkout_token=uuid.uuid4().hex)
     await checkout_start(callback, db)
 
 
 @router.message(CheckoutStates.name)
-async def st_name(message: Message, db: Database, state: FSMContext):
-    await db.ensure_user(message.from_user.id)
-    lang = await db.get_user_lang(message.from_user.id)
+async def st_name(message: Message, db: Database, state: FSMContext, session: UserSession):
+    lang = session.lang
 
     text = (message.text or "").strip()
     await safe_delete_message(message)
@@ -92,9 +114,8 @@ async def st_name(message: Message, db: Database, state: FSMContext):
 
 
 @router.message(CheckoutStates.phone)
-async def st_phone(message: Message, db: Database, state: FSMContext):
-    await db.ensure_user(message.from_user.id)
-    lang = await db.get_user_lang(message.from_user.id)
+async def st_phone(message: Message, db: Database, state: FSMContext, session: UserSession):
+    lang = session.lang
 
     text = (message.text or "").strip()
     await safe_delete_message(message)
@@ -110,9 +131,8 @@ async def st_phone(message: Message, db: Database, state: FSMContext):
 
 
 @router.message(CheckoutStates.city)
-async def st_city(message: Message, db: Database, state: FSMContext):
-    await db.ensure_user(message.from_user.id)
-    lang = await db.get_user_lang(message.from_user.id)
+async def st_city(message: Message, db: Database, state: FSMContext, session: UserSession):
+    lang = session.lang
 
     text = (message.text or "").strip()
     await safe_delete_message(message)
@@ -127,9 +147,9 @@ async def st_city(message: Message, db: Database, state: FSMContext):
 
 
 @router.callback_query(CheckoutStates.delivery, F.data.startswith("del:"))
-async def st_delivery(callback: CallbackQuery, db: Database, state: FSMContext):
+async def st_delivery(callback: CallbackQuery, db: Database, state: FSMContext, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
 
     code = callback.data.split(":")[1]
     await state.update_data(delivery_method=code)
@@ -139,9 +159,8 @@ async def st_delivery(callback: CallbackQuery, db: Database, state: FSMContext):
 
 
 @router.message(CheckoutStates.address)
-async def st_address(message: Message, db: Database, state: FSMContext):
-    await db.ensure_user(message.from_user.id)
-    lang = await db.get_user_lang(message.from_user.id)
+async def st_address(message: Message, db: Database, state: FSMContext, session: UserSession):
+    lang = session.lang
 
     text = (message.text or "").strip()
     await safe_delete_message(message)
@@ -164,7 +183,6 @@ async def st_comment_skip(callback: CallbackQuery, db: Database, state: FSMConte
 
 @router.message(CheckoutStates.comment)
 async def st_comment(message: Message, db: Database, state: FSMContext):
-    await db.ensure_user(message.from_user.id)
     await safe_delete_message(message)
 
     text = (message.text or "").strip()
@@ -173,9 +191,9 @@ async def st_comment(message: Message, db: Database, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("edit:"))
-async def cb_edit_field(callback: CallbackQuery, db: Database, state: FSMContext):
+async def cb_edit_field(callback: CallbackQuery, db: Database, state: FSMContext, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
 
     field = callback.data.split(":")[1]
 
@@ -208,17 +226,34 @@ async def cb_edit_field(callback: CallbackQuery, db: Database, state: FSMContext
 
 
 @router.callback_query(F.data == "order:cancel")
-async def cb_order_cancel(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext):
+async def cb_order_cancel(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext, session: UserSession):
     await callback.answer()
     await state.clear()
-    lang = await db.get_user_lang(callback.from_user.id)
+    await db.release_reservation(callback.from_user.id)
+    lang = session.lang
     await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, t(lang, "menu_title"), kb_menu(lang, int(callback.from_user.id) == int(cfg.admin_id)))
 
 
 @router.callback_query(F.data == "order:confirm")
-async def cb_order_confirm(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext):
+async def cb_order_confirm(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
+
+    data = await state.get_data()
+    if data.get("order_id"):
+        # confirm tapped again (double tap / redelivery) after the order was created
+        metrics.inc("checkout.duplicate_confirm")
+        order = await db.get_order(int(data["order_id"]))
+        if order is not None:
+            await send_or_edit(
+                callback.bot,
+                db,
+                callback.message.chat.id,
+                callback.from_user.id,
+                f"{t(lang,'order_created')}\n\n{t(lang,'payment_title')}\nOrder #{order['id']}\nTotal: {order['total_cents']/100.0:.2f}",
+                kb_payment(lang, order["id"]),
+            )
+            return
 
     cart = await db.get_cart(callback.from_user.id)
     if not cart:
@@ -226,14 +261,13 @@ async def cb_order_confirm(callback: CallbackQuery, db: Database, cfg: Config, s
         await state.clear()
         return
 
-    data = await state.get_data()
     required = ["name", "phone", "city", "delivery_method", "address"]
     if not all(data.get(k) for k in required):
         await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, "Some required fields are missing. Please edit and try again.", kb_confirm(lang))
         return
 
     try:
-        order_id, total = await db.create_order_from_cart(
+        order_id, total, created = await db.create_order_from_cart(
             user_id=callback.from_user.id,
             name=data["name"],
             phone=data["phone"],
@@ -241,33 +275,17 @@ async def cb_order_confirm(callback: CallbackQuery, db: Database, cfg: Config, s
             delivery_method=data["delivery_method"],
             address=data["address"],
             comment=data.get("comment"),
+            token=data.get("checkout_token"),
         )
     except Exception:
         await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, "Checkout failed. Please try again.", kb_menu(lang, int(callback.from_user.id) == int(cfg.admin_id)))
         return
 
-    await state.clear()
-
-    # notify admin (safe parse_mode none)
-    try:
-        items_lines, _ = cart_summary(cart)
-        admin_text = (
-            f"🛒 NEW ORDER #{order_id}\n\n"
-            f"User: {callback.from_user.id}\n"
-            f"Name: {data.get('name')}\n"
-            f"Phone: {data.get('phone')}\n"
-            f"City: {data.get('city')}\n"
-            f"Delivery: {data.get('delivery_method')}\n"
-            f"Address: {data.get('address')}\n"
-            f"Comment: {data.get('comment') or '-'}\n\n"
-            f"Items:\n" + "\n".join(items_lines) + "\n\n"
-            f"Total: {total/100.0:.2f}\n"
-        )
-        from app.keyboards import kb_admin_order
-        await callback.bot.send_message(chat_id=cfg.admin_id, text=admin_text, reply_markup=kb_admin_order("en", order_id))
-    except Exception:
-        pass
+    # leave the checkout, but remember its order for repeated confirms
+    await state.set_state(None)
+    await state.set_data({"checkout_token": data.get("checkout_token"), "order_id": order_id})
 
+    # the customer's own screen first; the admin notification queues behind it
     await send_or_edit(
         callback.bot,
         db,
@@ -277,11 +295,35 @@ async def cb_order_confirm(callback: CallbackQuery, db: Database, cfg: Config, s
         kb_payment(lang, order_id),
     )
 
+    # notify admin (safe parse_mode none), once per order; detached, so a
+    # burst of checkouts does not wait on the admin chat's rate limit
+    if not created:
+        metrics.inc("checkout.duplicate_confirm")
+    else:
+        try:
+            items_lines, _ = cart_summary(cart)
+            admin_text = (
+                f"🛒 NEW ORDER #{order_id}\n\n"
+                f"User: {callback.from_user.id}\n"
+                f"Name: {data.get('name')}\n"
+                f"Phone: {data.get('phone')}\n"
+                f"City: {data.get('city')}\n"
+                f"Delivery: {data.get('delivery_method')}\n"
+                f"Address: {data.get('address')}\n"
+                f"Comment: {data.get('comment') or '-'}\n\n"
+                f"Items:\n" + "\n".join(items_lines) + "\n\n"
+                f"Total: {total/100.0:.2f}\n"
+            )
+            from app.keyboards import kb_admin_order
+            send_notification(callback.bot, cfg.admin_id, admin_text, reply_markup=kb_admin_order("en", order_id))
+        except Exception:
+            logger.exception("Admin notification failed order_id=%s", order_id)
+
 
 @router.callback_query(F.data.startswith("pay:"))
-async def cb_payment(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_payment(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
 
     _, method, order_id_s = callback.data.split(":")
     order_id = int(order_id_s)
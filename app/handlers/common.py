@@ -1,12 +1,15 @@
 from aiogram import Router, F
+from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import CommandStart, Command
+from aiogram.filters import CommandStart, Command, CommandObject
 
 from app.keyboards import kb_language, kb_menu
 from app.i18n import t
 from app.ui import send_or_edit
 from app.db import Database
+from app.sessions import UserSession
 from app.config import Config
+from app.states import SearchStates
 
 router = Router()
 
@@ -15,10 +18,30 @@ def is_admin(cfg: Config, user_id: int) -> bool:
     return int(user_id) == int(cfg.admin_id)
 
 
+async def leave_search(state: FSMContext) -> None:
+    # leaving the search screen: later text messages are not queries any more.
+    # Other states (checkout, admin wizards) are theirs to clear.
+    if await state.get_state() == SearchStates.query.state:
+        await state.set_state(None)
+
+
+# deep link from a product shared in inline mode (t.me/<bot>?start=prod_<id>);
+# must stay above cmd_start, which matches any /start
+@router.message(CommandStart(deep_link=True, magic=F.args.regexp(r"^prod_\d+$")))
+async def cmd_start_product(message: Message, command: CommandObject, db: Database, session: UserSession, state: FSMContext):
+    session.ui_fingerprint = None
+    await leave_search(state)
+    from app.handlers.catalog import show_product
+    product_id = int(command.args.split("_", 1)[1])
+    await show_product(message.bot, db, message.chat.id, message.from_user.id, session.lang, product_id)
+
+
 @router.message(CommandStart())
-async def cmd_start(message: Message, db: Database, cfg: Config):
-    await db.ensure_user(message.from_user.id)
-    lang = await db.get_user_lang(message.from_user.id)
+async def cmd_start(message: Message, db: Database, cfg: Config, session: UserSession, state: FSMContext):
+    lang = session.lang
+    await leave_search(state)
+    # the chat may have been cleared: always re-render on /start
+    session.ui_fingerprint = None
 
     await send_or_edit(
         bot=message.bot,
@@ -31,9 +54,8 @@ async def cmd_start(message: Message, db: Database, cfg: Config):
 
 
 @router.message(Command("admin"))
-async def cmd_admin(message: Message, db: Database, cfg: Config):
-    await db.ensure_user(message.from_user.id)
-    lang = await db.get_user_lang(message.from_user.id)
+async def cmd_admin(message: Message, db: Database, cfg: Config, session: UserSession):
+    lang = session.lang
 
     if not is_admin(cfg, message.from_user.id):
         await send_or_edit(message.bot, db, message.chat.id, message.from_user.id, t(lang, "admin_only"), None)
@@ -46,7 +68,6 @@ async def cmd_admin(message: Message, db: Database, cfg: Config):
 @router.callback_query(F.data.startswith("lang:"))
 async def cb_set_lang(callback: CallbackQuery, db: Database, cfg: Config):
     await callback.answer()
-    await db.ensure_user(callback.from_user.id)
 
     lang = callback.data.split(":", 1)[1].strip()
     await db.set_user_lang(callback.from_user.id, lang)
@@ -63,17 +84,18 @@ async def cb_set_lang(callback: CallbackQuery, db: Database, cfg: Config):
 
 
 @router.callback_query(F.data == "menu:language")
-async def cb_language(callback: CallbackQuery, db: Database):
+async def cb_language(callback: CallbackQuery, db: Database, session: UserSession, state: FSMContext):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    await leave_search(state)
+    lang = session.lang
     await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, t(lang, "choose_language"), kb_language())
 
 
 @router.callback_query(F.data.in_({"nav:menu", "menu:catalog", "menu:cart", "menu:orders", "menu:support", "menu:admin"}))
-async def cb_menu_nav(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_menu_nav(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession, state: FSMContext):
     await callback.answer()
-    await db.ensure_user(callback.from_user.id)
-    lang = await db.get_user_lang(callback.from_user.id)
+    await leave_search(state)
+    lang = session.lang
 
     if callback.data == "nav:menu":
         await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, t(lang, "menu_title"), kb_menu(lang, is_admin(cfg, callback.from_user.id)))
@@ -109,22 +131,25 @@ async def cb_menu_nav(callback: CallbackQuery, db: Database, cfg: Config):
 
 
 @router.callback_query(F.data == "nav:catalog")
-async def nav_catalog(callback: CallbackQuery, db: Database):
+async def nav_catalog(callback: CallbackQuery, db: Database, state: FSMContext):
     await callback.answer()
+    await leave_search(state)
     from app.handlers.catalog import show_catalog
     await show_catalog(callback, db)
 
 
 @router.callback_query(F.data == "nav:cart")
-async def nav_cart(callback: CallbackQuery, db: Database, cfg: Config):
+async def nav_cart(callback: CallbackQuery, db: Database, cfg: Config, state: FSMContext):
     await callback.answer()
+    await leave_search(state)
     from app.handlers.cart import show_cart
     await show_cart(callback, db, cfg)
 
 
 @router.callback_query(F.data == "nav:orders")
-async def nav_orders(callback: CallbackQuery, db: Database):
+async def nav_orders(callback: CallbackQuery, db: Database, state: FSMContext):
     await callback.answer()
+    await leave_search(state)
     from app.handlers.orders import show_orders
     await show_orders(callback, db)
 
@@ -0,0 +1,70 @@
+from aiogram import Router
+from aiogram.types import (
+    InlineQuery,
+    InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
+    InputTextMessageContent,
+)
+from aiogram.utils.deep_linking import create_start_link
+
+from app.catalog import available
+from app.db import Database
+from app.handlers.catalog import product_text
+from app.keyboards import kb_product_shared
+from app.search_cache import SearchCache
+from app.sessions import UserSession
+
+router = Router()
+
+INLINE_PAGE = 20
+INLINE_CACHE_TIME = 30  # seconds Telegram may reuse an answer for the same user and query
+
+# one per process, like the routers
+search_cache = SearchCache("inline", capacity=2000, ttl=INLINE_CACHE_TIME, window=5 * INLINE_PAGE)
+
+
+async def _search_ids(db: Database, query: str, offset: int):
+    """Returns (product ids of this page, next offset or "")."""
+    ids, more = await search_cache.page(db, query, offset, INLINE_PAGE)
+    return ids, str(offset + INLINE_PAGE) if more else ""
+
+
+@router.inline_query()
+async def inline_search(query: InlineQuery, db: Database, session: UserSession):
+    lang = session.lang
+    offset = int(query.offset) if query.offset.isdigit() else 0
+    if not SearchCache.key(query.query):
+        await query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=True)
+        return
+
+    ids, next_offset = await _search_ids(db, query.query, offset)
+
+    results = []
+    for pid in ids:
+        # the snapshot, not the cached hit, decides price/stock/visibility
+        p = await db.get_product(pid)
+        if not p or p["is_active"] != 1:
+            continue
+        text = product_text(p)
+        keyboard = kb_product_shared(lang, await create_start_link(query.bot, f"prod_{pid}"))
+        description = f"💰 {p['price_cents'] / 100.0:.2f} • 📦 {available(p)}"
+        if p.get("photo_file_id"):
+            results.append(InlineQueryResultCachedPhoto(
+                id=str(pid),
+                photo_file_id=p["photo_file_id"],
+                title=p["title"],
+                description=description,
+                caption=text,
+                reply_markup=keyboard,
+            ))
+        else:
+            results.append(InlineQueryResultArticle(
+                id=str(pid),
+                title=p["title"],
+                description=description,
+                input_message_content=InputTextMessageContent(message_text=text),
+                reply_markup=keyboard,
+            ))
+
+    # is_personal: button texts follow the user's language
+    await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True, next_offset=next_offset)
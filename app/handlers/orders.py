@@ -1,21 +1,23 @@
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
 from app.i18n import t
-from app.keyboards import kb_back_menu, kb_order_details, kb_payment_details
+from app.keyboards import kb_back_menu, kb_order_details, kb_orders, kb_payment_details
 from app.ui import send_or_edit
 from app.db import Database
+from app.sessions import UserSession
 from app.config import Config
 
 router = Router()
 
 
-async def show_orders(callback: CallbackQuery, db: Database):
-    await db.ensure_user(callback.from_user.id)
+async def show_orders(callback: CallbackQuery, db: Database, before: Optional[int] = None, after: Optional[int] = None):
     lang = await db.get_user_lang(callback.from_user.id)
 
-    orders = await db.list_user_orders(callback.from_user.id, limit=10)
-    if not orders:
+    orders, has_older, has_newer = await db.list_user_orders(callback.from_user.id, limit=10, before=before, after=after)
+    if not orders and before is None and after is None:
         await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, t(lang, "no_orders"), kb_back_menu(lang))
         return
 
@@ -25,20 +27,24 @@ async def show_orders(callback: CallbackQuery, db: Database):
     lines.append("")
     lines.append("👇 Open any order:" if lang == "en" else "👇 Відкрий замовлення:")
 
-    from aiogram.utils.keyboard import InlineKeyboardBuilder
-    b = InlineKeyboardBuilder()
-    for o in orders:
-        b.button(text=f"#{o['id']} • {o['status']}", callback_data=f"order:{o['id']}")
-    b.button(text=t(lang, "menu"), callback_data="nav:menu")
-    b.adjust(1)
+    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, "\n".join(lines), kb_orders(lang, orders, has_older, has_newer))
+
 
-    await send_or_edit(callback.bot, db, callback.message.chat.id, callback.from_user.id, "\n".join(lines), b.as_markup())
+# orders:p:<o|n>:<cursor id>
+@router.callback_query(F.data.startswith("orders:p:"))
+async def cb_orders_page(callback: CallbackQuery, db: Database):
+    await callback.answer()
+    _, _, direction, cursor = callback.data.split(":")
+    if direction == "o":
+        await show_orders(callback, db, before=int(cursor))
+    else:
+        await show_orders(callback, db, after=int(cursor))
 
 
 @router.callback_query(F.data.startswith("order:"))
-async def cb_order_details(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_order_details(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
 
     order_id = int(callback.data.split(":")[1])
     order = await db.get_order(order_id)
@@ -62,9 +68,9 @@ async def cb_order_details(callback: CallbackQuery, db: Database, cfg: Config):
 
 
 @router.callback_query(F.data.startswith("paydetails:"))
-async def cb_payment_details(callback: CallbackQuery, db: Database, cfg: Config):
+async def cb_payment_details(callback: CallbackQuery, db: Database, cfg: Config, session: UserSession):
     await callback.answer()
-    lang = await db.get_user_lang(callback.from_user.id)
+    lang = session.lang
 
     order_id = int(callback.data.split(":")[1])
     order = await db.get_order(order_id)
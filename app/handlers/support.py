@@ -11,7 +11,6 @@ router = Router()
 
 
 async def show_support(callback: CallbackQuery, db: Database, cfg: Config):
-    await db.ensure_user(callback.from_user.id)
     lang = await db.get_user_lang(callback.from_user.id)
 
     if lang == "ua":
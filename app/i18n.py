@@ -17,10 +17,17 @@ TEXTS: Dict[str, Dict[str, str]] = {
     "catalog_title": {"ua": "Каталог 🗂️", "en": "Catalog 🗂️"},
     "cart_title": {"ua": "Кошик 🧺", "en": "Cart 🧺"},
     "orders_title": {"ua": "Мої замовлення 📦", "en": "My orders 📦"},
+    "newer": {"ua": "◀️ Новіші", "en": "◀️ Newer"},
+    "older": {"ua": "Старіші ▶️", "en": "Older ▶️"},
     "support_title": {"ua": "Підтримка 💬", "en": "Support 💬"},
     "back": {"ua": "⬅️ Назад", "en": "⬅️ Back"},
     "menu": {"ua": "🏠 Меню", "en": "🏠 Menu"},
     "catalog": {"ua": "🗂️ Каталог", "en": "🗂️ Catalog"},
+    "search": {"ua": "🔎 Пошук", "en": "🔎 Search"},
+    "search_prompt": {"ua": "Введіть назву товару 🔎", "en": "Type a product name 🔎"},
+    "search_results": {"ua": "Результати пошуку 🔎", "en": "Search results 🔎"},
+    "search_empty": {"ua": "Нічого не знайдено 😕 Спробуйте інший запит:", "en": "Nothing found 😕 Try another query:"},
+    "open_in_shop": {"ua": "🛍️ Відкрити в магазині", "en": "🛍️ Open in shop"},
     "cart": {"ua": "🧺 Кошик", "en": "🧺 Cart"},
     "my_orders": {"ua": "📦 Мої замовлення", "en": "📦 My orders"},
     "support": {"ua": "💬 Підтримка", "en": "💬 Support"},
@@ -38,6 +45,7 @@ TEXTS: Dict[str, Dict[str, str]] = {
     "added_to_cart": {"ua": "Додано в кошик ✅", "en": "Added to cart ✅"},
     "removed_from_cart": {"ua": "Зменшено кількість ✅", "en": "Decreased ✅"},
     "checkout_intro": {"ua": "Оформлення замовлення ✍️", "en": "Checkout ✍️"},
+    "items_reserved": {"ua": "🔒 Товари зарезервовано за вами на {minutes} хв.", "en": "🔒 Your items are reserved for {minutes} min."},
     "ask_name": {"ua": "Введіть ім’я (мін. 2 символи):", "en": "Enter name (min 2 chars):"},
     "ask_phone": {"ua": "Введіть номер телефону (наприклад +380XXXXXXXXX):", "en": "Enter phone (e.g. +380XXXXXXXXX):"},
     "ask_city": {"ua": "Місто (мін. 2 символи):", "en": "City (min 2 chars):"},
@@ -73,6 +81,9 @@ TEXTS: Dict[str, Dict[str, str]] = {
     "admin_products": {"ua": "📦 Товари", "en": "📦 Products"},
     "admin_orders": {"ua": "🧾 Замовлення", "en": "🧾 Orders"},
     "admin_stats": {"ua": "📊 Статистика", "en": "📊 Stats"},
+    "stats_7d": {"ua": "📅 7 днів", "en": "📅 7 days"},
+    "stats_30d": {"ua": "🗓️ 30 днів", "en": "🗓️ 30 days"},
+    "stats_top": {"ua": "🏆 Топ товарів", "en": "🏆 Top products"},
     "admin_back": {"ua": "⬅️ Назад", "en": "⬅️ Back"},
     "admin_only": {"ua": "Ця дія тільки для адміністратора.", "en": "This action is admin-only."},
     "done": {"ua": "Готово ✅", "en": "Done ✅"},
@@ -1,6 +1,7 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from app.catalog import available
 from app.i18n import t, ORDER_STATUSES, delivery_label
 
 
@@ -15,13 +16,14 @@ def kb_language() -> InlineKeyboardMarkup:
 def kb_menu(lang: str, is_admin: bool) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     b.button(text=t(lang, "catalog"), callback_data="menu:catalog")
+    b.button(text=t(lang, "search"), callback_data="menu:search")
     b.button(text=t(lang, "cart"), callback_data="menu:cart")
     b.button(text=t(lang, "my_orders"), callback_data="menu:orders")
     b.button(text=t(lang, "support"), callback_data="menu:support")
     b.button(text=t(lang, "language"), callback_data="menu:language")
     if is_admin:
         b.button(text=t(lang, "admin"), callback_data="menu:admin")
-    b.adjust(2, 2, 2)
+    b.adjust(2, 2, 2, 1)
     return b.as_markup()
 
 
@@ -33,24 +35,49 @@ def kb_back_menu(lang: str) -> InlineKeyboardMarkup:
     return b.as_markup()
 
 
-def kb_catalog_categories(lang: str, categories) -> InlineKeyboardMarkup:
+def _pager(b: InlineKeyboardBuilder, prefix: str, page: int, pages: int) -> int:
+    """Adds ◀️/▶️ buttons with callback_data f"{prefix}:<page>"; returns how many."""
+    n = 0
+    if page > 0:
+        b.button(text="◀️", callback_data=f"{prefix}:{page - 1}")
+        n += 1
+    if page < pages - 1:
+        b.button(text="▶️", callback_data=f"{prefix}:{page + 1}")
+        n += 1
+    return n
+
+
+def kb_catalog_categories(lang: str, categories, page: int = 0, pages: int = 1) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     for c in categories:
         b.button(text=f"📁 {c['name']}", callback_data=f"cat:{c['id']}")
+    nav = _pager(b, "catp", page, pages)
     b.button(text=t(lang, "menu"), callback_data="nav:menu")
-    b.adjust(1)
+    b.adjust(*([1] * len(categories)), *([nav] if nav else []), 1)
     return b.as_markup()
 
 
-def kb_category_products(lang: str, category_id: int, products) -> InlineKeyboardMarkup:
+def kb_category_products(lang: str, category_id: int, products, page: int = 0, pages: int = 1) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     for p in products:
-        stock = p["stock"]
-        badge = "✅" if stock > 0 else "⛔"
+        badge = "✅" if available(p) > 0 else "⛔"
         b.button(text=f"{badge} {p['title']}", callback_data=f"prod:{p['id']}")
+    nav = _pager(b, f"cat:{category_id}", page, pages)
     b.button(text=t(lang, "back"), callback_data=f"cat_back:{category_id}")
     b.button(text=t(lang, "menu"), callback_data="nav:menu")
-    b.adjust(1)
+    b.adjust(*([1] * len(products)), *([nav] if nav else []), 1)
+    return b.as_markup()
+
+
+def kb_search_results(lang: str, products, page: int, has_more: bool) -> InlineKeyboardMarkup:
+    b = InlineKeyboardBuilder()
+    for p in products:
+        badge = "✅" if available(p) > 0 else "⛔"
+        b.button(text=f"{badge} {p['title']}", callback_data=f"prod:{p['id']}")
+    nav = _pager(b, "srch", page, page + 2 if has_more else page + 1)
+    b.button(text=t(lang, "catalog"), callback_data="nav:catalog")
+    b.button(text=t(lang, "menu"), callback_data="nav:menu")
+    b.adjust(*([1] * len(products)), *([nav] if nav else []), 2)
     return b.as_markup()
 
 
@@ -65,6 +92,14 @@ def kb_product(lang: str, product_id: int) -> InlineKeyboardMarkup:
     return b.as_markup()
 
 
+def kb_product_shared(lang: str, url: str) -> InlineKeyboardMarkup:
+    # inline-mode messages live in other chats: callback buttons there carry
+    # no chat to render into, so the product opens in the bot via a deep link
+    b = InlineKeyboardBuilder()
+    b.button(text=t(lang, "open_in_shop"), url=url)
+    return b.as_markup()
+
+
 def kb_cart(lang: str, cart_items) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     # per-item +/- row
@@ -126,6 +161,28 @@ def kb_payment(lang: str, order_id: int) -> InlineKeyboardMarkup:
     return b.as_markup()
 
 
+def _page_nav(b: InlineKeyboardBuilder, lang: str, prefix: str, orders, has_older: bool, has_newer: bool) -> int:
+    """Adds newer/older buttons (keyset cursors: first/last id on the page); returns how many."""
+    n = 0
+    if has_newer and orders:
+        b.button(text=t(lang, "newer"), callback_data=f"{prefix}:n:{orders[0]['id']}")
+        n += 1
+    if has_older and orders:
+        b.button(text=t(lang, "older"), callback_data=f"{prefix}:o:{orders[-1]['id']}")
+        n += 1
+    return n
+
+
+def kb_orders(lang: str, orders, has_older: bool, has_newer: bool) -> InlineKeyboardMarkup:
+    b = InlineKeyboardBuilder()
+    for o in orders:
+        b.button(text=f"#{o['id']} • {o['status']}", callback_data=f"order:{o['id']}")
+    nav = _page_nav(b, lang, "orders:p", orders, has_older, has_newer)
+    b.button(text=t(lang, "menu"), callback_data="nav:menu")
+    b.adjust(*([1] * len(orders)), *([nav] if nav else []), 1)
+    return b.as_markup()
+
+
 def kb_order_details(lang: str, order_id: int, is_manual: bool) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     if is_manual:
@@ -156,14 +213,25 @@ def kb_admin_panel(lang: str) -> InlineKeyboardMarkup:
     return b.as_markup()
 
 
-def kb_admin_categories(lang: str, cats) -> InlineKeyboardMarkup:
+def kb_admin_stats(lang: str, back: str = "admin:back") -> InlineKeyboardMarkup:
+    b = InlineKeyboardBuilder()
+    b.button(text=t(lang, "stats_7d"), callback_data="admin:stats:7")
+    b.button(text=t(lang, "stats_30d"), callback_data="admin:stats:30")
+    b.button(text=t(lang, "stats_top"), callback_data="admin:stats:top")
+    b.button(text=t(lang, "admin_back"), callback_data=back)
+    b.adjust(2, 1, 1)
+    return b.as_markup()
+
+
+def kb_admin_categories(lang: str, cats, page: int = 0, pages: int = 1) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     b.button(text="➕ Create", callback_data="admin:cat:create")
     for c in cats:
         flag = "✅" if c["is_active"] else "🗄️"
         b.button(text=f"{flag} {c['name']}", callback_data=f"admin:cat:{c['id']}")
+    nav = _pager(b, "admin:cats", page, pages)
     b.button(text=t(lang, "admin_back"), callback_data="admin:back")
-    b.adjust(1)
+    b.adjust(*([1] * (len(cats) + 1)), *([nav] if nav else []), 1)
     return b.as_markup()
 
 
@@ -179,24 +247,29 @@ def kb_admin_category(lang: str, cat_id: int, is_active: int) -> InlineKeyboardM
     return b.as_markup()
 
 
-def kb_admin_products_root(lang: str, cats) -> InlineKeyboardMarkup:
+def kb_admin_products_root(lang: str, cats, page: int = 0, pages: int = 1) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     b.button(text="➕ Create product", callback_data="admin:prod:create")
+    b.button(text="📥 Import CSV", callback_data="admin:import")
+    b.button(text="📤 Export CSV", callback_data="admin:export:products")
+    b.button(text="🔁 Bulk stock / price", callback_data="admin:adjust")
     for c in cats:
         b.button(text=f"📁 {c['name']}", callback_data=f"admin:prods:cat:{c['id']}")
+    nav = _pager(b, "admin:prods:p", page, pages)
     b.button(text=t(lang, "admin_back"), callback_data="admin:back")
-    b.adjust(1)
+    b.adjust(1, 2, 1, *([1] * len(cats)), *([nav] if nav else []), 1)
     return b.as_markup()
 
 
-def kb_admin_products_list(lang: str, cat_id: int, products) -> InlineKeyboardMarkup:
+def kb_admin_products_list(lang: str, cat_id: int, products, page: int = 0, pages: int = 1) -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
     for p in products:
         flag = "✅" if p["is_active"] else "🗑️"
-        b.button(text=f"{flag} {p['title']}", callback_data=f"admin:prod:{p['id']}")
+        b.button(text=f"{flag} {p['title']} • {p['stock']}", callback_data=f"admin:prod:{p['id']}")
+    nav = _pager(b, f"admin:prods:cat:{cat_id}", page, pages)
     b.button(text="➕ Create product", callback_data="admin:prod:create")
     b.button(text=t(lang, "admin_back"), callback_data="admin:prods")
-    b.adjust(1)
+    b.adjust(*([1] * len(products)), *([nav] if nav else []), 1, 1)
     return b.as_markup()
 
 
@@ -215,12 +288,17 @@ def kb_admin_product(lang: str, product_id: int) -> InlineKeyboardMarkup:
     return b.as_markup()
 
 
-def kb_admin_orders(lang: str, orders) -> InlineKeyboardMarkup:
+def kb_admin_orders(lang: str, orders, status: str, has_older: bool, has_newer: bool) -> InlineKeyboardMarkup:
+    """status: one of ORDER_STATUSES or "ALL"; it is carried in every filter/page button."""
     b = InlineKeyboardBuilder()
+    for st in ["ALL", *ORDER_STATUSES]:
+        b.button(text=f"• {st}" if st == status else st, callback_data=f"admin:orders:{st}")
     for o in orders:
         b.button(text=f"#{o['id']} • {o['status']} • {o['total_cents']/100:.2f}", callback_data=f"admin:order:{o['id']}")
+    nav = _page_nav(b, lang, f"admin:orders:{status}", orders, has_older, has_newer)
+    b.button(text="📤 Export CSV", callback_data=f"admin:export:orders:{status}")
     b.button(text=t(lang, "admin_back"), callback_data="admin:back")
-    b.adjust(1)
+    b.adjust(3, 3, *([1] * len(orders)), *([nav] if nav else []), 1, 1)
     return b.as_markup()
 
 
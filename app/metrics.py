@@ -0,0 +1,41 @@
+from collections import defaultdict
+from typing import Dict
+
+
+class Metrics:
+    """
+    Process-local counters, gauges and timing summaries.
+    Cheap enough to call on every update; read with snapshot().
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.gauges: Dict[str, float] = {}
+        self._timings: Dict[str, list] = {}  # name -> [count, total_s, max_s]
+
+    def inc(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        t = self._timings.get(name)
+        if t is None:
+            t = self._timings[name] = [0, 0.0, 0.0]
+        t[0] += 1
+        t[1] += seconds
+        if seconds > t[2]:
+            t[2] = seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        out: Dict[str, float] = dict(self.counters)
+        out.update(self.gauges)
+        for name, (count, total, worst) in self._timings.items():
+            out[f"{name}.count"] = count
+            out[f"{name}.avg_ms"] = round(total / count * 1000, 2) if count else 0.0
+            out[f"{name}.max_ms"] = round(worst * 1000, 2)
+        return out
+
+
+metrics = Metrics()
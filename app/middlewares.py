@@ -1,17 +1,21 @@
-from typing import Callable, Dict, Any, Awaitable
+from collections import deque
+from typing import Callable, Deque, Dict, Any, Awaitable, Optional, Set
 
 from aiogram import BaseMiddleware
-from aiogram.types import TelegramObject
+from aiogram.types import TelegramObject, Update, User
 
+from app.activity import ActivityTracker
 from app.db import Database
 from app.config import Config
+from app.metrics import metrics
 
 
 class DependencyMiddleware(BaseMiddleware):
-    def __init__(self, db: Database, cfg: Config):
+    def __init__(self, db: Database, cfg: Config, activity: Optional[ActivityTracker] = None):
         super().__init__()
         self.db = db
         self.cfg = cfg
+        self.activity = activity
 
     async def __call__(
         self,
@@ -21,4 +25,40 @@ class DependencyMiddleware(BaseMiddleware):
     ) -> Any:
         data["db"] = self.db
         data["cfg"] = self.cfg
+        # load user metadata once per update (cached, no DB read on hot paths)
+        user: User = data.get("event_from_user")
+        if user is not None:
+            data["session"] = await self.db.load_session(user.id)
+            if self.activity is not None:
+                self.activity.touch(user.id)
+        return await handler(event, data)
+
+
+class UpdateDedupMiddleware(BaseMiddleware):
+    """
+    Outer update middleware: drops an update whose update_id is among the
+    last `size` seen (webhook redeliveries after a slow response, polling
+    offsets replayed after a crash). Ring buffer + set, O(1) per update.
+    """
+
+    def __init__(self, size: int = 1024):
+        super().__init__()
+        self._order: Deque[int] = deque(maxlen=max(1, int(size)))
+        self._seen: Set[int] = set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_id = event.update_id if isinstance(event, Update) else None
+        if update_id is not None:
+            if update_id in self._seen:
+                metrics.inc("updates.duplicates_dropped")
+                return None
+            if len(self._order) == self._order.maxlen:
+                self._seen.discard(self._order[0])
+            self._order.append(update_id)
+            self._seen.add(update_id)
         return await handler(event, data)
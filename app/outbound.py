@@ -0,0 +1,259 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from app.metrics import metrics
+
+logger = logging.getLogger("app.outbound")
+
+# priority lanes, lower goes first
+INTERACTIVE = 0
+NOTIFICATION = 1
+LANE_NAMES = ("interactive", "notification")
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("outbound_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def notification_priority() -> Iterator[None]:
+    """Bot calls made inside this block go to the low-priority lane."""
+    token = _priority.set(NOTIFICATION)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+_notifications: Set[asyncio.Task] = set()
+
+
+def send_notification(bot: Bot, chat_id: int, text: str, **kwargs: Any) -> asyncio.Task:
+    """
+    send_message in the NOTIFICATION lane, as a detached task: the caller
+    does not wait for the target chat's bucket (an admin chat allows
+    ~1 msg/s), so a handler can finish its own screen and release the
+    user's lock right away. Failures are logged, not raised.
+    """
+
+    async def send() -> None:
+        with notification_priority():
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            except Exception:
+                metrics.inc("outbound.notifications_failed")
+                logger.exception("Notification failed chat_id=%s", chat_id)
+
+    task = asyncio.create_task(send())
+    _notifications.add(task)  # keep a reference until it is sent
+    task.add_done_callback(_notifications.discard)
+    return task
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0  # set from TelegramRetryAfter
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until one token is available (0 = available now)."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+@dataclass(slots=True)
+class _Ticket:
+    chat_id: int
+    fut: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class OutboundDispatcher(BaseRequestMiddleware):
+    """
+    Bot session middleware that admits every chat-bound API call
+    (send_message, edit_message_text, delete_message, send_photo, ...) through:
+      - a global token bucket (Telegram allows ~30 msg/s per bot)
+      - per-chat token buckets
+      - priority lanes: INTERACTIVE (screens of the user being served) before
+        NOTIFICATION (admin/status notifications, see send_notification());
+        within a lane every chat has its own FIFO and chats take turns, so
+        one backed-up chat costs one look per admission, not one per ticket
+      - TelegramRetryAfter handling: the chat is paused for retry_after seconds
+        and the call is re-admitted, up to max_retries times
+    Calls without chat_id (getUpdates, answerCallbackQuery, ...) pass straight through.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        max_retries: int = 3,
+        max_idle_buckets: int = 10000,
+    ):
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate))
+        self.chat_rate = chat_rate
+        self.chat_burst = max(1.0, chat_burst)
+        self.max_retries = max_retries
+        self.max_idle_buckets = max_idle_buckets
+        self._chats: Dict[int, TokenBucket] = {}
+        # lane -> chat_id -> that chat's tickets, chats in turn order
+        self._lanes: List["OrderedDict[int, Deque[_Ticket]]"] = [OrderedDict() for _ in LANE_NAMES]
+        self._depth = [0] * len(LANE_NAMES)
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        attempt = 0
+        while True:
+            await self._admit(chat_id, _priority.get())
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                metrics.inc("outbound.retry_after")
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                logger.warning("Flood control chat_id=%s retry_after=%ss (attempt %s)", chat_id, e.retry_after, attempt)
+                self._chat_bucket(chat_id).blocked_until = time.monotonic() + e.retry_after
+
+    # -------- admission --------
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _update_gauges(self) -> None:
+        for name, depth in zip(LANE_NAMES, self._depth):
+            metrics.set_gauge(f"outbound.queue_depth.{name}", depth)
+
+    async def _admit(self, chat_id, priority: int) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        ticket = _Ticket(chat_id=chat_id, fut=asyncio.get_running_loop().create_future())
+        queue = self._lanes[priority].get(chat_id)
+        if queue is None:
+            queue = self._lanes[priority][chat_id] = deque()
+        queue.append(ticket)
+        self._depth[priority] += 1
+        self._update_gauges()
+        self._wake.set()
+        try:
+            await ticket.fut
+        finally:
+            metrics.observe(f"outbound.wait.{LANE_NAMES[priority]}", time.monotonic() - ticket.enqueued_at)
+
+    def _pick(self, now: float) -> Optional[float]:
+        """Releases the first admissible ticket; returns how long to sleep otherwise."""
+        soonest: Optional[float] = None
+        for priority, lane in enumerate(self._lanes):
+            for chat_id in list(lane):
+                queue = lane[chat_id]
+                while queue and queue[0].fut.done():  # caller went away
+                    queue.popleft()
+                    self._depth[priority] -= 1
+                if not queue:
+                    del lane[chat_id]
+                    continue
+                # only the head matters: the chat's other tickets wait for the same bucket
+                wait = self._chat_bucket(chat_id).delay(now)
+                if wait <= 0:
+                    ticket = queue.popleft()
+                    self._depth[priority] -= 1
+                    if queue:
+                        lane.move_to_end(chat_id)  # next chat's turn
+                    else:
+                        del lane[chat_id]
+                    self.global_bucket.take(now)
+                    self._chats[chat_id].take(now)
+                    ticket.fut.set_result(None)
+                    return 0.0
+                soonest = wait if soonest is None else min(soonest, wait)
+        return soonest
+
+    def _prune(self, now: float) -> None:
+        if len(self._chats) <= self.max_idle_buckets:
+            return
+        for chat_id in [c for c, b in self._chats.items() if b.idle(now)]:
+            del self._chats[chat_id]
+
+    async def _run(self) -> None:
+        while True:
+            if not any(self._lanes):
+                self._update_gauges()
+                self._prune(time.monotonic())
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            now = time.monotonic()
+            wait = self.global_bucket.delay(now)
+            if wait <= 0:
+                wait = self._pick(now)
+                self._update_gauges()
+                if wait == 0.0:
+                    continue
+            if wait is None:
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        # give queued notifications a moment to go out before shutting down
+        if _notifications:
+            await asyncio.wait(set(_notifications), timeout=drain_timeout)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for lane in self._lanes:
+            for queue in lane.values():
+                for ticket in queue:
+                    if not ticket.fut.done():
+                        ticket.fut.cancel()
+            lane.clear()
+        self._depth = [0] * len(LANE_NAMES)
+        for task in list(_notifications):
+            task.cancel()
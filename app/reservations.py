@@ -0,0 +1,78 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import List, Optional
+
+from app.db import Database
+
+logger = logging.getLogger("app.reservations")
+
+
+class ReservationSweeper:
+    """
+    Gives expired checkout holds (Database.reserve_cart) back to stock:
+      - a min-heap of expiry times, fed through Database.on_reserve; one
+        task sleeps until the earliest one, not one timer per hold
+      - each wake-up releases everything expired in one write
+        (Database.sweep_reservations), so a burst of expiries costs one write
+      - entries of holds that were renewed, ordered or cancelled meanwhile
+        just find nothing to release
+      - on start the heap is seeded from the table, so holds taken before a
+        restart (or by another worker) still expire on time
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._heap: List[float] = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, expires_at: float) -> None:
+        heapq.heappush(self._heap, expires_at)
+        if self._heap[0] == expires_at:
+            self._wake.set()  # new earliest expiry: shorten the sleep
+
+    async def _run(self) -> None:
+        try:
+            for ts in await self.db.reservation_expiries():
+                self.schedule(ts)
+        except Exception:
+            logger.exception("Loading reservation expiries failed")
+
+        while True:
+            now = time.time()
+            if self._heap and self._heap[0] <= now:
+                while self._heap and self._heap[0] <= now:
+                    heapq.heappop(self._heap)
+                try:
+                    await self.db.sweep_reservations()
+                except Exception:
+                    logger.exception("Reservation sweep failed")
+                    self.schedule(now + 5.0)  # retry; the holds are still in the table
+                continue
+
+            self._wake.clear()
+            timeout = self._heap[0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self.db.on_reserve = self.schedule
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self.db.on_reserve = None
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
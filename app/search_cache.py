@@ -0,0 +1,154 @@
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from app.db import Database
+from app.metrics import metrics
+from app.utils import fts_match
+
+# unicode61 token characters: letters and digits; "_" separates tokens
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def query_terms(key: str) -> List[str]:
+    """The prefix terms of a key: '"iph"* "pro"*' -> ["iph", "pro"]."""
+    return [t[1:-2] for t in key.split()]
+
+
+def _fold(text: str) -> str:
+    # remove_diacritics: only Latin letters lose their marks ("é" -> "e", "й" stays)
+    out = []
+    for ch in text.lower():
+        d = unicodedata.normalize("NFD", ch)
+        out.append(d[0] if len(d) > 1 and ord(d[0]) < 0x250 else ch)
+    return "".join(out)
+
+
+def matches(terms: Iterable[str], text: str) -> bool:
+    """In-memory products_fts MATCH: every term is a prefix of some token of `text`."""
+    tokens = TOKEN_RE.findall(_fold(text))
+    return all(any(tok.startswith(t) for tok in tokens) for t in (_fold(t) for t in terms))
+
+
+class SearchCache:
+    """
+    In-process LRU of search results kept in front of
+    Database.search_products(): normalized query -> (ranked product ids of
+    the first `window` matches, has_more). Entries expire after `ttl`
+    seconds, so new and renamed products show up within ttl; callers
+    re-read every id from the catalog snapshot, so price, stock and
+    deactivation are always current.
+
+    It is also a prefix-result cache: every match of "phone c" is a match
+    of "phone" (and of "phon"), so while a shorter query's entry holds all
+    of its matches (has_more False), covering() hands those ids out and
+    page() narrows them in memory (see matches()) instead of asking
+    SQLite again.
+
+    search_products() ranks every match, which costs tens of ms for terms
+    that match a large part of the catalog; with page() that is paid once
+    per query and ttl, not on every page or keystroke.
+    """
+
+    def __init__(self, name: str, capacity: int = 2000, ttl: float = 30.0, window: int = 100):
+        self.name = name  # metrics prefix
+        self.capacity = max(1, int(capacity))
+        self.ttl = ttl
+        self.window = max(1, int(window))
+        self._items: "OrderedDict[str, Tuple[float, Tuple[int, ...], bool]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @staticmethod
+    def key(text: str) -> str:
+        # "Phone ", "phone" and "PHONE" are one entry (fts_match lowercases)
+        return fts_match(text)
+
+    def get(self, key: str) -> Optional[Tuple[Tuple[int, ...], bool]]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, ids, has_more = item
+        if time.monotonic() >= expires_at:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return ids, has_more
+
+    def covering(self, key: str) -> Optional[Tuple[int, ...]]:
+        """
+        Ids of the closest cached shorter query whose matches include every
+        match of `key` (the last term cut back a letter at a time, then
+        dropped, and so on), or None if that entry is partial or there is none.
+        """
+        terms = query_terms(key)
+        if any("_" in t for t in terms):
+            return None  # "a_b" is a phrase for FTS5, not one prefix term
+        while terms:
+            if len(terms[-1]) > 1:
+                terms[-1] = terms[-1][:-1]
+            else:
+                terms.pop()
+            hit = self.get(fts_match(" ".join(terms))) if terms else None
+            if hit is not None:
+                ids, has_more = hit
+                return None if has_more else ids
+        return None
+
+    def put(self, key: str, ids: Tuple[int, ...], has_more: bool) -> None:
+        self._items[key] = (time.monotonic() + self.ttl, ids, has_more)
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    async def page(self, db: Database, text: str, offset: int, limit: int) -> Tuple[Tuple[int, ...], bool]:
+        """
+        (product ids, has_more) of one page of db.search_products(text),
+        from the cache where possible. Pages past the window go to the index.
+        """
+        key = self.key(text)
+        hit = self.get(key)
+        base = self.covering(key) if hit is None else None
+        if hit is not None:
+            metrics.inc(f"{self.name}.cache_hit")
+        elif base is not None:
+            # a longer query: narrow the shorter query's complete result set
+            metrics.inc(f"{self.name}.cache_prefix_hit")
+            hit = (await _narrow(db, base, query_terms(key)), False)
+            self.put(key, *hit)
+        else:
+            metrics.inc(f"{self.name}.cache_miss")
+            rows, has_more = await db.search_products(text, limit=self.window)
+            hit = (tuple(p["id"] for p in rows), has_more)
+            self.put(key, *hit)
+        ids, has_more = hit
+
+        end = offset + limit
+        if offset < len(ids):
+            return ids[offset:end], end < len(ids) or has_more
+        if not has_more:
+            return (), False
+        # scrolled past the cached window: rare, go to the index
+        rows, more = await db.search_products(text, limit=limit, offset=offset)
+        return tuple(p["id"] for p in rows), more
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+async def _narrow(db: Database, ids: Iterable[int], terms: List[str]) -> Tuple[int, ...]:
+    """
+    The ids (in order) whose product matches every term. Title matches go
+    first, as bm25 weights title hits above description hits; otherwise
+    the shorter query's ranking is kept.
+    """
+    rows = []
+    for pid in ids:
+        p = await db.get_product(pid)
+        if p and matches(terms, f"{p['title']} {p['description']}"):
+            rows.append(p)
+    rows.sort(key=lambda p: not matches(terms, p["title"]))
+    return tuple(p["id"] for p in rows)
@@ -0,0 +1,40 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(slots=True)
+class UserSession:
+    user_id: int
+    lang: str = "ua"
+    ui_message_id: Optional[int] = None
+    ui_fingerprint: Optional[str] = None  # hash of the last rendered UI screen (memory only)
+
+
+class SessionCache:
+    """
+    In-process LRU of user metadata kept in front of the users table.
+    Presence in the cache means the user row is known to exist.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = max(1, int(capacity))
+        self._items: "OrderedDict[int, UserSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, user_id: int) -> Optional[UserSession]:
+        session = self._items.get(user_id)
+        if session is not None:
+            self._items.move_to_end(user_id)
+        return session
+
+    def put(self, session: UserSession) -> None:
+        self._items[session.user_id] = session
+        self._items.move_to_end(session.user_id)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def discard(self, user_id: int) -> None:
+        self._items.pop(user_id, None)
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import multiprocessing as mp
+import signal
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject, Update
+
+from app.activity import ActivityTracker
+from app.reservations import ReservationSweeper
+from app.bot import create_bot
+from app.config import Config
+from app.db import Database
+from app.dispatcher import build_dispatcher
+from app.fsm_storage import SQLiteStorage
+from app.logger import setup_logging
+from app.metrics import metrics
+from app.outbound import OutboundDispatcher
+from app.webhook import run_webhook
+
+logger = logging.getLogger("app.sharding")
+
+# Inbox messages (front -> worker):
+#   ("update", key, raw_json)
+#   ("invalidate", kind, ids)     see Database.on_change / Database.invalidate
+#   None                          stop after finishing queued updates
+# Event messages (worker -> front, relayed to every other worker):
+#   (worker_index, kind, ids)
+
+
+def shard_of(key: int, workers: int) -> int:
+    return key % workers
+
+
+class ShardForwarder(BaseMiddleware):
+    """
+    Outer update middleware of the front dispatcher: instead of handling the
+    update it hands the raw update to the worker that owns from_user.id
+    (falls back to the chat id, then update_id). One user always lands on the
+    same worker, and updates go into its inbox in arrival order.
+    """
+
+    def __init__(self, pool: "WorkerPool"):
+        super().__init__()
+        self.pool = pool
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        if user is not None:
+            key = user.id
+        elif chat is not None:
+            key = chat.id
+        else:
+            key = event.update_id
+        self.pool.forward(key, event.model_dump_json(by_alias=True, exclude_none=True))
+        metrics.inc("shard.forwarded")
+        return None
+
+
+class WorkerPool:
+    """Spawns the worker processes and relays cache invalidations between them."""
+
+    def __init__(self, cfg: Config, workers: int):
+        self.cfg = cfg
+        self.workers = workers
+        self._ctx = mp.get_context("spawn")
+        self.inboxes = [self._ctx.Queue() for _ in range(workers)]
+        self.events = self._ctx.Queue()
+        self._procs: List[mp.Process] = []
+        self._relay: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            proc = self._ctx.Process(
+                target=run_worker,
+                args=(index, self.workers, self.cfg, self.inboxes[index], self.events),
+                name=f"shop-worker-{index}",
+                daemon=True,
+            )
+            proc.start()
+            self._procs.append(proc)
+        self._relay = asyncio.create_task(self._relay_events())
+        logger.info("Started %s workers", self.workers)
+
+    def forward(self, key: int, raw: str) -> None:
+        self.inboxes[shard_of(key, self.workers)].put(("update", key, raw))
+
+    async def _relay_events(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            event = await loop.run_in_executor(None, self.events.get)
+            if event is None:
+                return
+            origin, kind, ids = event
+            for index, inbox in enumerate(self.inboxes):
+                if index != origin:
+                    inbox.put(("invalidate", kind, ids))
+            metrics.inc("shard.invalidations")
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Lets every worker finish its queued updates, then stops the relay."""
+        loop = asyncio.get_running_loop()
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for proc in self._procs:
+            await loop.run_in_executor(None, proc.join, timeout)
+            if proc.is_alive():
+                logger.warning("Worker %s did not stop in %ss, killing", proc.name, timeout)
+                proc.kill()
+        self.events.put(None)
+        if self._relay is not None:
+            await self._relay
+            self._relay = None
+
+
+async def run_front(cfg: Config) -> None:
+    """
+    Front process for WORKERS > 1: receives updates (polling or webhook) and
+    shards them to worker processes; it never touches handlers or the DB.
+    """
+    # create schema / demo seed once, before the workers open the file
+    db = Database(cfg.db_path, readers=1, profile=cfg.db_profile)
+    await db.init()
+    await db.close()
+
+    pool = WorkerPool(cfg, cfg.workers)
+    pool.start()
+
+    bot = create_bot(cfg.bot_token)
+    dp = Dispatcher()
+    dp.update.outer_middleware(ShardForwarder(pool))
+
+    try:
+        if cfg.mode == "webhook":
+            # answers come from the workers over the Bot API, nothing to return inline
+            await run_webhook(dp, bot, cfg, inline_answers=False)
+        else:
+            await bot.delete_webhook()
+            # sequential feed keeps the per-user order of getUpdates batches
+            await dp.start_polling(bot, handle_as_tasks=False)
+    finally:
+        await pool.stop()
+        await bot.session.close()
+
+
+# -------- worker process --------
+def run_worker(index: int, workers: int, cfg: Config, inbox: Any, events: Any) -> None:
+    # Ctrl+C / SIGTERM hit the whole process group; the front owns shutdown and
+    # stops workers through their inbox so queued updates are not lost
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    setup_logging()
+    asyncio.run(_worker_main(index, workers, cfg, inbox, events))
+
+
+async def _handle(dp: Dispatcher, bot: Bot, update: Update, prev: Optional[asyncio.Task]) -> None:
+    if prev is not None:
+        # same user: wait for the previous update, whatever its outcome
+        await asyncio.wait({prev})
+    try:
+        result = await dp.feed_update(bot, update)
+        if isinstance(result, TelegramMethod):
+            await dp.silent_call_request(bot, result)
+    except Exception:
+        logger.exception("Worker failed on update_id=%s", update.update_id)
+
+
+async def _worker_main(index: int, workers: int, cfg: Config, inbox: Any, events: Any) -> None:
+    # the Bot API global limit is shared; per-chat limits stay exact because
+    # a private chat always maps to one worker
+    outbound = OutboundDispatcher(global_rate=cfg.tg_global_rate / workers, chat_rate=cfg.tg_chat_rate)
+    bot = create_bot(cfg.bot_token, outbound=outbound)
+
+    db = Database(cfg.db_path, readers=cfg.db_readers, profile=cfg.db_profile)
+    await db.init()
+    db.on_change = lambda kind, ids: events.put((index, kind, ids))
+
+    activity = ActivityTracker(db)
+    activity.start()
+
+    # FSM keys are per chat/user, so each key only ever lives on its owner worker
+    storage = SQLiteStorage(db, ttl=cfg.fsm_ttl_hours * 3600)
+    storage.start()
+
+    # each worker times the holds its own users take (plus those in the table
+    # at start); a sweep releases every expired hold, whoever took it
+    sweeper = ReservationSweeper(db)
+    sweeper.start()
+
+    dp = build_dispatcher(db, cfg, activity, storage)
+    loop = asyncio.get_running_loop()
+    tails: Dict[int, asyncio.Task] = {}
+
+    def forget(key: int, task: asyncio.Task) -> None:
+        if tails.get(key) is task:
+            del tails[key]
+
+    logger.info("Worker %s/%s ready", index, workers)
+    try:
+        while True:
+            msg: Optional[Tuple] = await loop.run_in_executor(None, inbox.get)
+            if msg is None:
+                break
+            if msg[0] == "update":
+                _, key, raw = msg
+                update = Update.model_validate_json(raw, context={"bot": bot})
+                # chain per user: concurrent across users, ordered within one
+                task = asyncio.create_task(_handle(dp, bot, update, tails.get(key)))
+                tails[key] = task
+                task.add_done_callback(lambda t, key=key: forget(key, t))
+            elif msg[0] == "invalidate":
+                _, kind, ids = msg
+                try:
+                    await db.invalidate(kind, ids)
+                except Exception:
+                    logger.exception("Invalidation failed kind=%s ids=%s", kind, ids)
+        if tails:
+            await asyncio.wait(set(tails.values()))
+    finally:
+        await sweeper.stop()
+        await activity.stop()
+        await storage.close()
+        await outbound.close()
+        await bot.session.close()
+        await db.close()
+        logger.info("Worker %s stopped", index)
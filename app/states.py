@@ -11,6 +11,10 @@ class CheckoutStates(StatesGroup):
     edit_field = State()  # generic editing state
 
 
+class SearchStates(StatesGroup):
+    query = State()
+
+
 class AdminCategoryStates(StatesGroup):
     create_name = State()
     rename = State()
@@ -28,3 +32,8 @@ class AdminProductStates(StatesGroup):
     edit_field = State()
     edit_value = State()
     wait_photo = State()
+
+
+class AdminImportStates(StatesGroup):
+    wait_file = State()
+    wait_adjustments = State()
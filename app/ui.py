@@ -1,13 +1,102 @@
+import asyncio
+import contextvars
+import hashlib
 import logging
-from typing import Optional
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from aiogram.types import InlineKeyboardMarkup, Message
 
+from app.metrics import metrics
+
 logger = logging.getLogger("app.ui")
 
 
+def ui_fingerprint(*parts) -> str:
+    """Stable hash of what a UI message shows (text/caption, keyboard, options)."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, InlineKeyboardMarkup):
+            part = part.model_dump_json(exclude_none=True)
+        h.update(repr(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+_in_coalesced_render: contextvars.ContextVar[bool] = contextvars.ContextVar("in_coalesced_render", default=False)
+
+
+class RenderCoalescer:
+    """
+    Per-chat render debounce for bursts of taps (e.g. cart ➕/➖):
+      - the first render for a chat runs right away
+      - renders scheduled during the following `window` seconds collapse
+        into one trailing render of the latest state
+    Only the rendering is deferred; callers answer callbacks and apply
+    their DB mutations before scheduling.
+    A direct send_or_edit() calls discard() first, which also waits out a
+    render that is already running, so a coalesced render never lands on
+    top of a newer screen.
+    """
+
+    def __init__(self, window: float = 0.4):
+        self.window = window
+        self._pending: Dict[int, Callable[[], Awaitable[Any]]] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # chat_id -> done once the render running right now has finished
+        self._rendering: Dict[int, asyncio.Future] = {}
+
+    def schedule(self, chat_id: int, render: Callable[[], Awaitable[Any]]) -> None:
+        if chat_id not in self._tasks:
+            self._tasks[chat_id] = asyncio.create_task(self._run(chat_id, render))
+            return
+        if chat_id in self._pending:
+            metrics.inc("ui.renders_coalesced")
+        self._pending[chat_id] = render
+
+    async def discard(self, chat_id: int) -> None:
+        """
+        Drops the pending trailing render (a newer screen is about to be
+        rendered directly): a render in flight is awaited, the debounce
+        wait after it is cancelled.
+        """
+        if self._pending.pop(chat_id, None) is not None:
+            metrics.inc("ui.renders_coalesced")
+        task = self._tasks.get(chat_id)
+        if task is None or task is asyncio.current_task():
+            return
+        running = self._rendering.get(chat_id)
+        if running is not None:
+            # shield: a cancelled caller must not cancel the render half way
+            await asyncio.shield(running)
+        if self._tasks.get(chat_id) is task:
+            del self._tasks[chat_id]
+            task.cancel()
+
+    async def _run(self, chat_id: int, render: Optional[Callable[[], Awaitable[Any]]]) -> None:
+        _in_coalesced_render.set(True)
+        loop = asyncio.get_running_loop()
+        try:
+            while render is not None:
+                running = self._rendering[chat_id] = loop.create_future()
+                try:
+                    await render()
+                except Exception:
+                    logger.exception("Coalesced render failed chat_id=%s", chat_id)
+                finally:
+                    del self._rendering[chat_id]
+                    running.set_result(None)
+                await asyncio.sleep(self.window)
+                render = self._pending.pop(chat_id, None)
+        finally:
+            if self._tasks.get(chat_id) is asyncio.current_task():
+                del self._tasks[chat_id]
+
+
+renders = RenderCoalescer()
+
+
 async def safe_delete(bot: Bot, chat_id: int, message_id: int) -> None:
     try:
         await bot.delete_message(chat_id=chat_id, message_id=message_id)
@@ -34,36 +123,41 @@ async def send_or_edit(
     text: str,
     keyboard: Optional[InlineKeyboardMarkup] = None,
     disable_web_page_preview: bool = True,
-) -> Message:
+) -> Optional[Message]:
     """
     One-message UI:
+        - if the stored UI message already shows exactly this screen
+          (same fingerprint) -> no API call at all, returns None
         - tries to edit previously stored UI message_id
         - if can't edit: sends new, deletes old, stores new id
     parse_mode=None globally (safe).
     """
-    old_id = await db.get_ui_message_id(user_id)
+    if not _in_coalesced_render.get():
+        await renders.discard(chat_id)
+    session = await db.load_session(user_id)
+    fingerprint = ui_fingerprint(text, keyboard, disable_web_page_preview)
+    old_id = session.ui_message_id
     if old_id:
+        if session.ui_fingerprint == fingerprint:
+            metrics.inc("ui.api_calls_avoided")
+            return None
         try:
-            return await bot.edit_message_text(
+            msg = await bot.edit_message_text(
                 chat_id=chat_id,
                 message_id=old_id,
                 text=text,
                 reply_markup=keyboard,
                 disable_web_page_preview=disable_web_page_preview,
             )
+            session.ui_fingerprint = fingerprint
+            return msg
         except TelegramBadRequest as e:
-            msg = str(e).lower()
             # message can't be edited / not found / etc -> fallback to send new
-            if "message is not modified" in msg:
-                # still OK: we keep old message as UI anchor
-                try:
-                    # return a "fake" by re-sending no, but to keep type stable we send nothing.
-                    # We'll just return the old message by fetching not possible; send minimal.
-                    return await bot.send_message(chat_id=chat_id, text=text, reply_markup=keyboard, disable_web_page_preview=disable_web_page_preview)
-                except Exception:
-                    raise
-            else:
-                pass
+            if "message is not modified" in str(e).lower():
+                # still OK: the old message is the UI anchor and already shows this
+                session.ui_fingerprint = fingerprint
+                metrics.inc("ui.api_calls_avoided")
+                return None
         except Exception:
             pass
 
@@ -75,6 +169,7 @@ async def send_or_edit(
         disable_web_page_preview=disable_web_page_preview,
     )
     await db.set_ui_message_id(user_id, new_msg.message_id)
+    session.ui_fingerprint = fingerprint
 
     if old_id:
         await safe_delete(bot, chat_id, old_id)
@@ -90,13 +185,21 @@ async def send_or_edit_photo(
     photo_file_id: str,
     caption: str,
     keyboard: Optional[InlineKeyboardMarkup] = None,
-) -> Message:
+) -> Optional[Message]:
     """
     If we have photo product screen, easiest stable UX:
+        - same screen already shown -> no API call, returns None
         - delete old UI msg if exists (could be text)
         - sendPhoto and store as UI anchor
     """
-    old_id = await db.get_ui_message_id(user_id)
+    if not _in_coalesced_render.get():
+        await renders.discard(chat_id)
+    session = await db.load_session(user_id)
+    fingerprint = ui_fingerprint("photo", photo_file_id, caption, keyboard)
+    old_id = session.ui_message_id
+    if old_id and session.ui_fingerprint == fingerprint:
+        metrics.inc("ui.api_calls_avoided")
+        return None
     if old_id:
         await safe_delete(bot, chat_id, old_id)
 
@@ -107,4 +210,5 @@ async def send_or_edit_photo(
         reply_markup=keyboard,
     )
     await db.set_ui_message_id(user_id, new_msg.message_id)
+    session.ui_fingerprint = fingerprint
     return new_msg
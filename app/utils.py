@@ -3,6 +3,7 @@ from datetime import datetime, timezone
 
 
 PHONE_RE = re.compile(r"^\+?\d{9,15}$")
+WORD_RE = re.compile(r"\w+")
 
 
 def now_iso() -> str:
@@ -22,3 +23,13 @@ def normalize_phone(s: str) -> str:
 def valid_phone(s: str) -> bool:
     s = normalize_phone(s)
     return bool(PHONE_RE.match(s))
+
+
+def fts_match(s: str, max_terms: int = 8) -> str:
+    """
+    FTS5 MATCH expression for free user text: every word becomes a quoted
+    prefix term ("iph"* "pro"*), implicitly AND-ed; FTS5 operators and
+    punctuation in the input are dropped. Returns "" if there is no word.
+    """
+    words = WORD_RE.findall((s or "").lower())[:max_terms]
+    return " ".join(f'"{w}"*' for w in words)
@@ -0,0 +1,214 @@
+import asyncio
+import contextvars
+import logging
+import signal
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.methods import AnswerCallbackQuery, AnswerInlineQuery, Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from app.config import Config
+from app.metrics import metrics
+
+logger = logging.getLogger("app.webhook")
+
+
+# how long a captured answer may wait for the handler to finish; past this
+# the button spinner would visibly lag, so the answer goes out over HTTP
+INLINE_ANSWER_WAIT = 0.05
+
+
+class _InlineSlot:
+    __slots__ = ("open", "method", "sent", "timer")
+
+    def __init__(self) -> None:
+        self.open = True
+        self.method: Optional[TelegramMethod] = None
+        self.sent: Optional[asyncio.Task] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def release(self, bot: Bot) -> None:
+        """Sends the held answer right away, the usual way."""
+        if self.method is None:
+            return
+        method, self.method = self.method, None
+        if self.timer is not None:
+            self.timer.cancel()
+        metrics.inc("webhook.inline_answers_released")
+        self.sent = asyncio.create_task(bot(method))
+
+
+_inline_slot: contextvars.ContextVar[Optional[_InlineSlot]] = contextvars.ContextVar("inline_slot", default=None)
+
+
+class InlineAnswerMiddleware(BaseMiddleware):
+    """
+    Answers webhook calls inline where that is not slower: the first
+    answerCallbackQuery (or answerInlineQuery) of an update is held (see
+    InlineAnswerCapture) and, if the handler finishes without any other
+    Bot API call, returned as the update result, which the webhook handler
+    writes into the response body, so Telegram executes it without an
+    extra round trip.
+    The held answer is sent over HTTP at once when the handler makes
+    another API call, or after INLINE_ANSWER_WAIT, so the button spinner
+    never waits for DB work or outbound rate limiting.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        slot = _InlineSlot()
+        token = _inline_slot.set(slot)
+        try:
+            result = await handler(event, data)
+        except Exception:
+            slot.release(data["bot"])
+            raise
+        finally:
+            # tasks spawned by the handler (coalesced renders) inherit the
+            # context but must not capture anything once the update is done
+            slot.open = False
+            if slot.timer is not None:
+                slot.timer.cancel()
+            _inline_slot.reset(token)
+            if slot.sent is not None:
+                try:
+                    await slot.sent
+                except Exception:
+                    logger.exception("Answer failed")
+
+        if slot.method is None:
+            return result
+        if result is None or result is UNHANDLED:
+            metrics.inc("webhook.inline_answers")
+            return slot.method
+        # the handler returned its own method, send ours the usual way
+        await data["bot"](slot.method)
+        return result
+
+
+class InlineAnswerCapture(BaseRequestMiddleware):
+    """Bot session half of InlineAnswerMiddleware: holds the answer instead of sending it."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        slot = _inline_slot.get()
+        if slot is not None and slot.open:
+            if (
+                slot.method is None
+                and slot.sent is None
+                and isinstance(method, (AnswerCallbackQuery, AnswerInlineQuery))
+            ):
+                slot.method = method
+                slot.timer = asyncio.get_running_loop().call_later(INLINE_ANSWER_WAIT, slot.release, bot)
+                return True  # same result Telegram gives for answerCallbackQuery/answerInlineQuery
+            # the handler talks to Telegram anyway: the answer goes first
+            slot.release(bot)
+        return await make_request(bot, method)
+
+
+class _Drain:
+    """Counts webhook requests being processed so shutdown can wait for them."""
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]):
+        self.in_flight += 1
+        self.idle.clear()
+        try:
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.idle.set()
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def build_app(dp: Dispatcher, bot: Bot, secret_token: str, path: str, drain: Optional[_Drain] = None) -> web.Application:
+    app = web.Application(middlewares=[drain.middleware] if drain is not None else [])
+    # handle_in_background=False: the update is processed while Telegram waits,
+    # so the handler's result (see InlineAnswerMiddleware) goes back in the HTTP response
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret_token,
+        handle_in_background=False,
+    ).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+def setup_inline_answers(dp: Dispatcher, bot: Bot) -> None:
+    dp.update.outer_middleware(InlineAnswerMiddleware())
+    bot.session.middleware(InlineAnswerCapture())
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    cfg: Config,
+    drain_timeout: float = 30.0,
+    inline_answers: bool = True,
+) -> None:
+    """
+    Serves updates over an aiohttp webhook until SIGINT/SIGTERM, then drains:
+    stops accepting connections, waits up to drain_timeout for in-flight
+    handlers and only then returns (the caller closes db/outbound after).
+    The webhook stays registered, so Telegram queues updates during a restart.
+    """
+    if inline_answers:
+        setup_inline_answers(dp, bot)
+    drain = _Drain()
+    app = build_app(dp, bot, cfg.webhook_secret, cfg.webhook_path, drain)
+
+    runner = web.AppRunner(app, shutdown_timeout=drain_timeout)
+    await runner.setup()
+    site = web.TCPSite(runner, cfg.webhook_host, cfg.webhook_port)
+    await site.start()
+
+    await bot.set_webhook(
+        url=cfg.webhook_url + cfg.webhook_path,
+        secret_token=cfg.webhook_secret,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logger.info("Webhook listening on %s:%s%s", cfg.webhook_host, cfg.webhook_port, cfg.webhook_path)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Stopping webhook, draining %s in-flight update(s)", drain.in_flight)
+        await site.stop()  # no new connections
+        if not await drain.wait(drain_timeout):
+            logger.warning("Drain timeout, %s update(s) still in flight", drain.in_flight)
+        await runner.cleanup()
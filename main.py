@@ -1,46 +1,57 @@
 import asyncio
 
-from aiogram import Dispatcher
 from app.bot import create_bot
+from app.outbound import OutboundDispatcher
 from app.config import load_config
 from app.logger import setup_logging
-from app.errors import setup_global_error_handler
 from app.db import Database
-from app.middlewares import DependencyMiddleware
-
-from app.handlers.common import router as common_router
-from app.handlers.catalog import router as catalog_router
-from app.handlers.cart import router as cart_router
-from app.handlers.checkout import router as checkout_router
-from app.handlers.orders import router as orders_router
-from app.handlers.support import router as support_router
-from app.handlers.admin import router as admin_router
+from app.activity import ActivityTracker
+from app.reservations import ReservationSweeper
+from app.dispatcher import build_dispatcher
+from app.fsm_storage import SQLiteStorage
+from app.sharding import run_front
+from app.webhook import run_webhook
 
 
 async def main():
     setup_logging()
     cfg = load_config()
 
-    bot = create_bot(cfg.bot_token)
-
-    db = Database(cfg.db_path)
-    await db.init()
+    if cfg.workers > 1:
+        # front process only receives updates and hands them to worker processes
+        await run_front(cfg)
+        return
 
-    dp = Dispatcher()
-    setup_global_error_handler(dp)
+    outbound = OutboundDispatcher(global_rate=cfg.tg_global_rate, chat_rate=cfg.tg_chat_rate)
+    bot = create_bot(cfg.bot_token, outbound=outbound)
 
-    # ✅ inject db/cfg into handler kwargs
-    dp.update.middleware(DependencyMiddleware(db=db, cfg=cfg))
-
-    dp.include_router(common_router)
-    dp.include_router(catalog_router)
-    dp.include_router(cart_router)
-    dp.include_router(checkout_router)
-    dp.include_router(orders_router)
-    dp.include_router(support_router)
-    dp.include_router(admin_router)
+    db = Database(cfg.db_path, readers=cfg.db_readers, profile=cfg.db_profile)
+    await db.init()
 
-    await dp.start_polling(bot)
+    activity = ActivityTracker(db)
+    activity.start()
+
+    storage = SQLiteStorage(db, ttl=cfg.fsm_ttl_hours * 3600)
+    storage.start()
+
+    sweeper = ReservationSweeper(db)
+    sweeper.start()
+
+    dp = build_dispatcher(db, cfg, activity, storage)
+
+    try:
+        if cfg.mode == "webhook":
+            await run_webhook(dp, bot, cfg)
+        else:
+            # a webhook left over from webhook mode would block getUpdates
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        await sweeper.stop()
+        await activity.stop()
+        await storage.close()
+        await outbound.close()
+        await db.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,294 @@
+"""
+Query-plan regression test: runs every Database method against a large
+seeded database, records the SQL it executes (sqlite3 trace callback, with
+the parameters bound) and fails if EXPLAIN QUERY PLAN shows a full table
+scan for any of it.
+
+Whole-table reads by design (catalog reload, CSV export, stats rebuild) run
+untraced, see BULK.
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import Database  # noqa: E402
+
+USERS = 20_000
+CATEGORIES = 50
+PRODUCTS = 20_000
+ORDERS = 40_000
+ITEMS_PER_ORDER = 2
+
+# plan lines like "SCAN orders" or "SCAN orders AS o"; "SCAN x USING (COVERING)
+# INDEX ...", virtual-table (FTS) scans and scans of a subquery's rows are fine
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+CHECKED = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+# methods that read whole tables on purpose
+BULK = ("reload_catalog", "export_products", "export_orders(all)", "rebuild_stats")
+
+# (method, table) plans reported as SCAN that stop early: the newest-first page
+# of all orders walks the rowid b-tree backwards and stops after LIMIT rows
+ROWID_WALKS = {("admin_list_orders", "orders"), ("admin_list_orders(newer)", "orders")}
+
+
+def seed(path: str) -> None:
+    now = datetime.now(timezone.utc)
+    iso = now.isoformat(timespec="seconds")
+    statuses = ("NEW", "PAID", "IN_DELIVERY", "DONE", "CANCELED")
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO users(user_id,lang,created_at,updated_at) VALUES(?,'en',?,?)",
+        ((1000 + u, iso, iso) for u in range(USERS)),
+    )
+    conn.executemany(
+        "INSERT INTO categories(id,name,is_active,created_at,updated_at) VALUES(?,?,?,?,?)",
+        ((100 + c, f"Category {c}", int(c % 10 != 0), iso, iso) for c in range(CATEGORIES)),
+    )
+    conn.executemany(
+        """
+        INSERT INTO products(category_id,title,description,price_cents,stock,is_active,created_at,updated_at)
+        VALUES(?,?,?,?,?,?,?,?)
+        """,
+        (
+            (100 + p % CATEGORIES, f"Phone case {p}", f"Silicone cover number {p}", 1000 + p, 50, int(p % 7 != 0), iso, iso)
+            for p in range(PRODUCTS)
+        ),
+    )
+    conn.executemany(
+        """
+        INSERT INTO orders(id,user_id,status,name,phone,city,delivery_method,address,total_cents,created_at,updated_at)
+        VALUES(?,?,?,'N','+380','C','courier','A',?,?,?)
+        """,
+        (
+            (
+                o + 1,
+                1000 + o % USERS,
+                statuses[o % len(statuses)],
+                2000,
+                (now - timedelta(hours=o % (24 * 60))).isoformat(timespec="seconds"),
+                iso,
+            )
+            for o in range(ORDERS)
+        ),
+    )
+    conn.executemany(
+        """
+        INSERT INTO order_items(order_id,product_id,title,price_cents,qty,line_total_cents)
+        VALUES(?,?,'Item',1000,1,1000)
+        """,
+        ((o + 1, 1 + (o * ITEMS_PER_ORDER + i) % PRODUCTS) for o in range(ORDERS) for i in range(ITEMS_PER_ORDER)),
+    )
+    conn.executemany(
+        "INSERT INTO cart_items(user_id,product_id,qty) VALUES(?,?,1)",
+        ((1000 + u, 1 + u % PRODUCTS) for u in range(0, USERS, 2)),
+    )
+    conn.executemany(
+        "INSERT INTO fsm_state(key,state,data,updated_at) VALUES(?,NULL,'{}',?)",
+        ((f"1:{1000 + u}:{1000 + u}:::default", iso) for u in range(USERS)),
+    )
+    conn.executemany(
+        "INSERT INTO order_requests(token,order_id,created_at) VALUES(?,?,?)",
+        ((f"tok{o}", o + 1, iso) for o in range(0, ORDERS, 4)),
+    )
+    conn.commit()
+    conn.close()
+
+
+async def exercise(db: Database, trace: List[Tuple[str, str]], label: Dict[str, str]) -> None:
+    """Calls every Database method; label["name"] tags the statements it runs."""
+
+    async def call(name: str, coro):
+        label["name"] = name
+        try:
+            return await coro
+        except ValueError:
+            return None  # business-rule refusals (stock, empty cart) still ran their queries
+        finally:
+            label["name"] = ""
+
+    user, buyer, product = 1000, 1003, 1  # user 1000 has a cart, 1003 does not
+    active_product = next(p for p in (await db.list_products(100)) if p["is_active"] == 1)["id"]
+
+    # users / sessions
+    await call("load_session", db.load_session(999_999))
+    db.sessions.discard(user)
+    await call("load_session(cached miss)", db.load_session(user))
+    await call("touch_users", db.touch_users([(user, datetime.now(timezone.utc).isoformat(timespec="seconds"))]))
+    await call("set_user_lang", db.set_user_lang(user, "ua"))
+    await call("set_ui_message_id", db.set_ui_message_id(user, 42))
+
+    # fsm
+    await call("fsm_load", db.fsm_load("1:1000:1000:::default"))
+    await call("fsm_save", db.fsm_save([("1:1000:1000:::default", "S:x", "{}", "2030-01-01T00:00:00+00:00")], ["1:1001:1001:::default"]))
+    await call("fsm_purge", db.fsm_purge("2000-01-01T00:00:00+00:00"))
+
+    # catalog writes
+    cat_id = await call("create_category", db.create_category("Bench"))
+    await call("rename_category", db.rename_category(cat_id, "Bench 2"))
+    await call("set_category_active", db.set_category_active(cat_id, False))
+    new_pid = await call(
+        "create_product",
+        db.create_product({"category_id": 100, "title": "Trace", "description": "", "price_cents": 100, "stock": 5, "photo_file_id": None}),
+    )
+    await call("update_product_fields", db.update_product_fields(new_pid, {"stock": 7, "title": "Trace 2"}))
+    await call("invalidate(products)", db.invalidate("products", (product, new_pid)))
+    await call("invalidate(categories)", db.invalidate("categories", (100,)))
+    await call("search_products", db.search_products("phone case", limit=10))
+    await call("search_products(page 3)", db.search_products("cover", limit=10, offset=20))
+
+    # cart
+    await call("get_cart", db.get_cart(user))
+    await call("cart_get_qty", db.cart_get_qty(user, product))
+    await call("cart_adjust(+)", db.cart_adjust(buyer, active_product, 1))
+    await call("cart_adjust(-)", db.cart_adjust(buyer, active_product, -1))
+    await call("cart_set_qty", db.cart_set_qty(buyer, active_product, 2))
+    await call("cart_set_qty(0)", db.cart_set_qty(buyer, active_product, 0))
+    await call("cart_clear", db.cart_clear(1002))
+
+    # reservations and checkout (hold path, then the fallback path)
+    await call("cart_set_qty", db.cart_set_qty(buyer, active_product, 1))
+    await call("reserve_cart", db.reserve_cart(buyer))
+    await call("release_reservation", db.release_reservation(buyer))
+    await call("reserve_cart", db.reserve_cart(buyer))
+    await call("reservation_expiries", db.reservation_expiries())
+    await call("sweep_reservations", db.sweep_reservations())
+    await call(
+        "create_order_from_cart(held)",
+        db.create_order_from_cart(buyer, "N", "+380", "C", "courier", "A", None, token="trace-1"),
+    )
+    await call("cart_set_qty", db.cart_set_qty(buyer, active_product, 1))
+    order = await call(
+        "create_order_from_cart",
+        db.create_order_from_cart(buyer, "N", "+380", "C", "courier", "A", None, token="trace-2"),
+    )
+    order_id = order[0] if order else 1
+    await call(
+        "create_order_from_cart(repeat)",
+        db.create_order_from_cart(buyer, "N", "+380", "C", "courier", "A", None, token="trace-2"),
+    )
+
+    # orders
+    await call("list_user_orders", db.list_user_orders(1005))
+    page, _, _ = await db.list_user_orders(1005, limit=1)
+    await call("list_user_orders(older)", db.list_user_orders(1005, limit=1, before=page[0]["id"]))
+    await call("list_user_orders(newer)", db.list_user_orders(1005, limit=1, after=page[0]["id"] - 1))
+    await call("get_order", db.get_order(order_id))
+    await call("get_order_items", db.get_order_items(order_id))
+    await call("set_order_payment_method", db.set_order_payment_method(order_id, "MANUAL"))
+    await call("admin_list_orders", db.admin_list_orders())
+    await call("admin_list_orders(status)", db.admin_list_orders(status="PAID"))
+    await call("admin_list_orders(status, older)", db.admin_list_orders(status="PAID", before=ORDERS // 2))
+    await call("admin_list_orders(newer)", db.admin_list_orders(after=ORDERS // 2))
+    await call("admin_set_order_status", db.admin_set_order_status(order_id, "CANCELED"))
+    await call("admin_set_order_status", db.admin_set_order_status(order_id, "PAID"))
+
+    # stats
+    await call("admin_stats", db.admin_stats())
+    await call("stats_daily", db.stats_daily(7))
+    await call("stats_top_products", db.stats_top_products(30))
+
+    # bulk import / export
+    await call(
+        "import_products",
+        db.import_products(
+            [
+                {"id": product, "category_id": 100, "title": "Imported", "description": "", "price_cents": 1, "stock": 1, "is_active": 1},
+                {"id": None, "category_id": 101, "title": "Imported new", "description": "", "price_cents": 1, "stock": 1, "is_active": 1},
+            ]
+        ),
+    )
+    await call(
+        "adjust_products",
+        db.adjust_products([{"product_id": product, "stock_delta": 3, "price_cents": None}, {"product_id": 10**9, "stock_delta": 1, "price_cents": 5}]),
+    )
+    await call("export_orders(status)", db.export_orders(lambda rows: None, status="NEW"))
+
+    # whole-table reads by design, untraced
+    label["name"] = None
+    await db.reload_catalog()
+    await db.export_products(lambda rows: None)
+    await db.export_orders(lambda rows: None)
+    await db.rebuild_stats()
+
+
+async def collect(path: str) -> List[Tuple[str, str]]:
+    db = Database(path)
+    await db.init()
+    await db.close()
+    seed(path)
+
+    db = Database(path)
+    await db.init()
+    trace: List[Tuple[str, str]] = []
+    label: Dict[str, str] = {"name": ""}
+
+    def record(sql: str) -> None:
+        if label["name"] is not None and CHECKED.match(sql):
+            trace.append((label["name"] or "?", sql))
+
+    for conn in [db._writer, *db._reader_conns]:
+        await conn.set_trace_callback(record)
+    try:
+        await exercise(db, trace, label)
+    finally:
+        await db.close()
+    return trace
+
+
+@pytest.fixture(scope="module")
+def traced(tmp_path_factory) -> Tuple[str, List[Tuple[str, str]]]:
+    path = str(tmp_path_factory.mktemp("plans") / "shop.db")
+    return path, asyncio.run(collect(path))
+
+
+def full_scans(conn: sqlite3.Connection, tables: set, name: str, sql: str) -> List[str]:
+    out = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall():
+        m = FULL_SCAN.match(row[3])
+        if m and m.group(1) in tables and (name, m.group(1)) not in ROWID_WALKS:
+            out.append(row[3])
+    return out
+
+
+def test_every_method_was_traced(traced):
+    _path, trace = traced
+    names = {name.split("(")[0] for name, _sql in trace}
+    public = {
+        name
+        for name in dir(Database)
+        if not name.startswith("_") and asyncio.iscoroutinefunction(getattr(Database, name))
+    }
+    # no SQL of their own: served from caches, or lifecycle
+    untraced = {
+        "init", "close", "list_categories", "list_categories_page", "list_products", "list_products_page",
+        "get_product", "get_user_lang", "get_ui_message_id", "ensure_user",
+    } | {name.split("(")[0] for name in BULK}
+    assert public - untraced - names == set()
+
+
+def test_no_full_table_scans(traced):
+    path, trace = traced
+    conn = sqlite3.connect(path)
+    try:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        failures = []
+        seen = set()
+        for name, sql in trace:
+            if sql in seen:
+                continue
+            seen.add(sql)
+            scans = full_scans(conn, tables, name, sql)
+            if scans:
+                failures.append(f"{name}: {', '.join(scans)}\n    {' '.join(sql.split())[:300]}")
+    finally:
+        conn.close()
+    assert not failures, "full table scans:\n" + "\n".join(failures)
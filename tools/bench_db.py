@@ -0,0 +1,165 @@
+"""
+Mixed read/write latency benchmark for the storage layer.
+
+Each simulated user runs a closed loop of cart/catalog operations:
+60% get_cart, 20% list_products, 20% cart_set_qty.
+
+  baseline: the access pattern before the connection pool, one
+            aiosqlite.connect() per operation on a rollback-journal file
+            (readers and writers lock each other out)
+  pooled:   app.db.Database, i.e. WAL + storage profile, reader pool and
+            the single writer task
+
+  python tools/bench_db.py --mode baseline --users 50 --ops 200
+  python tools/bench_db.py --mode pooled --users 50 --ops 200 --profile balanced
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiosqlite  # noqa: E402
+
+from app.db import STORAGE_PROFILES, Database  # noqa: E402
+from app.utils import now_iso  # noqa: E402
+
+
+class BaselineStore:
+    """The pre-pool Database methods used by the mix: one connection per call."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def get_cart(self, user_id: int) -> list:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                """
+                SELECT ci.product_id, ci.qty, p.title, p.price_cents, p.stock, p.is_active
+                FROM cart_items ci JOIN products p ON p.id = ci.product_id
+                WHERE ci.user_id=? ORDER BY ci.product_id DESC
+                """,
+                (user_id,),
+            )
+            return list(await cur.fetchall())
+
+    async def list_products(self, category_id: int) -> list:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                """
+                SELECT id, title, description, price_cents, stock, is_active, photo_file_id
+                FROM products WHERE category_id=? AND is_active=1 ORDER BY id DESC
+                """,
+                (category_id,),
+            )
+            return list(await cur.fetchall())
+
+    async def cart_set_qty(self, user_id: int, product_id: int, qty: int) -> None:
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute("PRAGMA foreign_keys=ON;")
+            await db.execute(
+                """
+                INSERT INTO cart_items(user_id, product_id, qty) VALUES(?,?,?)
+                ON CONFLICT(user_id, product_id) DO UPDATE SET qty=excluded.qty
+                """,
+                (user_id, product_id, qty),
+            )
+            await db.commit()
+
+
+def seed(path: str, users: int, categories: int, products: int) -> None:
+    now = now_iso()
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO categories(id,name,is_active,created_at,updated_at) VALUES(?,?,1,?,?)",
+        [(100 + c, f"Category {c}", now, now) for c in range(categories)],
+    )
+    conn.executemany(
+        """
+        INSERT INTO products(category_id,title,description,price_cents,stock,is_active,created_at,updated_at)
+        VALUES(?,?,?,?,?,1,?,?)
+        """,
+        [(100 + i % categories, f"Product {i}", "bench", 1000 + i, 1000, now, now) for i in range(products)],
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO users(user_id,lang,created_at,updated_at) VALUES(?,'en',?,?)",
+        [(1000 + u, now, now) for u in range(users)],
+    )
+    conn.commit()
+    conn.close()
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=("baseline", "pooled"), default="pooled")
+    ap.add_argument("--users", type=int, default=50, help="concurrent closed-loop users")
+    ap.add_argument("--ops", type=int, default=200, help="operations per user")
+    ap.add_argument("--products", type=int, default=2000)
+    ap.add_argument("--categories", type=int, default=20)
+    ap.add_argument("--profile", choices=sorted(STORAGE_PROFILES), default="balanced")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="shop-bench-"), "shop.db")
+    db = Database(path, profile=args.profile)
+    await db.init()
+    await db.close()
+    seed(path, args.users, args.categories, args.products)
+
+    if args.mode == "baseline":
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=DELETE;")
+        conn.close()
+        store = BaselineStore(path)
+    else:
+        store = db = Database(path, profile=args.profile)
+        await db.init()
+
+    rnd = random.Random(args.seed)
+    latencies: List[float] = []
+    errors = 0
+
+    async def user(user_id: int) -> None:
+        nonlocal errors
+        for _ in range(args.ops):
+            r = rnd.random()
+            t0 = time.perf_counter()
+            try:
+                if r < 0.6:
+                    await store.get_cart(user_id)
+                elif r < 0.8:
+                    await store.list_products(100 + rnd.randrange(args.categories))
+                else:
+                    await store.cart_set_qty(user_id, 1 + rnd.randrange(args.products), rnd.randint(1, 5))
+            except sqlite3.OperationalError:
+                errors += 1  # "database is locked"
+                continue
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(1000 + u) for u in range(args.users)))
+    elapsed = time.perf_counter() - t0
+    if args.mode == "pooled":
+        await db.close()
+
+    latencies.sort()
+    n = len(latencies)
+
+    def pct(p: float) -> float:
+        return latencies[min(n - 1, int(n * p))] * 1000 if n else 0.0
+
+    print(
+        f"{args.mode}: {n} ops in {elapsed:.2f}s -> {n / elapsed:.0f} ops/s | "
+        f"p50 {pct(0.50):.1f} ms, p95 {pct(0.95):.1f} ms, p99 {pct(0.99):.1f} ms | "
+        f"errors {errors}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
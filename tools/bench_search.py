@@ -0,0 +1,122 @@
+"""
+Search latency benchmark: menu search (SearchCache in front of
+Database.search_products) over a large catalog.
+
+Seeds --products products (titles/descriptions from a small vocabulary,
+so common terms match a large share of the catalog and rare ones a few
+rows; every 7th product inactive) and times, per kind of query:
+  cold: the first search of a query, i.e. one bm25 ranking of every match
+  warm: what follows it - page taps and other users repeating the query
+Exits non-zero if warm p95 exceeds --budget-ms. Cold is one ranking per
+query and cache ttl; its time grows with the number of matches.
+
+  python tools/bench_search.py --products 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import Database  # noqa: E402
+from app.search_cache import SearchCache  # noqa: E402
+from app.utils import now_iso  # noqa: E402
+
+COMMON = ["phone", "case", "black", "cable", "charger", "glass", "cover", "usb"]
+BRANDS = ["apple", "samsung", "xiaomi", "nokia", "huawei", "sony", "oppo", "vivo", "honor", "realme"]
+QUERIES = {
+    "common term (~1/2 of catalog)": "phone",
+    "two common terms": "phone case",
+    "brand (~1/10)": "samsung",
+    "prefix of a brand": "sam",
+    "rare model number": "model 4242",
+    "no match": "zzzz",
+}
+
+
+def seed(path: str, products: int, categories: int, rnd: random.Random) -> None:
+    now = now_iso()
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO categories(id,name,is_active,created_at,updated_at) VALUES(?,?,1,?,?)",
+        [(100 + c, f"Category {c}", now, now) for c in range(categories)],
+    )
+    rows = []
+    for i in range(products):
+        words = rnd.sample(COMMON, 3) + [BRANDS[i % len(BRANDS)]]
+        title = f"{words[0].title()} {words[1]} {words[3]} model {i}"
+        description = f"{words[2]} {' '.join(rnd.sample(COMMON, 2))} for {words[3]}"
+        rows.append((100 + i % categories, title, description, 1000 + i, 10, int(i % 7 != 0), now, now))
+    conn.executemany(
+        """
+        INSERT INTO products(category_id,title,description,price_cents,stock,is_active,created_at,updated_at)
+        VALUES(?,?,?,?,?,?,?,?)
+        """,
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+async def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--products", type=int, default=100_000)
+    ap.add_argument("--categories", type=int, default=50)
+    ap.add_argument("--repeat", type=int, default=50, help="timed runs per query")
+    ap.add_argument("--limit", type=int, default=10, help="results per page")
+    ap.add_argument("--budget-ms", type=float, default=5.0, help="warm p95 target")
+    args = ap.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="shop-search-"), "shop.db")
+    db = Database(path)
+    await db.init()
+    await db.close()
+    t0 = time.perf_counter()
+    seed(path, args.products, args.categories, random.Random(1))
+    print(f"seeded {args.products} products in {time.perf_counter() - t0:.1f}s")
+
+    db = Database(path)
+    await db.init()
+    cache = SearchCache("bench", window=10 * args.limit)
+
+    def pct(times: List[float], p: float) -> float:
+        times = sorted(times)
+        return times[min(len(times) - 1, int(len(times) * p))] * 1000
+
+    async def timed(query: str, page: int) -> float:
+        t = time.perf_counter()
+        await cache.page(db, query, page * args.limit, args.limit)
+        return time.perf_counter() - t
+
+    failed = []
+    try:
+        for name, query in QUERIES.items():
+            await db.search_products(query, limit=args.limit)  # warm the page cache
+            cold: List[float] = []
+            warm: List[float] = []
+            for _ in range(args.repeat):
+                cache.clear()
+                cold.append(await timed(query, 0))
+                for page in (1, 2, 3, 4, 0):
+                    warm.append(await timed(query, page))
+            warm_p95 = pct(warm, 0.95)
+            print(f"{name:32} cold p50 {pct(cold, 0.5):7.2f} ms | warm p50 {pct(warm, 0.5):5.2f} ms, p95 {warm_p95:5.2f} ms")
+            if warm_p95 > args.budget_ms:
+                failed.append(name)
+    finally:
+        await db.close()
+    if failed:
+        print("FAIL: over budget: " + ", ".join(failed))
+        return 1
+    print(f"OK: warm p95 <= {args.budget_ms} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,217 @@
+"""
+Local load test for update ingestion: polling vs webhook.
+
+Runs the real dispatcher, handlers and SQLite database in-process, but the
+bot session is a stub that never talks to Telegram (every API call just
+sleeps --api-latency-ms and returns a synthetic result).
+
+  webhook: an aiohttp server on 127.0.0.1; clients POST synthetic updates
+           with the secret token header, latency = HTTP request time
+  polling: dp.start_polling() against a stub getUpdates queue,
+           latency = enqueue -> handler finished
+
+Each client is one user walking a shop flow and sending its next update
+only after the previous one was processed (closed loop), like a real chat.
+
+  python tools/loadtest.py --mode webhook --users 200 --updates 20
+  python tools/loadtest.py --mode polling --users 200 --updates 20 --api-latency-ms 40
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import os
+import sys
+import tempfile
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import ClientSession, web  # noqa: E402
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import GetMe, GetUpdates, TelegramMethod  # noqa: E402
+from aiogram.types import CallbackQuery, Chat, Message, Update, User  # noqa: E402
+
+from app.config import Config  # noqa: E402
+from app.db import Database  # noqa: E402
+from app.webhook import build_app, setup_inline_answers  # noqa: E402
+from app.dispatcher import build_dispatcher  # noqa: E402
+
+SECRET = "loadtest_secret"
+FLOW = ["menu:catalog", "cat:1", "prod:1", "cart:add:1", "menu:cart", "cart:rem:1", "menu:main"]
+
+_ids = itertools.count(1)
+
+
+class StubSession(BaseSession):
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.updates: "asyncio.Queue[Update]" = asyncio.Queue()
+        self.calls = 0
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args: Any, **kwargs: Any) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None) -> Any:
+        if isinstance(method, GetUpdates):
+            batch = [await self.updates.get()]
+            while not self.updates.empty() and len(batch) < (method.limit or 100):
+                batch.append(self.updates.get_nowait())
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return batch
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, GetMe):
+            return User(id=1, is_bot=True, first_name="loadtest", username="loadtest_bot")
+        name = method.__api_method__
+        if name.startswith("send") or name.startswith("edit"):
+            chat_id = getattr(method, "chat_id", None) or 0
+            return Message(message_id=next(_ids), date=datetime.datetime.now(), chat=Chat(id=chat_id, type="private"))
+        return True
+
+
+def synthetic_flow(user_id: int, count: int) -> List[Update]:
+    user = User(id=user_id, is_bot=False, first_name=f"u{user_id}", language_code="en")
+    chat = Chat(id=user_id, type="private")
+    now = datetime.datetime.now()
+    out = [Update(update_id=next(_ids), message=Message(message_id=next(_ids), date=now, chat=chat, from_user=user, text="/start"))]
+    for data in itertools.islice(itertools.cycle(FLOW), count - 1):
+        msg = Message(message_id=1, date=now, chat=chat, from_user=user, text="x")
+        cb = CallbackQuery(id=str(next(_ids)), from_user=user, chat_instance="lt", message=msg, data=data)
+        out.append(Update(update_id=next(_ids), callback_query=cb))
+    return out
+
+
+def report(mode: str, latencies: List[float], elapsed: float, api_calls: int) -> None:
+    latencies.sort()
+    n = len(latencies)
+
+    def pct(p: float) -> float:
+        return latencies[min(n - 1, int(n * p))] * 1000
+
+    print(
+        f"{mode}: {n} updates in {elapsed:.2f}s -> {n / elapsed:.0f} updates/s | "
+        f"p50 {pct(0.50):.1f} ms, p95 {pct(0.95):.1f} ms, p99 {pct(0.99):.1f} ms, max {latencies[-1] * 1000:.1f} ms | "
+        f"outbound API calls {api_calls}"
+    )
+
+
+async def run_webhook(dp, bot: Bot, session: StubSession, flows: List[List[Update]]) -> None:
+    setup_inline_answers(dp, bot)
+    runner = web.AppRunner(build_app(dp, bot, SECRET, "/webhook"))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/webhook"
+    latencies: List[float] = []
+
+    async with ClientSession() as http:
+        async with http.post(url, json={"update_id": 0}, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}) as r:
+            assert r.status == 401, "secret token is not verified"
+
+        async def client(flow: List[Update]) -> None:
+            for update in flow:
+                body = update.model_dump_json(exclude_none=True)
+                t0 = time.perf_counter()
+                async with http.post(url, data=body, headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": SECRET}) as r:
+                    await r.read()
+                    assert r.status == 200, r.status
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client(f) for f in flows))
+        elapsed = time.perf_counter() - t0
+
+    await runner.cleanup()
+    report("webhook", latencies, elapsed, session.calls)
+
+
+async def run_polling(dp, bot: Bot, session: StubSession, flows: List[List[Update]]) -> None:
+    pending: Dict[int, asyncio.Future] = {}
+
+    @dp.update.outer_middleware()
+    async def _done(handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            fut = pending.pop(event.update_id, None)
+            if fut is not None and not fut.done():
+                fut.set_result(None)
+
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    latencies: List[float] = []
+    loop = asyncio.get_running_loop()
+
+    async def client(flow: List[Update]) -> None:
+        for update in flow:
+            fut = pending[update.update_id] = loop.create_future()
+            t0 = time.perf_counter()
+            session.updates.put_nowait(update)
+            await fut
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(f) for f in flows))
+    elapsed = time.perf_counter() - t0
+
+    await dp.stop_polling()
+    session.updates.put_nowait(Update(update_id=next(_ids)))  # unblock the last getUpdates
+    await polling
+    report("polling", latencies, elapsed, session.calls)
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=("webhook", "polling"), default="webhook")
+    ap.add_argument("--users", type=int, default=100, help="concurrent users (one closed-loop client each)")
+    ap.add_argument("--updates", type=int, default=20, help="updates per user")
+    ap.add_argument("--api-latency-ms", type=float, default=0.0, help="simulated Bot API round trip")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="shop-loadtest-")
+    cfg = Config(
+        bot_token="1:LOADTEST",
+        admin_id=1,
+        db_path=os.path.join(tmp, "shop.db"),
+        db_readers=4,
+        db_profile="balanced",
+        support_contact="@support",
+        manual_payment_details="Order #{order_id}",
+        tg_global_rate=30.0,
+        tg_chat_rate=1.0,
+        mode=args.mode,
+        webhook_url="https://127.0.0.1",
+        webhook_path="/webhook",
+        webhook_secret=SECRET,
+        webhook_host="127.0.0.1",
+        webhook_port=0,
+        workers=1,
+        fsm_ttl_hours=24,
+    )
+    db = Database(cfg.db_path, readers=cfg.db_readers, profile=cfg.db_profile)
+    await db.init()
+    session = StubSession(args.api_latency_ms / 1000)
+    bot = Bot(cfg.bot_token, session=session)
+    dp = build_dispatcher(db, cfg)
+
+    flows = [synthetic_flow(10_000 + i, args.updates) for i in range(args.users)]
+    try:
+        if args.mode == "webhook":
+            await run_webhook(dp, bot, session, flows)
+        else:
+            await run_polling(dp, bot, session, flows)
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
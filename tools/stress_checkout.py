@@ -0,0 +1,88 @@
+"""
+Concurrency stress test for Database.create_order_from_cart.
+
+Thousands of users put the same low-stock product in their cart, then
+all of them confirm at once. Exits non-zero on oversell, i.e. if
+  - stock went below zero,
+  - more units were ordered than there was stock, or
+  - a successful checkout is missing its order, or a failed one left one.
+Reports checkouts/s and orders/s.
+
+  python tools/stress_checkout.py --users 5000 --stock 100
+  python tools/stress_checkout.py --users 5000 --stock 100 --qty 3
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import Database  # noqa: E402
+
+
+async def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=5000, help="simultaneous checkouts")
+    ap.add_argument("--stock", type=int, default=100, help="units of the contested product")
+    ap.add_argument("--qty", type=int, default=1, help="units per cart")
+    args = ap.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="shop-stress-"), "shop.db")
+    db = Database(path)
+    await db.init()
+    pid = (await db.list_products(1))[0]["id"]
+    await db.update_product_fields(pid, {"stock": args.stock})
+
+    users = range(10_000, 10_000 + args.users)
+    for user_id in users:
+        await db.load_session(user_id)
+        # cart_set_qty: no stock bound, every cart competes at checkout
+        await db.cart_set_qty(user_id, pid, args.qty)
+
+    async def checkout(user_id: int) -> str:
+        try:
+            await db.create_order_from_cart(user_id, "Stress", "+380000000000", "Kyiv", "courier", "Street 1", None)
+        except ValueError as e:
+            return str(e)
+        return "OK"
+
+    t0 = time.perf_counter()
+    results = Counter(await asyncio.gather(*(checkout(u) for u in users)))
+    elapsed = time.perf_counter() - t0
+    await db.close()
+
+    conn = sqlite3.connect(path)
+    (stock,) = conn.execute("SELECT stock FROM products WHERE id=?", (pid,)).fetchone()
+    orders, sold = conn.execute(
+        "SELECT COUNT(DISTINCT order_id), COALESCE(SUM(qty), 0) FROM order_items WHERE product_id=?", (pid,)
+    ).fetchone()
+    conn.close()
+
+    expected = min(args.users, args.stock // args.qty)
+    print(
+        f"{args.users} checkouts in {elapsed:.2f}s -> {args.users / elapsed:.0f} checkouts/s, "
+        f"{results['OK'] / elapsed:.0f} orders/s | results {dict(results)}"
+    )
+    print(f"stock {args.stock} -> {stock}, orders {orders}, units sold {sold}")
+
+    problems = []
+    if stock < 0 or sold > args.stock:
+        problems.append("oversell")
+    if orders != results["OK"] or sold != results["OK"] * args.qty or stock != args.stock - sold:
+        problems.append("orders and stock disagree")
+    if results["OK"] != expected:
+        problems.append(f"expected {expected} orders")
+    if problems:
+        print("FAIL: " + ", ".join(problems))
+        return 1
+    print("OK: no oversell")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))